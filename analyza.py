@@ -1,10 +1,16 @@
 import os
 import argparse
 import glob
-from typing import Callable
+import threading
+import time
+from typing import Callable, Generator, Iterator
 
 from dotenv import load_dotenv
 from db import get_session, AnalysisResult, get_active_prompt, PromptRun
+import clients
+import rate_limit
+from llm_cache import LLMCache
+from map_reduce import MapReduceAnalyzer, estimate_tokens, render_documents
 
 # --- Konfigurácia ---
 load_dotenv('.env.local', override=True)
@@ -16,20 +22,31 @@ GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-1.5-flash')
 ANALYSIS_PROMPT = os.getenv('ANALYSIS_PROMPT', 'Zhrň kľúčové body z nasledujúcich poistných dokumentov. Zameraj sa na typ poistenia, poistné sumy, dátumy platnosti a mená zúčastnených strán. Vypíš výsledok v prehľadnej štruktúre.')
 GCP_PROJECT = os.getenv('GOOGLE_CLOUD_PROJECT')
 VERTEX_LOCATION = os.getenv('VERTEX_AI_LOCATION', 'europe-west1')
+# Map-reduce pre veľké udalosti: nad ANALYSIS_MAX_INPUT_TOKENS sa dokumenty zhrnú po skupinách
+ANALYSIS_MAX_INPUT_TOKENS = int(os.getenv('ANALYSIS_MAX_INPUT_TOKENS', '120000'))
+ANALYSIS_MAP_GROUP_TOKENS = int(os.getenv('ANALYSIS_MAP_GROUP_TOKENS', '30000'))
+ANALYSIS_MAP_WORKERS = int(os.getenv('ANALYSIS_MAP_WORKERS', '4'))
+ANALYSIS_REDUCE_FAN_IN = int(os.getenv('ANALYSIS_REDUCE_FAN_IN', '8'))
+ANALYSIS_CHARS_PER_TOKEN = float(os.getenv('ANALYSIS_CHARS_PER_TOKEN', '4'))
+# Cache odpovedí Gemini (prázdny LLM_CACHE_DIR cache vypne)
+LLM_CACHE_DIR = (os.getenv('LLM_CACHE_DIR', 'llm_cache') or '').strip()
+LLM_CACHE_MAX_MB = int(os.getenv('LLM_CACHE_MAX_MB', '256'))
+LLM_CACHE_TTL_SECONDS = float(os.getenv('LLM_CACHE_TTL_SECONDS', '86400'))
+
+llm_cache = LLMCache(LLM_CACHE_DIR, LLM_CACHE_MAX_MB * 1024 * 1024, LLM_CACHE_TTL_SECONDS) if LLM_CACHE_DIR else None
 
 # --- Inicializácia klientov ---
 if USE_VERTEX_AI:
     # Vertex AI (EU rezidencia podľa location)
     try:
         from vertexai import init as vertex_init
-        from vertexai.generative_models import GenerativeModel as VertexGenerativeModel
+        from vertexai.generative_models import GenerativeModel  # noqa: F401 – inštancie v clients.get_generative_model
     except Exception as e:
         raise RuntimeError(f"Chýba závislosť google-cloud-aiplatform alebo vertexai: {e}")
 
     if not GCP_PROJECT:
         raise ValueError("GOOGLE_CLOUD_PROJECT musí byť nastavený pre Vertex AI")
     vertex_init(project=GCP_PROJECT, location=VERTEX_LOCATION)
-    VertexModel = VertexGenerativeModel
 else:
     # Google AI Studio (API kľúč)
     import google.generativeai as genai
@@ -38,19 +55,24 @@ else:
     genai.configure(api_key=GEMINI_API_KEY)
 
 # --- Pomocné funkcie ---
-def read_all_texts_from_dir(directory: str) -> str:
-    """Načíta a spojí obsah všetkých .txt súborov z daného priečinka."""
-    full_text = ""
+def read_documents_from_dir(directory: str) -> list[tuple[str, str]]:
+    """Načíta všetky .txt súbory z daného priečinka ako [(názov, text)]."""
+    documents = []
     if not os.path.isdir(directory):
-        return ""
-        
+        return documents
     for filepath in sorted(glob.glob(os.path.join(directory, '*.txt'))):
         with open(filepath, 'r', encoding='utf-8') as f:
-            filename = os.path.basename(filepath)
-            full_text += f"\n--- Začiatok dokumentu: {filename} ---\n"
-            full_text += f.read()
-            full_text += f"\n--- Koniec dokumentu: {filename} ---\n"
-    return full_text
+            documents.append((os.path.basename(filepath), f.read()))
+    return documents
+
+
+def read_all_texts_from_dir(directory: str) -> str:
+    """Načíta a spojí obsah všetkých .txt súborov z daného priečinka."""
+    return render_documents(read_documents_from_dir(directory))
+
+
+def _count_tokens(text: str) -> int:
+    return estimate_tokens(text, ANALYSIS_CHARS_PER_TOKEN)
 
 # --- Hlavná funkcia --- 
 def _resolve_vertex_model_name(preferred_model_name: str | None) -> str:
@@ -72,22 +94,194 @@ def _resolve_vertex_model_name(preferred_model_name: str | None) -> str:
     return 'gemini-2.0-flash'
 
 
-def _generate_text(prompt: str, model_name_override: str | None = None) -> str:
+def _get_model(model_name_override: str | None = None, generation_config: dict | None = None):
+    """Zdieľaná inštancia modelu pre rozlíšený názov (clients.get_generative_model)."""
+    return clients.get_generative_model(_effective_model_name(model_name_override), USE_VERTEX_AI, generation_config)
+
+
+def warm_up_model() -> None:
+    """Pripraví inštanciu modelu aktívneho promptu (pri štarte API/Streamlit)."""
+    active_prompt = get_active_prompt()
+    _get_model(active_prompt.model if active_prompt else None)
+
+
+class GenerationUsage:
+    """Spotreba tokenov (usage_metadata, súčet cez všetky volania modelu behu) a časy behu.
+
+    Čas sa meria od prvej požiadavky na model (alebo cache odpovedí), bez načítania
+    textov a promptu: latencia po celý výsledok, TTFT po prvú časť výsledku – iba pri
+    streamovanom výstupe (inak None, prvá časť = celý výsledok). Zásahy v cache tokeny
+    nepridávajú. Thread-safe (map fáza volá model súbežne)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started: float | None = None
+        self.tokens_in: int | None = None
+        self.tokens_out: int | None = None
+        self.model_calls = 0
+        self.cache_hits = 0
+        self.first_output: float | None = None
+        self.finished: float | None = None
+
+    def start(self) -> None:
+        with self._lock:
+            if self.started is None:
+                self.started = time.perf_counter()
+
+    def add_response(self, resp) -> None:
+        meta = getattr(resp, 'usage_metadata', None)
+        prompt_tokens = getattr(meta, 'prompt_token_count', None)
+        output_tokens = getattr(meta, 'candidates_token_count', None)
+        with self._lock:
+            self.model_calls += 1
+            if prompt_tokens is not None:
+                self.tokens_in = (self.tokens_in or 0) + int(prompt_tokens)
+            if output_tokens is not None:
+                self.tokens_out = (self.tokens_out or 0) + int(output_tokens)
+
+    def add_cache_hit(self) -> None:
+        with self._lock:
+            self.cache_hits += 1
+
+    def mark_output(self) -> None:
+        if self.first_output is None:
+            self.first_output = time.perf_counter()
+
+    def finish(self) -> None:
+        self.finished = time.perf_counter()
+
+    @property
+    def latency_ms(self) -> int | None:
+        if self.started is None or self.finished is None:
+            return None
+        return int((self.finished - self.started) * 1000)
+
+    @property
+    def ttft_ms(self) -> int | None:
+        if self.started is None or self.first_output is None:
+            return None
+        return int((self.first_output - self.started) * 1000)
+
+    def as_dict(self) -> dict:
+        return {
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+            "latency_ms": self.latency_ms,
+            "ttft_ms": self.ttft_ms,
+            "model_calls": self.model_calls,
+            "cache_hits": self.cache_hits,
+        }
+
+
+def _generate_text(prompt: str, model_name_override: str | None = None, usage: GenerationUsage | None = None) -> str:
+    # Volania Gemini idú cez spoločný rate limit (throttling, opakovanie pri 429/503)
+    model = _get_model(model_name_override)
+    resp = rate_limit.guard("gemini").call(model.generate_content, prompt)
+    if usage is not None:
+        usage.add_response(resp)
     if USE_VERTEX_AI:
-        vertex_model_name = _resolve_vertex_model_name(model_name_override)
-        model = VertexModel(vertex_model_name)
-        resp = model.generate_content(prompt)
         return getattr(resp, 'text', None) or ''.join(getattr(resp, 'candidates', []) or [])
-    else:
-        import google.generativeai as genai
-        use_name = (model_name_override or GEMINI_MODEL)
-        model = genai.GenerativeModel(use_name)
-        resp = model.generate_content(prompt)
-        return resp.text
+    return resp.text
+
+
+def _chunk_text(chunk) -> str:
+    try:
+        return chunk.text or ''
+    except (ValueError, AttributeError):
+        # časť bez textu (napr. iba metadáta / dôvod ukončenia)
+        return ''
+
+
+def _generate_text_stream(
+    prompt: str, model_name_override: str | None = None, usage: GenerationUsage | None = None
+) -> Iterator[str]:
+    """Streamované generate_content – vracia časti textu, ako prichádzajú z modelu.
+    Rate limit a opakovanie (kým stream nič nevrátil) cez ServiceGuard.stream."""
+    model = _get_model(model_name_override)
+    # slot súbežnosti Gemini sa drží počas celého čítania streamu
+    last = None
+    for chunk in rate_limit.guard("gemini").stream(model.generate_content, prompt, stream=True):
+        # usage_metadata posledného chunku obsahuje súčty za celú odpoveď
+        if getattr(chunk, 'usage_metadata', None) is not None:
+            last = chunk
+        text = _chunk_text(chunk)
+        if text:
+            yield text
+    if usage is not None:
+        usage.add_response(last)
+
+
+def _effective_model_name(model_name: str | None) -> str:
+    return _resolve_vertex_model_name(model_name) if USE_VERTEX_AI else (model_name or GEMINI_MODEL)
+
+
+def _generate_cached(
+    prompt: str,
+    input_text: str,
+    model_name_override: str | None = None,
+    use_cache: bool = True,
+    usage: GenerationUsage | None = None,
+) -> str:
+    """_generate_text nad `prompt + input_text` s cache podľa (model, hash promptu, hash vstupu).
+    use_cache=False cache obíde (a výsledok neuloží)."""
+    return ''.join(_generate_cached_stream(prompt, input_text, model_name_override, use_cache, stream=False, usage=usage))
+
+
+def _generate_cached_stream(
+    prompt: str,
+    input_text: str,
+    model_name_override: str | None = None,
+    use_cache: bool = True,
+    stream: bool = True,
+    usage: GenerationUsage | None = None,
+) -> Iterator[str]:
+    """Ako _generate_cached, ale vracia časti textu (pri stream=True priamo zo streamu modelu).
+    Zásah v cache sa vráti ako jedna časť; nová odpoveď sa uloží po dokončení streamu."""
+    full_prompt = prompt + "\n\n" + input_text if prompt and input_text else prompt or input_text
+    if usage is not None:
+        usage.start()
+
+    def generate(p: str, m: str | None) -> Iterator[str]:
+        if stream:
+            return _generate_text_stream(p, m, usage)
+        return iter([_generate_text(p, model_name_override=m, usage=usage)])
 
+    if llm_cache is None or not use_cache:
+        if llm_cache is not None:
+            llm_cache.record_bypass()
+        yield from generate(full_prompt, model_name_override)
+        return
+    model = _effective_model_name(model_name_override)
+    key = LLMCache.make_key(model, prompt, input_text)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        if usage is not None:
+            usage.add_cache_hit()
+        yield cached
+        return
+    parts = []
+    for part in generate(full_prompt, model_name_override):
+        parts.append(part)
+        yield part
+    text = ''.join(parts)
+    if text:
+        try:
+            llm_cache.put(key, text, model)
+        except OSError:
+            pass
 
-def run_analysis(event_id: str, anonymized_dir: str, general_dir: str, analysis_dir: str, status_callback: Callable):
-    """Spustí analýzu všetkých textov pre danú udalosť pomocou Gemini."""
+
+def _analysis_steps(
+    event_id: str,
+    anonymized_dir: str,
+    general_dir: str,
+    analysis_dir: str,
+    status_callback: Callable,
+    use_cache: bool,
+    stream: bool,
+) -> Generator[str, None, str | None]:
+    """Spoločný priebeh analýzy: vracia časti textu výsledku, návratová hodnota je cesta k uloženej analýze."""
+    usage = GenerationUsage()
     # Vyčistenie názvu udalosti od medzier
     event_id = event_id.strip()
     status_callback(f"Spúšťam analýzu poistnej udalosti: {event_id}...")
@@ -109,10 +303,12 @@ def run_analysis(event_id: str, anonymized_dir: str, general_dir: str, analysis_
 
     # Načítanie všetkých textov
     status_callback(f"Načítavam anonymizované texty z: {os.path.basename(anonymized_dir)}/{event_id}...")
-    anonymized_texts = read_all_texts_from_dir(anonymized_event_dir)
+    anonymized_docs = read_documents_from_dir(anonymized_event_dir)
+    anonymized_texts = render_documents(anonymized_docs)
     
     status_callback(f"Načítavam všeobecné texty z: {os.path.basename(general_dir)}/{event_id}...")
-    general_texts = read_all_texts_from_dir(general_event_dir)
+    general_docs = read_documents_from_dir(general_event_dir)
+    general_texts = render_documents(general_docs)
 
     combined_text = "Nasledujú anonymizované texty z citlivých dokumentov:\n" + anonymized_texts + \
                      "\n\nNasledujú texty zo všeobecných dokumentov:\n" + general_texts
@@ -125,9 +321,33 @@ def run_analysis(event_id: str, anonymized_dir: str, general_dir: str, analysis_
     try:
         status_callback(f"Inicializujem model...")
         full_prompt = prompt_content + "\n\n" + combined_text
-        effective_model = _resolve_vertex_model_name(model_name) if USE_VERTEX_AI else (model_name or GEMINI_MODEL)
-        status_callback(f"Posielam dáta na analýzu do modelu '{effective_model}'...")
-        analysis_result = _generate_text(full_prompt, model_name_override=model_name)
+        effective_model = _effective_model_name(model_name)
+        if _count_tokens(full_prompt) <= ANALYSIS_MAX_INPUT_TOKENS:
+            status_callback(f"Posielam dáta na analýzu do modelu '{effective_model}'...")
+            final_prompt, final_input = prompt_content, combined_text
+        else:
+            # Veľká udalosť – súbežné zhrnutie skupín dokumentov, finálne spojenie (streamované)
+            analyzer = MapReduceAnalyzer(
+                lambda p: _generate_cached(p, "", model_name, use_cache, usage),
+                group_tokens=ANALYSIS_MAP_GROUP_TOKENS,
+                max_workers=ANALYSIS_MAP_WORKERS,
+                reduce_fan_in=ANALYSIS_REDUCE_FAN_IN,
+                max_input_tokens=ANALYSIS_MAX_INPUT_TOKENS,
+                token_counter=_count_tokens,
+            )
+            documents = [(f"citlivý (anonymizovaný): {n}", t) for n, t in anonymized_docs] + \
+                        [(f"všeobecný: {n}", t) for n, t in general_docs]
+            status_callback(f"Model '{effective_model}': analýza po častiach (map-reduce)...")
+            final_prompt, final_input = analyzer.final_prompt(documents, prompt_content, status_callback), ""
+
+        parts = []
+        for part in _generate_cached_stream(final_prompt, final_input, model_name, use_cache, stream=stream, usage=usage):
+            if stream:
+                usage.mark_output()
+            parts.append(part)
+            yield part
+        usage.finish()
+        analysis_result = ''.join(parts)
 
         # Uloženie výsledku na disk
         os.makedirs(analysis_dir, exist_ok=True)
@@ -143,15 +363,9 @@ def run_analysis(event_id: str, anonymized_dir: str, general_dir: str, analysis_
                 analysis_record = AnalysisResult(event_id=event_id, model=model_name, summary_text=analysis_result)
                 session.add(analysis_record)
                 
-                # Logovanie behu promptu
+                # Logovanie behu promptu (tokeny z usage_metadata, latencia, TTFT)
                 if active_prompt:
-                    prompt_run = PromptRun(
-                        prompt_id=active_prompt.id,
-                        event_id=event_id,
-                        model=model_name
-                        # tokens_in a tokens_out môžeme pridať neskôr ak bude potrebné
-                    )
-                    session.add(prompt_run)
+                    session.add(_prompt_run(active_prompt.id, event_id, model_name, usage))
                 
                 session.commit()
             except Exception:
@@ -166,10 +380,90 @@ def run_analysis(event_id: str, anonymized_dir: str, general_dir: str, analysis_
         status_callback(f"Chyba pri komunikácii s Gemini API: {e}")
         raise
 
-def analyze_text(input_text: str, prompt: str) -> str:
-    return _generate_text(prompt + "\n\n" + input_text)
 
-def analyze_single_document(event_id: str, filename: str, anonymized_dir: str, general_dir: str, prompt: str | None) -> str:
+def _prompt_run(prompt_id: int, event_id: str, model_name: str, usage: GenerationUsage) -> PromptRun:
+    return PromptRun(
+        prompt_id=prompt_id,
+        event_id=event_id,
+        model=model_name,
+        tokens_in=usage.tokens_in,
+        tokens_out=usage.tokens_out,
+        latency_ms=usage.latency_ms,
+        ttft_ms=usage.ttft_ms,
+    )
+
+
+def _record_prompt_run(prompt_id: int, event_id: str, model_name: str, usage: GenerationUsage) -> None:
+    session = get_session()
+    if session is None:
+        return
+    try:
+        session.add(_prompt_run(prompt_id, event_id, model_name, usage))
+        session.commit()
+    except Exception:
+        session.rollback()
+    finally:
+        session.close()
+
+
+def run_analysis(
+    event_id: str,
+    anonymized_dir: str,
+    general_dir: str,
+    analysis_dir: str,
+    status_callback: Callable,
+    use_cache: bool = True,
+):
+    """Spustí analýzu všetkých textov pre danú udalosť pomocou Gemini.
+    use_cache=False vynúti nové volanie modelu aj pre nezmenené texty a prompt."""
+    steps = _analysis_steps(event_id, anonymized_dir, general_dir, analysis_dir, status_callback, use_cache, stream=False)
+    while True:
+        try:
+            next(steps)
+        except StopIteration as done:
+            return done.value
+
+
+def run_analysis_stream(
+    event_id: str,
+    anonymized_dir: str,
+    general_dir: str,
+    analysis_dir: str,
+    status_callback: Callable,
+    use_cache: bool = True,
+) -> Generator[str, None, str | None]:
+    """Streamovaná analýza: vracia časti textu, ako ich model generuje. Po dokončení sa výsledok
+    uloží rovnako ako v run_analysis (súbor + AnalysisResult); cesta k súboru je návratová
+    hodnota generátora (StopIteration.value)."""
+    return (yield from _analysis_steps(
+        event_id, anonymized_dir, general_dir, analysis_dir, status_callback, use_cache, stream=True
+    ))
+
+
+def analyze_text(
+    input_text: str,
+    prompt: str,
+    use_cache: bool = True,
+    usage: GenerationUsage | None = None,
+    model_name: str | None = None,
+) -> str:
+    """Jedno volanie modelu nad textom; do `usage` (ak je zadané) zapíše tokeny a časy."""
+    result = _generate_cached(prompt, input_text, model_name, use_cache=use_cache, usage=usage)
+    if usage is not None:
+        usage.finish()
+    return result
+
+
+def analyze_single_document(
+    event_id: str,
+    filename: str,
+    anonymized_dir: str,
+    general_dir: str,
+    prompt: str | None,
+    use_cache: bool = True,
+    usage: GenerationUsage | None = None,
+) -> str:
+    """Analýza jedného dokumentu (bez vlastného promptu ANALYSIS_PROMPT a GEMINI_MODEL)."""
     # Vyčistenie názvu udalosti od medzier
     event_id = event_id.strip()
     anon_path = os.path.join(anonymized_dir, event_id, filename)
@@ -184,8 +478,7 @@ def analyze_single_document(event_id: str, filename: str, anonymized_dir: str, g
     else:
         raise FileNotFoundError("Súbor pre analýzu neexistuje v anonymized ani general výstupoch.")
 
-    use_prompt = prompt or ANALYSIS_PROMPT
-    return analyze_text(text, use_prompt)
+    return analyze_text(text, prompt or ANALYSIS_PROMPT, use_cache=use_cache, usage=usage)
 
 # --- Spustenie z príkazového riadku ---
 if __name__ == "__main__":
@@ -194,6 +487,7 @@ if __name__ == "__main__":
     parser.add_argument("--anonymized_dir", default="anonymized_output", help="Hlavný priečinok s anonymizovanými textami.")
     parser.add_argument("--general_dir", default="general_output", help="Hlavný priečinok so všeobecnými textami.")
     parser.add_argument("--analysis_dir", default="analysis_output", help="Priečinok pre uloženie výslednej analýzy.")
+    parser.add_argument("--no_cache", action="store_true", help="Obísť cache odpovedí modelu.")
     args = parser.parse_args()
 
-    run_analysis(args.event_id, args.anonymized_dir, args.general_dir, args.analysis_dir, print)
+    run_analysis(args.event_id, args.anonymized_dir, args.general_dir, args.analysis_dir, print, use_cache=not args.no_cache)
@@ -1,11 +1,23 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Query, Response, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
+import json
 import os
+import queue
+import threading
 from dotenv import load_dotenv
 
-from main import run_processing, ocr_document, anonymize_text, PROJECT_ID, DLP_TEMPLATE_ID
-from analyza import run_analysis, analyze_single_document, analyze_text
-from db import get_session, Prompt, PromptRun
+import clients
+import rate_limit
+from main import run_processing, ocr_document, anonymize_text, get_pii_findings, warm_up_clients, ocr_cache, PROJECT_ID, DLP_TEMPLATE_ID
+from analyza import GenerationUsage, run_analysis, run_analysis_stream, analyze_single_document, analyze_text, llm_cache, warm_up_model
+from db import get_session, get_table_counts, init_db, pool_stats, prompts_changed, set_active_prompt, Prompt
+from db import InvalidCursor, list_document_texts, list_prompt_runs_page, list_prompts_page, get_prompt_by_id
+from db import alist_document_texts, alist_prompt_runs_page, alist_prompts_page, aget_prompt_by_id
+from db import async_session_scope, dispose_async_engine
 
 # Načítanie .env.local ako jediného zdroja pravdy
 load_dotenv('.env.local', override=True)
@@ -103,7 +115,25 @@ class PromptResponse(BaseModel):
     updated_at: str
 
 
-app = FastAPI(title="Claims AI API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Jednorazová inicializácia schémy a migrácie (požiadavky DDL nespúšťajú)
+    init_db()
+    # Predhriatie zdieľaných Google Cloud klientov, aby prvá požiadavka neplatila setup kanála
+    try:
+        warm_up_clients()
+    except Exception:
+        pass
+    try:
+        warm_up_model()
+    except Exception:
+        pass
+    yield
+    clients.close_all()
+    await dispose_async_engine()
+
+
+app = FastAPI(title="Claims AI API", version="1.0.0", lifespan=lifespan)
 
 
 @app.get("/health")
@@ -133,7 +163,8 @@ async def upload_pdf(event_id: str, file: UploadFile = File(...), category: str
 
 
 @app.post("/process/{event_id}", response_model=ProcessResponse)
-def process_event(event_id: str):
+def process_event(event_id: str, incremental: bool = False):
+    """Spracuje dokumenty udalosti. incremental=true spracuje iba nové/zmenené PDF."""
     # Vyčistenie názvu udalosti od medzier
     event_id = event_id.strip()
     event_path = os.path.join(EVENTS_BASE_DIR, event_id)
@@ -143,7 +174,13 @@ def process_event(event_id: str):
         messages.append(msg)
 
     try:
-        run_processing(event_path, ANONYMIZED_DIR, GENERAL_DIR, RAW_OCR_DIR, cb)
+        summary = run_processing(event_path, ANONYMIZED_DIR, GENERAL_DIR, RAW_OCR_DIR, cb, incremental=incremental)
+        if incremental and summary is not None:
+            return {"message": (
+                f"Inkrementálne spracovanie dokončené pre {event_id}: "
+                f"spracované {len(summary['processed'])}, preskočené {len(summary['skipped'])}, "
+                f"chybné {len(summary['failed'])}, odstránené {len(summary['removed'])}"
+            )}
         return {"message": f"Spracovanie spustené/dokončené pre {event_id}"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -166,6 +203,45 @@ def ocr_event_file(event_id: str, req: OCRRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/ocr/cache/stats")
+def ocr_cache_stats():
+    """Štatistiky OCR cache (zásahy, minutia, vyradenia)."""
+    if ocr_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **ocr_cache.stats()}
+
+
+@app.get("/analysis/cache/stats")
+def llm_cache_stats():
+    """Štatistiky cache odpovedí Gemini (zásahy, výpadky, expirované, obídené, eviction)."""
+    if llm_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **llm_cache.stats()}
+
+
+@app.get("/metrics/rate-limits")
+def rate_limit_stats():
+    """Metriky rate limitu Google API (volania, opakovania, throttling, aktuálny limit súbežnosti)."""
+    return rate_limit.stats()
+
+
+@app.get("/metrics/db")
+def db_counts(refresh: bool = False):
+    """Počty udalostí, dokumentov a analýz v DB (materializované, obnova po DB_STATS_REFRESH_SECONDS)."""
+    try:
+        counts = get_table_counts(force_refresh=refresh)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Počty z DB nie sú dostupné: {e}")
+    refreshed_at = counts.pop("refreshed_at")
+    return {**counts, "refreshed_at": str(refreshed_at) if refreshed_at else None}
+
+
+@app.get("/metrics/db-pool")
+def db_pool_stats():
+    """Stav connection poolu DB (veľkosť, overflow) a metriky checkoutov, čakania a invalidácií."""
+    return pool_stats()
+
+
 @app.post("/anonymize/{event_id}")
 def anonymize_event_text(event_id: str, req: AnonymizeRequest):
     # Vyčistenie názvu udalosti od medzier
@@ -195,22 +271,25 @@ def inspect_event_text(event_id: str, req: InspectRequest):
     if not req.text and not req.filename:
         raise HTTPException(status_code=400, detail="Poskytnite filename alebo text na kontrolu.")
     text = req.text
+    raw_dir = None
     if text is None and req.filename:
         # načítaj text zo súboru v raw_ocr_output
-        path = os.path.join(RAW_OCR_DIR, event_id, os.path.splitext(req.filename)[0] + ".txt")
+        raw_dir = os.path.join(RAW_OCR_DIR, event_id)
+        path = os.path.join(raw_dir, os.path.splitext(req.filename)[0] + ".txt")
         if not os.path.exists(path):
             raise HTTPException(status_code=404, detail="RAW OCR text neexistuje. Spustite OCR najprv.")
         with open(path, 'r', encoding='utf-8') as f:
             text = f.read()
     try:
-        findings = inspect_text_for_pii(PROJECT_ID, text)
+        # pri súbore sa použijú nálezy uložené pri spracovaní (DLP sa volá iba ak chýbajú)
+        findings = get_pii_findings(PROJECT_ID, text, raw_dir, req.filename if raw_dir else None)
         return findings
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/analysis/{event_id}", response_model=ProcessResponse)
-def analyze_event(event_id: str):
+def analyze_event(event_id: str, no_cache: bool = False):
     # Vyčistenie názvu udalosti od medzier
     event_id = event_id.strip()
     messages = []
@@ -219,25 +298,91 @@ def analyze_event(event_id: str):
         messages.append(msg)
 
     try:
-        run_analysis(event_id, ANONYMIZED_DIR, GENERAL_DIR, ANALYSIS_DIR, cb)
+        run_analysis(event_id, ANONYMIZED_DIR, GENERAL_DIR, ANALYSIS_DIR, cb, use_cache=not no_cache)
         return {"message": f"Analýza spustená/dokončená pre {event_id}"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Interval SSE komentára (keep-alive), keď analýza dlhšie nič neposlala (napr. map-reduce fáza)
+SSE_KEEPALIVE_SECONDS = float(os.getenv('API_SSE_KEEPALIVE_SECONDS', '15'))
+
+
+def _sse(data, event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# GET, aby sa dalo pripojiť priamo cez EventSource v prehliadači
+@app.get("/analysis/{event_id}/stream")
+def analyze_event_stream(event_id: str, no_cache: bool = False):
+    """Analýza udalosti ako Server-Sent Events: `status` (priebeh), `data` (časť textu
+    výsledku hneď, ako ju model vygeneruje), na konci `done` s cestou k výsledku alebo `error`.
+    Výsledok sa uloží rovnako ako pri POST /analysis/{event_id}."""
+    event_id = event_id.strip()
+
+    def produce(events: queue.Queue):
+        # analýza beží vo vlastnom vlákne – správy o priebehu idú klientovi hneď, nie až
+        # s ďalšou časťou textu; po odpojení klienta analýza dobehne a výsledok sa uloží
+        try:
+            steps = run_analysis_stream(event_id, ANONYMIZED_DIR, GENERAL_DIR, ANALYSIS_DIR,
+                                        lambda msg: events.put(("status", msg)), use_cache=not no_cache)
+            while True:
+                try:
+                    events.put(("data", next(steps)))
+                except StopIteration as done:
+                    events.put(("done", done.value))
+                    return
+        except Exception as e:
+            events.put(("error", str(e)))
+
+    def stream():
+        events: queue.Queue = queue.Queue()
+        threading.Thread(target=produce, args=(events,), name=f"analysis-sse-{event_id}", daemon=True).start()
+        while True:
+            try:
+                kind, payload = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            if kind == "status":
+                yield _sse(payload, "status")
+            elif kind == "data":
+                yield _sse(payload)
+            elif kind == "error":
+                yield _sse(payload, "error")
+                return
+            elif payload is None:
+                yield _sse("Pre túto udalosť neboli nájdené žiadne texty na analýzu.", "error")
+                return
+            else:
+                yield _sse({"result_path": payload}, "done")
+                return
+
+    # generátor je synchrónny – Starlette ho iteruje v threadpoole
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/analysis/single/{event_id}")
-def analyze_single(event_id: str, req: SingleAnalysisRequest):
+def analyze_single(event_id: str, req: SingleAnalysisRequest, no_cache: bool = False):
     # Vyčistenie názvu udalosti od medzier
     event_id = event_id.strip()
     try:
-        result = analyze_single_document(event_id, req.filename, ANONYMIZED_DIR, GENERAL_DIR, req.prompt)
-        return {"result_preview": result[:2000]}
+        usage = GenerationUsage()
+        result = analyze_single_document(
+            event_id, req.filename, ANONYMIZED_DIR, GENERAL_DIR, req.prompt, use_cache=not no_cache, usage=usage
+        )
+        return {"result_preview": result[:2000], "usage": usage.as_dict()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/analysis/batch/{event_id}")
-def analyze_batch(event_id: str, req: BatchAnalysisRequest):
+def analyze_batch(event_id: str, req: BatchAnalysisRequest, no_cache: bool = False):
     # Vyčistenie názvu udalosti od medzier
     event_id = event_id.strip()
     # využijeme existujúci run_analysis s override promptu cez environment (dočasne)
@@ -257,14 +402,15 @@ def analyze_batch(event_id: str, req: BatchAnalysisRequest):
                 except Exception:
                     pass
             combined = "\n\n".join(texts)
-            res = analyze_text(combined, req.prompt)
-            return {"result_preview": res[:2000]}
+            usage = GenerationUsage()
+            res = analyze_text(combined, req.prompt, use_cache=not no_cache, usage=usage)
+            return {"result_preview": res[:2000], "usage": usage.as_dict()}
         else:
             # fallback na existujúcu batch analýzu
             msgs = []
             def cb(m: str):
                 msgs.append(m)
-            run_analysis(event_id, ANONYMIZED_DIR, GENERAL_DIR, ANALYSIS_DIR, cb)
+            run_analysis(event_id, ANONYMIZED_DIR, GENERAL_DIR, ANALYSIS_DIR, cb, use_cache=not no_cache)
             return {"message": "Batch analýza spustená/dokončená"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -290,6 +436,22 @@ def list_event_documents(event_id: str):
     }
 
 
+@app.get("/events/{event_id}/db-documents")
+async def list_event_db_documents(event_id: str):
+    """Dokumenty udalosti uložené v DB (iba metadáta, bez textov)."""
+    docs = await _db_read(alist_document_texts, list_document_texts, event_id.strip())
+    return [
+        {
+            "id": d.id,
+            "filename": d.filename,
+            "ocr_text_len": d.ocr_text_len,
+            "anonymized_text_len": d.anonymized_text_len,
+            "content_hash": d.content_hash,
+            "created_at": str(d.created_at),
+        } for d in docs
+    ]
+
+
 @app.get("/events/{event_id}/pdfs")
 def list_event_pdfs(event_id: str):
     sens_dir = os.path.join(EVENTS_BASE_DIR, event_id, "citlive_dokumenty")
@@ -310,55 +472,74 @@ def list_event_pdfs(event_id: str):
 
 # --- API endpointy pre správu promptov ---
 
+PAGE_SIZE_DEFAULT = int(os.getenv('API_PAGE_SIZE', '50'))
+PAGE_SIZE_MAX = 500
+
+
+async def _db_read(async_query, sync_query, *args):
+    """Čítanie z DB bez blokovania event loopu: async session pri DB_ASYNC=true,
+    inak synchrónny dotaz v threadpoole."""
+    async with async_session_scope() as session:
+        if session is not None:
+            return await async_query(session, *args)
+
+    def _sync():
+        session = get_session()
+        if session is None:
+            raise HTTPException(status_code=500, detail="Databáza nie je dostupná")
+        try:
+            return sync_query(session, *args)
+        finally:
+            session.close()
+
+    return await run_in_threadpool(_sync)
+
+
 @app.get("/prompts", response_model=list[PromptResponse])
-def list_prompts():
-    """Získa zoznam všetkých promptov."""
-    session = get_session()
-    if session is None:
-        raise HTTPException(status_code=500, detail="Databáza nie je dostupná")
-    
+async def list_prompts(
+    response: Response,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    after: str | None = None,
+):
+    """Získa stránku promptov (podľa id). Kurzor ďalšej stránky je v hlavičke X-Next-Cursor
+    (parameter `after`); chýba, ak ďalšia stránka neexistuje."""
     try:
-        prompts = session.query(Prompt).all()
-        return [
-            PromptResponse(
-                id=p.id,
-                name=p.name,
-                version=p.version,
-                model=p.model,
-                content=p.content,
-                is_active=p.is_active,
-                created_at=str(p.created_at),
-                updated_at=str(p.updated_at)
-            ) for p in prompts
-        ]
-    finally:
-        session.close()
+        prompts, next_cursor = await _db_read(alist_prompts_page, list_prompts_page, limit, after)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [
+        PromptResponse(
+            id=p.id,
+            name=p.name,
+            version=p.version,
+            model=p.model,
+            content=p.content,
+            is_active=p.is_active,
+            created_at=str(p.created_at),
+            updated_at=str(p.updated_at)
+        ) for p in prompts
+    ]
 
 
 @app.get("/prompts/{prompt_id}", response_model=PromptResponse)
-def get_prompt(prompt_id: int):
+async def get_prompt(prompt_id: int):
     """Získa konkrétny prompt podľa ID."""
-    session = get_session()
-    if session is None:
-        raise HTTPException(status_code=500, detail="Databáza nie je dostupná")
+    prompt = await _db_read(aget_prompt_by_id, get_prompt_by_id, prompt_id)
+    if not prompt:
+        raise HTTPException(status_code=404, detail="Prompt nebol nájdený")
     
-    try:
-        prompt = session.query(Prompt).filter_by(id=prompt_id).first()
-        if not prompt:
-            raise HTTPException(status_code=404, detail="Prompt nebol nájdený")
-        
-        return PromptResponse(
-            id=prompt.id,
-            name=prompt.name,
-            version=prompt.version,
-            model=prompt.model,
-            content=prompt.content,
-            is_active=prompt.is_active,
-            created_at=str(prompt.created_at),
-            updated_at=str(prompt.updated_at)
-        )
-    finally:
-        session.close()
+    return PromptResponse(
+        id=prompt.id,
+        name=prompt.name,
+        version=prompt.version,
+        model=prompt.model,
+        content=prompt.content,
+        is_active=prompt.is_active,
+        created_at=str(prompt.created_at),
+        updated_at=str(prompt.updated_at)
+    )
 
 
 @app.post("/prompts", response_model=PromptResponse)
@@ -369,18 +550,18 @@ def create_prompt(prompt_data: PromptCreate):
         raise HTTPException(status_code=500, detail="Databáza nie je dostupná")
     
     try:
-        # Ak sa má aktivovať nový prompt, deaktivujeme ostatné
-        if prompt_data.is_active:
-            session.query(Prompt).update({"is_active": False})
-        
         prompt = Prompt(
             name=prompt_data.name,
             version=prompt_data.version,
             model=prompt_data.model,
             content=prompt_data.content,
-            is_active=prompt_data.is_active
+            is_active=False
         )
         session.add(prompt)
+        # Ak sa má aktivovať nový prompt, deaktivujeme doterajší aktívny
+        if prompt_data.is_active:
+            session.flush()
+            set_active_prompt(session, prompt)
         session.commit()
         session.refresh(prompt)
         
@@ -422,11 +603,13 @@ def update_prompt(prompt_id: int, prompt_data: PromptUpdate):
             prompt.model = prompt_data.model
         if prompt_data.content is not None:
             prompt.content = prompt_data.content
-        if prompt_data.is_active is not None:
-            prompt.is_active = prompt_data.is_active
-            # Ak sa má aktivovať, deaktivujeme ostatné
-            if prompt_data.is_active:
-                session.query(Prompt).filter(Prompt.id != prompt_id).update({"is_active": False})
+        if prompt_data.is_active:
+            # Ak sa má aktivovať, deaktivujeme doterajší aktívny
+            set_active_prompt(session, prompt)
+        else:
+            if prompt_data.is_active is not None:
+                prompt.is_active = False
+            prompts_changed(session)
         
         session.commit()
         session.refresh(prompt)
@@ -485,11 +668,8 @@ def activate_prompt(prompt_id: int):
         if not prompt:
             raise HTTPException(status_code=404, detail="Prompt nebol nájdený")
         
-        # Deaktivujeme všetky prompty
-        session.query(Prompt).update({"is_active": False})
-        
-        # Aktivujeme vybraný
-        prompt.is_active = True
+        # Aktivujeme vybraný, deaktivuje sa iba doterajší aktívny
+        set_active_prompt(session, prompt)
         session.commit()
         
         return {"message": f"Prompt '{prompt.name}' bol aktivovaný"}
@@ -501,25 +681,31 @@ def activate_prompt(prompt_id: int):
 
 
 @app.get("/prompts/{prompt_id}/runs")
-def get_prompt_runs(prompt_id: int):
-    """Získa históriu behov pre prompt."""
-    session = get_session()
-    if session is None:
-        raise HTTPException(status_code=500, detail="Databáza nie je dostupná")
-    
+async def get_prompt_runs(
+    prompt_id: int,
+    response: Response,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    after: str | None = None,
+):
+    """Získa stránku histórie behov pre prompt (od najnovšieho). Kurzor ďalšej stránky
+    je v hlavičke X-Next-Cursor (parameter `after`)."""
     try:
-        runs = session.query(PromptRun).filter_by(prompt_id=prompt_id).order_by(PromptRun.created_at.desc()).all()
-        return [
-            {
-                "id": run.id,
-                "event_id": run.event_id,
-                "model": run.model,
-                "tokens_in": run.tokens_in,
-                "tokens_out": run.tokens_out,
-                "created_at": str(run.created_at)
-            } for run in runs
-        ]
-    finally:
-        session.close()
+        runs, next_cursor = await _db_read(alist_prompt_runs_page, list_prompt_runs_page, prompt_id, limit, after)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [
+        {
+            "id": run.id,
+            "event_id": run.event_id,
+            "model": run.model,
+            "tokens_in": run.tokens_in,
+            "tokens_out": run.tokens_out,
+            "latency_ms": run.latency_ms,
+            "ttft_ms": run.ttft_ms,
+            "created_at": str(run.created_at)
+        } for run in runs
+    ]
 
 
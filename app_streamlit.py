@@ -12,9 +12,11 @@ load_dotenv(override=False)
 
 # Importujeme refaktorované funkcie z našich skriptov
 from main import run_processing
-from main import inspect_text_for_pii
-from analyza import run_analysis
-from db import get_session, DocumentText, AnalysisResult, ClaimEvent, Prompt, PromptRun, init_db
+from main import get_pii_findings
+from main import warm_up_clients
+from analyza import run_analysis_stream, warm_up_model
+from db import get_session, DocumentText, AnalysisResult, Prompt, init_db, SUMMARY_PREVIEW_CHARS
+from db import get_table_counts, list_prompt_runs_page, list_prompts_page, prompts_changed, set_active_prompt
 
 # --- Konfigurácia Streamlit aplikácie ---
 st.set_page_config(page_title="Analýza Poistných Udalostí", layout="wide")
@@ -45,8 +47,26 @@ ANONYMIZED_DIR = "anonymized_output"
 GENERAL_DIR = "general_output"
 ANALYSIS_DIR = "analysis_output"
 RAW_OCR_DIR = "raw_ocr_output"
+# Počet promptov / behov na stránku v správe promptov
+PROMPT_PAGE_SIZE = int(os.getenv('PROMPT_PAGE_SIZE', '20'))
 
 # --- Pomocné funkcie ---
+@st.cache_resource
+def bootstrap_db() -> bool:
+    """Raz na proces inicializuje schému DB a aplikuje migrácie (nie pri každom prekreslení)."""
+    init_db()
+    return True
+
+@st.cache_resource
+def warm_up_google_clients() -> bool:
+    """Raz na proces vytvorí zdieľané Document AI a DLP klienty a model aktívneho promptu."""
+    try:
+        warm_up_clients()
+        warm_up_model()
+        return True
+    except Exception:
+        return False
+
 def get_available_events(base_dir: str):
     """Načíta zoznam dostupných poistných udalostí (priečinkov)."""
     if not os.path.isdir(base_dir):
@@ -55,20 +75,9 @@ def get_available_events(base_dir: str):
     return sorted([d for d in os.listdir(base_dir) if os.path.isdir(os.path.join(base_dir, d))])
 
 def get_global_metrics():
-    """Vráti počty udalostí, dokumentov a analýz pre prehľadové metriky."""
-    try:
-        session = get_session()
-        if session is None:
-            return 0, 0, 0
-        try:
-            total_events = session.query(ClaimEvent).count()
-            total_docs = session.query(DocumentText).count()
-            total_analysis = session.query(AnalysisResult).count()
-            return total_events, total_docs, total_analysis
-        finally:
-            session.close()
-    except Exception:
-        return 0, 0, 0
+    """Vráti počty udalostí, dokumentov a analýz pre prehľadové metriky (materializované počty, TTL cache)."""
+    counts = get_table_counts()
+    return counts["claim_events"], counts["document_texts"], counts["analysis_results"]
 
 def read_file_content(file_path: str) -> str:
     """Bezpečne načíta obsah textového súboru."""
@@ -177,8 +186,13 @@ def display_results(event_id):
         display_analysis_tabs(event_id, result_path)
         process_button_text = "Spracovať znova"
     
+    incremental = False
+    use_cache = True
+    if os.path.exists(result_path):
+        incremental = st.checkbox("Spracovať iba nové/zmenené dokumenty", value=True, key=f"incremental_{event_id}")
+        use_cache = not st.checkbox("Vynútiť novú analýzu (ignorovať cache modelu)", value=False, key=f"no_cache_{event_id}")
     if st.button(process_button_text):
-        run_full_process(event_id)
+        run_full_process(event_id, incremental=incremental, use_cache=use_cache)
 
 def display_analysis_tabs(event_id, result_path):
     """Zobrazí výsledky v záložkách (Finálna analýza, Detailné výstupy, DB prehľad).
@@ -275,7 +289,8 @@ def display_detailed_outputs(event_id):
                 pii_findings = []
                 try:
                     from main import PROJECT_ID as _PID
-                    pii_findings = inspect_text_for_pii(_PID, raw_content)
+                    # nálezy uložené pri spracovaní (režim DLP_MODE=inspect) alebo z prvého zobrazenia
+                    pii_findings = get_pii_findings(_PID, raw_content, raw_ocr_event_dir, doc_name)
                 except Exception:
                     pii_findings = []
                 # zvýraznenie rozdielov (inline highlighting)
@@ -321,13 +336,17 @@ def display_db_status(event_id: str):
         st.info("Databáza nie je nakonfigurovaná alebo je vypnutá v config.ini.")
         return
     try:
-        total_events = session.query(ClaimEvent).count()
-        total_docs = session.query(DocumentText).count()
-        total_analysis = session.query(AnalysisResult).count()
-        col_a, col_b, col_c = st.columns(3)
-        col_a.metric("Udalosti", total_events)
-        col_b.metric("Dokumenty", total_docs)
-        col_c.metric("Analýzy", total_analysis)
+        try:
+            counts = get_table_counts()
+        except Exception as e:
+            st.warning(f"Počty z DB nie sú dostupné: {e}")
+        else:
+            col_a, col_b, col_c = st.columns(3)
+            col_a.metric("Udalosti", counts["claim_events"])
+            col_b.metric("Dokumenty", counts["document_texts"])
+            col_c.metric("Analýzy", counts["analysis_results"])
+            if counts["refreshed_at"]:
+                st.caption(f"Počty k {counts['refreshed_at']:%Y-%m-%d %H:%M:%S} UTC")
 
         st.markdown("\nZáznamy pre vybranú udalosť:")
         docs = session.query(DocumentText).filter_by(event_id=event_id).all()
@@ -337,8 +356,8 @@ def display_db_status(event_id: str):
                     st.write({
                         "event_id": d.event_id,
                         "filename": d.filename,
-                        "ocr_text_len": len(d.ocr_text or ''),
-                        "anonymized_text_len": len(d.anonymized_text or ''),
+                        "ocr_text_len": d.ocr_text_len or 0,
+                        "anonymized_text_len": d.anonymized_text_len or 0,
                         "created_at": str(getattr(d, 'created_at', '')),
                     })
         else:
@@ -361,7 +380,7 @@ def display_db_status(event_id: str):
                         "event_id": a.event_id,
                         "model": a.model,
                         "created_at": str(getattr(a, 'created_at', '')),
-                        "summary_preview": (a.summary_text or '')[:600] + ("..." if a.summary_text and len(a.summary_text) > 600 else ""),
+                        "summary_preview": (a.summary_preview or '') + ("..." if (a.summary_len or 0) > SUMMARY_PREVIEW_CHARS else ""),
                     })
 
             col_del1, col_del2 = st.columns(2)
@@ -391,7 +410,7 @@ def display_db_status(event_id: str):
     finally:
         session.close()
 
-def run_full_process(event_id):
+def run_full_process(event_id, incremental: bool = False, use_cache: bool = True):
     """Spustí celý proces spracovania a analýzy a zobrazí priebeh."""
     event_path = os.path.join(EVENTS_BASE_DIR, event_id)
     status_placeholder = st.empty()
@@ -405,10 +424,15 @@ def run_full_process(event_id):
     try:
         with st.spinner("Proces prebieha, prosím počkajte..."):
             status_callback("Spúšťam spracovanie dokumentov...")
-            run_processing(event_path, ANONYMIZED_DIR, GENERAL_DIR, RAW_OCR_DIR, status_callback)
+            run_processing(event_path, ANONYMIZED_DIR, GENERAL_DIR, RAW_OCR_DIR, status_callback, incremental=incremental)
             
             status_callback("Spracovanie dokumentov dokončené. Spúšťam analýzu...")
-            run_analysis(event_id, ANONYMIZED_DIR, GENERAL_DIR, ANALYSIS_DIR, status_callback)
+            # výsledok sa vykresľuje priebežne, ako ho model generuje
+            result_placeholder = st.empty()
+            result_text = ""
+            for chunk in run_analysis_stream(event_id, ANONYMIZED_DIR, GENERAL_DIR, ANALYSIS_DIR, status_callback, use_cache=use_cache):
+                result_text += chunk
+                result_placeholder.markdown(result_text)
         
         st.success(f"Proces pre udalosť '{event_id}' bol úspešne dokončený!")
         st.rerun()
@@ -427,13 +451,23 @@ def manage_prompts_section():
         return
     
     try:
-        # Zoznam existujúcich promptov
-        prompts = session.query(Prompt).all()
+        # Zoznam existujúcich promptov – stránkovanie kurzorom (zásobník kurzorov pre návrat späť)
+        cursors = st.session_state.setdefault("prompt_page_cursors", [None])
+        prompts, next_cursor = list_prompts_page(session, PROMPT_PAGE_SIZE, cursors[-1])
         
         col1, col2 = st.columns([2, 1])
         
         with col1:
             st.subheader("Existujúce prompty")
+            col_prev, col_next = st.columns(2)
+            with col_prev:
+                if len(cursors) > 1 and st.button("← Predchádzajúce", key="prompts_prev"):
+                    cursors.pop()
+                    st.rerun()
+            with col_next:
+                if next_cursor and st.button("Ďalšie →", key="prompts_next"):
+                    cursors.append(next_cursor)
+                    st.rerun()
             if prompts:
                 for prompt in prompts:
                     with st.expander(f"{prompt.name} v{prompt.version} {'✅' if prompt.is_active else '❌'}"):
@@ -444,6 +478,37 @@ def manage_prompts_section():
                         
                         st.text_area("Obsah promptu", prompt.content, height=150, key=f"view_{prompt.id}")
                         
+                        # História behov – načíta sa až na požiadanie (expander sa vykresľuje
+                        # pri každom rerun aj zbalený), najnovšie, staršie po stránkach
+                        runs_open_key = f"runs_open_{prompt.id}"
+                        runs_key = f"runs_cursor_{prompt.id}"
+                        if not st.session_state.get(runs_open_key):
+                            if st.button("Zobraziť históriu behov", key=f"runs_show_{prompt.id}"):
+                                st.session_state[runs_open_key] = True
+                                st.rerun()
+                        else:
+                            runs, runs_next = list_prompt_runs_page(session, prompt.id, PROMPT_PAGE_SIZE, st.session_state.get(runs_key))
+                            st.caption("História behov")
+                            if runs:
+                                st.dataframe([
+                                    {"event_id": r.event_id, "model": r.model, "tokens_in": r.tokens_in,
+                                     "tokens_out": r.tokens_out, "latency_ms": r.latency_ms, "ttft_ms": r.ttft_ms,
+                                     "created_at": str(r.created_at)}
+                                    for r in runs
+                                ], use_container_width=True)
+                            else:
+                                st.info("Prompt zatiaľ nemá žiadne behy.")
+                            if st.session_state.get(runs_key) and st.button("Najnovšie behy", key=f"runs_first_{prompt.id}"):
+                                st.session_state[runs_key] = None
+                                st.rerun()
+                            if runs_next and st.button("Staršie behy", key=f"runs_next_{prompt.id}"):
+                                st.session_state[runs_key] = runs_next
+                                st.rerun()
+                            if st.button("Skryť históriu behov", key=f"runs_hide_{prompt.id}"):
+                                st.session_state[runs_open_key] = False
+                                st.session_state[runs_key] = None
+                                st.rerun()
+                        
                         col_edit, col_activate, col_delete = st.columns(3)
                         with col_edit:
                             if st.button("Upraviť", key=f"edit_{prompt.id}"):
@@ -453,10 +518,8 @@ def manage_prompts_section():
                             if not prompt.is_active:
                                 if st.button("Aktivovať", key=f"activate_{prompt.id}"):
                                     try:
-                                        # Deaktivujeme všetky prompty
-                                        session.query(Prompt).update({"is_active": False})
-                                        # Aktivujeme vybraný
-                                        prompt.is_active = True
+                                        # Aktivujeme vybraný, deaktivuje sa iba doterajší aktívny
+                                        set_active_prompt(session, prompt)
                                         session.commit()
                                         st.success(f"Prompt '{prompt.name}' bol aktivovaný!")
                                         st.rerun()
@@ -493,6 +556,7 @@ def manage_prompts_section():
                                             prompt.model = new_model
                                             prompt.content = new_content
                                             prompt.updated_at = datetime.datetime.utcnow()
+                                            prompts_changed(session)
                                             session.commit()
                                             st.success("Prompt bol úspešne upravený!")
                                             st.session_state[f"editing_prompt_{prompt.id}"] = False
@@ -524,18 +588,18 @@ def manage_prompts_section():
                         st.error("Názov a obsah promptu sú povinné!")
                     else:
                         try:
-                            # Ak sa má aktivovať nový prompt, deaktivujeme ostatné
-                            if is_active:
-                                session.query(Prompt).update({"is_active": False})
-                            
                             new_prompt = Prompt(
                                 name=name,
                                 version=version,
                                 model=model,
                                 content=content,
-                                is_active=is_active
+                                is_active=False
                             )
                             session.add(new_prompt)
+                            # Ak sa má aktivovať nový prompt, deaktivujeme doterajší aktívny
+                            if is_active:
+                                session.flush()
+                                set_active_prompt(session, new_prompt)
                             session.commit()
                             st.success(f"Prompt '{name}' bol úspešne vytvorený!")
                             st.rerun()
@@ -550,7 +614,8 @@ def manage_prompts_section():
 def main():
     """Hlavný beh Streamlit aplikácie."""
     # Inicializácia databázy pri spustení
-    init_db()
+    bootstrap_db()
+    warm_up_google_clients()
     
     # Sidebar pre navigáciu
     st.sidebar.title("Navigácia")
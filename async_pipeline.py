@@ -0,0 +1,107 @@
+"""Asynchrónny pipeline spracovania dokumentov s prekrývaním krokov OCR → DLP → DB.
+
+Kroky sú prepojené ohraničenými frontami (asyncio.Queue s maxsize), takže kým sa
+dokument N anonymizuje, dokument N+1 už prechádza OCR a dokument N-1 sa ukladá.
+Plná fronta pozdrží predchádzajúci krok (backpressure). Beh sa dá zrušiť cez
+threading.Event (napr. z iného vlákna / UI) alebo zrušením samotnej korutiny.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable
+
+_DONE = object()
+
+
+class PipelineCancelled(Exception):
+    """Pipeline bol zrušený skôr, ako spracoval všetky dokumenty."""
+
+
+async def run_pipeline(
+    items: list[Any],
+    ocr: Callable[[Any], Awaitable[str]],
+    anonymize: Callable[[Any, str], Awaitable[str]],
+    persist: Callable[[Any, str, str | None], Awaitable[None]],
+    on_result: Callable[[Any, Exception | None], None],
+    needs_dlp: Callable[[Any], bool],
+    queue_size: int = 8,
+    ocr_workers: int = 4,
+    dlp_workers: int = 4,
+    cancel_event: threading.Event | None = None,
+) -> None:
+    """Spracuje položky cez kroky OCR → (DLP) → persist.
+
+    ocr(item) -> text; anonymize(item, text) -> anonymizovaný text (iba ak needs_dlp(item));
+    persist(item, ocr_text, anonymized_text | None) uloží výstupy. on_result(item, chyba|None)
+    sa volá raz pre každú dokončenú položku (chyba v ľubovoľnom kroku izoluje iba danú položku).
+    Pri zrušení vyhodí PipelineCancelled; položky, ktoré nedobehli, sa v on_result neobjavia.
+    """
+    ocr_q: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    dlp_q: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    db_q: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    async def producer():
+        for item in items:
+            await ocr_q.put(item)
+        for _ in range(ocr_workers):
+            await ocr_q.put(_DONE)
+
+    async def ocr_worker():
+        while (item := await ocr_q.get()) is not _DONE:
+            try:
+                text = await ocr(item)
+            except Exception as e:
+                await db_q.put((item, None, None, e))
+                continue
+            if needs_dlp(item):
+                await dlp_q.put((item, text))
+            else:
+                await db_q.put((item, text, None, None))
+
+    async def dlp_worker():
+        while (entry := await dlp_q.get()) is not _DONE:
+            item, text = entry
+            try:
+                await db_q.put((item, text, await anonymize(item, text), None))
+            except Exception as e:
+                await db_q.put((item, text, None, e))
+
+    async def db_worker():
+        while (entry := await db_q.get()) is not _DONE:
+            item, text, anonymized, error = entry
+            if error is None:
+                try:
+                    await persist(item, text, anonymized)
+                except Exception as e:
+                    error = e
+            on_result(item, error)
+
+    async def stage(workers: list[Awaitable], next_q: asyncio.Queue, next_count: int):
+        await asyncio.gather(*workers)
+        for _ in range(next_count):
+            await next_q.put(_DONE)
+
+    main = asyncio.gather(
+        producer(),
+        stage([ocr_worker() for _ in range(ocr_workers)], dlp_q, dlp_workers),
+        stage([dlp_worker() for _ in range(dlp_workers)], db_q, 1),
+        db_worker(),
+    )
+
+    async def watch_cancel():
+        while not main.done():
+            if cancel_event is not None and cancel_event.is_set():
+                main.cancel()
+                return
+            await asyncio.sleep(0.1)
+
+    watcher = asyncio.ensure_future(watch_cancel())
+    try:
+        await main
+    except asyncio.CancelledError:
+        if cancel_event is not None and cancel_event.is_set():
+            raise PipelineCancelled("Spracovanie bolo zrušené") from None
+        raise
+    finally:
+        watcher.cancel()
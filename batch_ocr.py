@@ -0,0 +1,167 @@
+"""Dávkové OCR cez Document AI batch processing (long-running operation).
+
+Všetky PDF sa nahrajú do GCS, odošlú ako jedna operácia `batch_process_documents`,
+operácia sa periodicky kontroluje a po dokončení sa z GCS načítajú výsledné
+Document JSON súbory. Engine pracuje nad backendom s rozhraním
+submit / poll / collect / cleanup, takže sa dá nahradiť lokálnym
+`FakeOperationServer` (testy, vývoj bez GCS).
+"""
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from google.cloud import documentai_v1 as documentai
+
+import clients
+import rate_limit
+
+# Document AI prijme v jednej dávke najviac 1000 dokumentov
+BATCH_MAX_DOCUMENTS = 1000
+
+
+def _split_gcs_uri(gcs_uri: str) -> tuple[str, str]:
+    """gs://bucket/prefix → (bucket, prefix bez koncového lomítka)."""
+    if not gcs_uri.startswith("gs://"):
+        raise ValueError(f"Neplatná GCS cesta: {gcs_uri}")
+    bucket, _, prefix = gcs_uri[len("gs://"):].partition("/")
+    return bucket, prefix.strip("/")
+
+
+class DocumentAIBatchBackend:
+    """Skutočný backend: GCS + Document AI batch_process_documents."""
+
+    def __init__(self, project_id: str, location: str, processor_id: str, gcs_uri: str):
+        self.project_id = project_id
+        self.location = location
+        self.processor_id = processor_id
+        self.bucket_name, self.prefix = _split_gcs_uri(gcs_uri)
+
+    def _bucket(self):
+        return clients.get_storage_client(self.project_id).bucket(self.bucket_name)
+
+    def submit(self, file_paths: list[str], mime_type: str) -> dict:
+        run_prefix = "/".join(p for p in (self.prefix, f"batch-{uuid.uuid4().hex}") if p)
+        bucket = self._bucket()
+        sources: dict[str, str] = {}
+        documents = []
+        for idx, path in enumerate(file_paths):
+            blob_name = f"{run_prefix}/input/{idx:05d}.pdf"
+            bucket.blob(blob_name).upload_from_filename(path, content_type=mime_type)
+            uri = f"gs://{self.bucket_name}/{blob_name}"
+            sources[uri] = path
+            documents.append(documentai.GcsDocument(gcs_uri=uri, mime_type=mime_type))
+
+        client = clients.get_documentai_client(self.location)
+        request = documentai.BatchProcessRequest(
+            name=client.processor_path(self.project_id, self.location, self.processor_id),
+            input_documents=documentai.BatchDocumentsInputConfig(
+                gcs_documents=documentai.GcsDocuments(documents=documents)
+            ),
+            document_output_config=documentai.DocumentOutputConfig(
+                gcs_output_config=documentai.DocumentOutputConfig.GcsOutputConfig(
+                    gcs_uri=f"gs://{self.bucket_name}/{run_prefix}/output/"
+                )
+            ),
+        )
+        operation = rate_limit.guard("documentai").call(client.batch_process_documents, request=request, retry=None)
+        return {"operation": operation, "sources": sources, "run_prefix": run_prefix}
+
+    def poll(self, handle: dict) -> bool:
+        return handle["operation"].done()
+
+    def collect(self, handle: dict) -> dict[str, str]:
+        operation = handle["operation"]
+        if operation.exception() is not None:
+            raise RuntimeError(f"Dávkové OCR zlyhalo: {operation.exception()}")
+        metadata = operation.metadata
+        bucket = self._bucket()
+        results: dict[str, str] = {}
+        for status in metadata.individual_process_statuses:
+            path = handle["sources"].get(status.input_gcs_source)
+            if path is None or status.status.code != 0 or not status.output_gcs_destination:
+                continue
+            _, out_prefix = _split_gcs_uri(status.output_gcs_destination)
+            shards = []
+            for blob in bucket.list_blobs(prefix=out_prefix + "/"):
+                if not blob.name.endswith(".json"):
+                    continue
+                doc = documentai.Document.from_json(blob.download_as_bytes(), ignore_unknown_fields=True)
+                shards.append((int(doc.shard_info.shard_index), doc.text))
+            # Veľké dokumenty sú rozdelené na shardy – text spájame podľa poradia shardu
+            results[path] = "".join(text for _, text in sorted(shards))
+        return results
+
+    def cleanup(self, handle: dict) -> None:
+        bucket = self._bucket()
+        for blob in bucket.list_blobs(prefix=handle["run_prefix"] + "/"):
+            try:
+                blob.delete()
+            except Exception:
+                pass
+
+
+class FakeOperationServer:
+    """Lokálna náhrada batch backendu pre testy a vývoj bez GCS.
+
+    Po submit spracuje súbory na pozadí funkciou ocr_func(file_path) -> text;
+    operácia je hotová, keď dobehnú všetky súbory a prebehlo aspoň polls_until_done
+    volaní poll (simulácia dlhotrvajúcej operácie). Súbory, pri ktorých ocr_func
+    zlyhá, vo výsledku chýbajú – rovnako ako pri chybe jednotlivého dokumentu v Document AI.
+    """
+
+    def __init__(self, ocr_func: Callable[[str], str], polls_until_done: int = 1, max_workers: int = 4):
+        self.ocr_func = ocr_func
+        self.polls_until_done = polls_until_done
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fake-batch")
+        self._lock = threading.Lock()
+        self.submitted: list[list[str]] = []
+
+    def submit(self, file_paths: list[str], mime_type: str) -> dict:
+        with self._lock:
+            self.submitted.append(list(file_paths))
+        futures = {path: self._executor.submit(self.ocr_func, path) for path in file_paths}
+        return {"futures": futures, "polls": 0}
+
+    def poll(self, handle: dict) -> bool:
+        handle["polls"] += 1
+        return handle["polls"] >= self.polls_until_done and all(f.done() for f in handle["futures"].values())
+
+    def collect(self, handle: dict) -> dict[str, str]:
+        return {path: f.result() for path, f in handle["futures"].items() if f.exception() is None}
+
+    def cleanup(self, handle: dict) -> None:
+        pass
+
+
+class BatchOCREngine:
+    """Odošle súbory po dávkach ako long-running operácie a počká na výsledky."""
+
+    def __init__(self, backend, poll_interval: float = 5.0, timeout: float = 1800.0,
+                 max_documents: int = BATCH_MAX_DOCUMENTS):
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.max_documents = max_documents
+
+    def run(self, file_paths: list[str], mime_type: str, status_callback: Callable | None = None) -> dict[str, str]:
+        """Vráti {file_path: text} pre úspešne spracované súbory (chýbajúce treba spracovať online)."""
+        results: dict[str, str] = {}
+        for start in range(0, len(file_paths), self.max_documents):
+            chunk = file_paths[start:start + self.max_documents]
+            handle = self.backend.submit(chunk, mime_type)
+            try:
+                deadline = time.monotonic() + self.timeout
+                while not self.backend.poll(handle):
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"Dávkové OCR neskončilo do {self.timeout:.0f} s")
+                    time.sleep(self.poll_interval)
+                results.update(self.backend.collect(handle))
+            finally:
+                self.backend.cleanup(handle)
+            if status_callback:
+                status_callback(f"Dávkové OCR: hotových {min(start + len(chunk), len(file_paths))}/{len(file_paths)} dokumentov")
+        return results
@@ -0,0 +1,111 @@
+"""Benchmark kompresie textov v DB: veľkosť a latencia zápisu/čítania pre každý kodek.
+
+Použitie:
+    python bench_compression.py [adresár_s_txt] [--rows N]
+
+Bez adresára sa použijú OCR texty z RAW_OCR_DIR (ak existujú), inak syntetický text.
+Každý kodek sa meria na dočasnej SQLite DB (samostatný proces kvôli DB_TEXT_COMPRESSION
+čítanej pri importe): uložené bajty, pomer, čas zápisu a čas čítania všetkých textov.
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+RAW_OCR_DIR = "raw_ocr_output"
+
+_SAMPLE = (
+    "Poistná udalosť č. {n}. Dňa 12.03.2024 o 14:35 došlo na ulici Hlavná 15, Bratislava "
+    "k dopravnej nehode vozidla EČV BA-{n:03d}XY. Poškodený Ján Novák, nar. 01.01.1980, "
+    "uviedol, že vozidlo bolo zaparkované. Výška škody podľa rozpočtu servisu: {n}0,00 EUR.\n"
+)
+
+
+def _load_texts(directory: str | None, rows: int) -> list[str]:
+    paths = sorted(glob.glob(os.path.join(directory or RAW_OCR_DIR, '**', '*.txt'), recursive=True))
+    texts = []
+    for path in paths[:rows]:
+        with open(path, 'r', encoding='utf-8') as f:
+            texts.append(f.read())
+    if not texts:
+        rnd = random.Random(0)
+        texts = ["".join(_SAMPLE.format(n=rnd.randint(1, 99999)) for _ in range(400)) for _ in range(rows)]
+    return texts
+
+
+def _run_codec(texts_path: str) -> dict:
+    """Beží v podprocese s nastaveným DB_TEXT_COMPRESSION."""
+    with open(texts_path, 'r', encoding='utf-8') as f:
+        texts = json.load(f)
+    db_path = os.path.join(os.path.dirname(texts_path), f"bench_{os.getenv('DB_TEXT_COMPRESSION')}.db")
+    os.environ['DATABASE_URL'] = f"sqlite:///{db_path}"
+    import db
+    from db_compression import compress_text
+    from sqlalchemy import text as sql
+
+    compress_text('x' * 1024)  # chýbajúci kodek (zstandard) sa prejaví hneď
+    db.init_db()
+    start = time.perf_counter()
+    uow = db.EventUnitOfWork('BENCH')
+    for i, text in enumerate(texts):
+        uow.add(f"doc_{i}.txt", text, text)
+    if uow.flush():
+        raise RuntimeError("zápis do DB zlyhal")
+    write_s = time.perf_counter() - start
+
+    session = db.get_session()
+    try:
+        # veľkosť v bajtoch (LENGTH nad TEXT v SQLite vracia znaky)
+        stored = session.execute(sql("SELECT SUM(LENGTH(CAST(ocr_text AS BLOB))) FROM document_texts")).scalar() or 0
+        start = time.perf_counter()
+        loaded = [d.ocr_text for d in session.query(db.DocumentText).all()]
+        read_s = time.perf_counter() - start
+    finally:
+        session.close()
+    if sorted(loaded) != sorted(texts):
+        raise RuntimeError("načítané texty sa nezhodujú s uloženými")
+    return {"stored_bytes": stored, "write_ms": write_s * 1000, "read_ms": read_s * 1000}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark kompresie textov v DB")
+    parser.add_argument('directory', nargs='?', help="Adresár s .txt (predvolene RAW_OCR_DIR)")
+    parser.add_argument('--rows', type=int, default=200, help="Max. počet textov")
+    parser.add_argument('--_codec_worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._codec_worker:
+        print(json.dumps(_run_codec(args._codec_worker)))
+        return
+
+    texts = _load_texts(args.directory, args.rows)
+    raw_bytes = sum(len(t.encode('utf-8')) for t in texts)
+    print(f"Textov: {len(texts)}, nekomprimovane: {raw_bytes / 1024:.1f} KiB")
+    print(f"{'kodek':<6} {'uložené KiB':>12} {'pomer':>7} {'zápis ms':>10} {'čítanie ms':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        texts_path = os.path.join(tmp, 'texts.json')
+        with open(texts_path, 'w', encoding='utf-8') as f:
+            json.dump(texts, f)
+        for codec in ('none', 'zlib', 'zstd'):
+            env = dict(os.environ, DB_TEXT_COMPRESSION=codec)
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--_codec_worker', texts_path],
+                env=env, capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                print(f"{codec:<6} nedostupný ({proc.stderr.strip().splitlines()[-1] if proc.stderr else 'chyba'})")
+                continue
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+            ratio = raw_bytes / r['stored_bytes'] if r['stored_bytes'] else 0
+            print(f"{codec:<6} {r['stored_bytes'] / 1024:>12.1f} {ratio:>7.2f} {r['write_ms']:>10.1f} {r['read_ms']:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Zdieľané klienty Google Cloud služieb (Document AI, DLP, Gemini modely).
+
+Klienty sa vytvárajú raz na proces a endpoint, takže gRPC kanál, načítanie
+credentials a TLS handshake sa neplatia pri každom dokumente. GAPIC klienty sú
+bezpečné na súbežné použitie z viacerých vlákien.
+"""
+from __future__ import annotations
+
+import json
+import threading
+
+from google.cloud import documentai_v1 as documentai
+from google.cloud import dlp_v2
+
+DLP_DEFAULT_ENDPOINT = "dlp.googleapis.com"
+
+_lock = threading.Lock()
+_documentai_clients: dict[str, documentai.DocumentProcessorServiceClient] = {}
+_dlp_clients: dict[str, dlp_v2.DlpServiceClient] = {}
+_storage_clients: dict[str, object] = {}
+_generative_models: dict[tuple[bool, str, str], object] = {}
+
+
+def documentai_endpoint(location: str) -> str:
+    return f"{location}-documentai.googleapis.com"
+
+
+def get_documentai_client(location: str) -> documentai.DocumentProcessorServiceClient:
+    """Vráti zdieľaného Document AI klienta pre danú lokalitu (eu, us, ...)."""
+    endpoint = documentai_endpoint(location)
+    client = _documentai_clients.get(endpoint)
+    if client is None:
+        with _lock:
+            client = _documentai_clients.get(endpoint)
+            if client is None:
+                client = documentai.DocumentProcessorServiceClient(client_options={"api_endpoint": endpoint})
+                _documentai_clients[endpoint] = client
+    return client
+
+
+def get_dlp_client(api_endpoint: str | None = None) -> dlp_v2.DlpServiceClient:
+    """Vráti zdieľaného DLP klienta (lokalita sa určuje cez parent v požiadavke)."""
+    endpoint = api_endpoint or DLP_DEFAULT_ENDPOINT
+    client = _dlp_clients.get(endpoint)
+    if client is None:
+        with _lock:
+            client = _dlp_clients.get(endpoint)
+            if client is None:
+                client = dlp_v2.DlpServiceClient(client_options={"api_endpoint": endpoint})
+                _dlp_clients[endpoint] = client
+    return client
+
+
+def get_storage_client(project_id: str):
+    """Vráti zdieľaného Cloud Storage klienta (potrebný iba pre dávkové OCR)."""
+    client = _storage_clients.get(project_id)
+    if client is None:
+        with _lock:
+            client = _storage_clients.get(project_id)
+            if client is None:
+                from google.cloud import storage
+                client = storage.Client(project=project_id)
+                _storage_clients[project_id] = client
+    return client
+
+
+def get_generative_model(model_name: str, vertex: bool, generation_config: dict | None = None):
+    """Vráti zdieľanú inštanciu GenerativeModel (Vertex AI alebo Google AI Studio) pre
+    rozlíšený názov modelu a generation config. vertexai.init / genai.configure
+    musí prebehnúť vopred (analyza.py)."""
+    key = (vertex, model_name, json.dumps(generation_config or {}, sort_keys=True))
+    model = _generative_models.get(key)
+    if model is None:
+        with _lock:
+            model = _generative_models.get(key)
+            if model is None:
+                if vertex:
+                    from vertexai.generative_models import GenerativeModel
+                else:
+                    from google.generativeai import GenerativeModel
+                model = GenerativeModel(model_name, generation_config=generation_config)
+                _generative_models[key] = model
+    return model
+
+
+def create_documentai_async_client(location: str) -> documentai.DocumentProcessorServiceAsyncClient:
+    """Nový asynchrónny Document AI klient. Async kanál je viazaný na event loop,
+    preto sa necachuje procesne – vytvára sa raz na beh pipeline."""
+    return documentai.DocumentProcessorServiceAsyncClient(client_options={"api_endpoint": documentai_endpoint(location)})
+
+
+def create_dlp_async_client(api_endpoint: str | None = None) -> dlp_v2.DlpServiceAsyncClient:
+    """Nový asynchrónny DLP klient (viazaný na aktuálny event loop)."""
+    return dlp_v2.DlpServiceAsyncClient(client_options={"api_endpoint": api_endpoint or DLP_DEFAULT_ENDPOINT})
+
+
+def warm_up(documentai_location: str, dlp_endpoint: str | None = None) -> None:
+    """Vytvorí klienty vopred (pri štarte API/Streamlit), aby prvý dokument nečakal na setup."""
+    get_documentai_client(documentai_location)
+    get_dlp_client(dlp_endpoint)
+
+
+def close_all() -> None:
+    """Zatvorí všetky kanály (pri ukončení procesu)."""
+    with _lock:
+        clients = list(_documentai_clients.values()) + list(_dlp_clients.values())
+        _documentai_clients.clear()
+        _dlp_clients.clear()
+        _storage_clients.clear()
+        _generative_models.clear()
+    for client in clients:
+        try:
+            client.transport.close()
+        except Exception:
+            pass
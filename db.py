@@ -1,11 +1,23 @@
 from __future__ import annotations
 
+import base64
 import datetime as dt
+import hashlib
+import json
 import os
+import threading
+import time
+from contextlib import asynccontextmanager
 from typing import Optional
 
-from sqlalchemy import create_engine, String, Text, DateTime, Integer
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, sessionmaker
+from sqlalchemy import and_, bindparam, create_engine, insert, or_, select, update, Index, String, Text, DateTime, Integer, UniqueConstraint
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, sessionmaker, validates
+
+import db_pool
+from db_compression import CompressedText, compression_enabled
 
 
 class Base(DeclarativeBase):
@@ -15,10 +27,21 @@ class Base(DeclarativeBase):
 # Preferuj .env / env variables
 DATABASE_URL = os.getenv('DATABASE_URL', '')
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True) if DATABASE_URL else None
+# Parametre poolu a SQLite pragmy z prostredia (db_pool.py), metriky poolu pre /metrics/db-pool
+engine = create_engine(DATABASE_URL, **db_pool.engine_options(DATABASE_URL)) if DATABASE_URL else None
+pool_metrics = db_pool.instrument(engine) if engine else None
 SessionLocal = sessionmaker(bind=engine) if engine else None
 
 
+def pool_stats() -> dict:
+    if engine is None:
+        return {"enabled": False}
+    result = {"enabled": True, **db_pool.stats(engine, pool_metrics)}
+    if _async_engine is not None:
+        result["async"] = db_pool.stats(_async_engine.sync_engine, _async_pool_metrics)
+    return result
+
+
 class ClaimEvent(Base):
     __tablename__ = 'claim_events'
 
@@ -29,14 +52,41 @@ class ClaimEvent(Base):
 
 class DocumentText(Base):
     __tablename__ = 'document_texts'
+    __table_args__ = (UniqueConstraint('event_id', 'filename', name='uq_document_texts_event_filename'),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     event_id: Mapped[str] = mapped_column(String(255), index=True)
     filename: Mapped[str] = mapped_column(String(512), index=True)
-    ocr_text: Mapped[Optional[str]] = mapped_column(Text)
-    anonymized_text: Mapped[Optional[str]] = mapped_column(Text)
+    # Veľké texty sa načítajú až pri prístupe (deferred); prehľady používajú *_len
+    ocr_text: Mapped[Optional[str]] = mapped_column(CompressedText, deferred=True)
+    anonymized_text: Mapped[Optional[str]] = mapped_column(CompressedText, deferred=True)
+    ocr_text_len: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    anonymized_text_len: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # SHA-256 z (ocr_text, anonymized_text) – nezmenený obsah sa pri opätovnom spracovaní neprepisuje
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
     created_at: Mapped[dt.datetime] = mapped_column(DateTime, default=dt.datetime.utcnow)
 
+    @validates('ocr_text', 'anonymized_text')
+    def _store_length(self, key, value):
+        setattr(self, f'{key}_len', _text_len(value))
+        return value
+
+
+def _text_len(value: str | None) -> int | None:
+    return len(value) if value is not None else None
+
+
+def document_content_hash(ocr_text: str | None, anonymized_text: str | None) -> str:
+    h = hashlib.sha256()
+    h.update((ocr_text or '').encode('utf-8'))
+    h.update(b'\0')
+    h.update((anonymized_text or '').encode('utf-8'))
+    return h.hexdigest()
+
+
+# Dĺžka náhľadu analýzy uloženého v analysis_results.summary_preview
+SUMMARY_PREVIEW_CHARS = 600
+
 
 class AnalysisResult(Base):
     __tablename__ = 'analysis_results'
@@ -44,9 +94,17 @@ class AnalysisResult(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     event_id: Mapped[str] = mapped_column(String(255), index=True)
     model: Mapped[str] = mapped_column(String(255))
-    summary_text: Mapped[str] = mapped_column(Text)
+    summary_text: Mapped[str] = mapped_column(CompressedText, deferred=True)
+    summary_len: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    summary_preview: Mapped[Optional[str]] = mapped_column(String(SUMMARY_PREVIEW_CHARS), nullable=True)
     created_at: Mapped[dt.datetime] = mapped_column(DateTime, default=dt.datetime.utcnow)
 
+    @validates('summary_text')
+    def _store_preview(self, key, value):
+        self.summary_len = _text_len(value)
+        self.summary_preview = value[:SUMMARY_PREVIEW_CHARS] if value is not None else None
+        return value
+
 
 class Prompt(Base):
     __tablename__ = 'prompts'
@@ -56,13 +114,15 @@ class Prompt(Base):
     version: Mapped[str] = mapped_column(String(50), default='1.0')
     model: Mapped[str] = mapped_column(String(255))
     content: Mapped[str] = mapped_column(Text)
-    is_active: Mapped[bool] = mapped_column(default=True)
+    is_active: Mapped[bool] = mapped_column(default=True, index=True)
     created_at: Mapped[dt.datetime] = mapped_column(DateTime, default=dt.datetime.utcnow)
     updated_at: Mapped[dt.datetime] = mapped_column(DateTime, default=dt.datetime.utcnow, onupdate=dt.datetime.utcnow)
 
 
 class PromptRun(Base):
     __tablename__ = 'prompt_runs'
+    # Stránkovanie histórie behov promptu (keyset podľa created_at, id)
+    __table_args__ = (Index('ix_prompt_runs_prompt_created', 'prompt_id', 'created_at', 'id'),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     prompt_id: Mapped[int] = mapped_column(Integer, index=True)
@@ -70,14 +130,67 @@ class PromptRun(Base):
     model: Mapped[str] = mapped_column(String(255))
     tokens_in: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     tokens_out: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # celkový čas behu a čas do prvej časti výsledku (ms)
+    latency_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    ttft_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     created_at: Mapped[dt.datetime] = mapped_column(DateTime, default=dt.datetime.utcnow)
 
 
-def init_db() -> None:
-    if engine is None:
+class CacheGeneration(Base):
+    """Počítadlo zmien zdieľané medzi procesmi (API, Streamlit) pre invalidáciu in-process cache."""
+    __tablename__ = 'cache_generations'
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    generation: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[dt.datetime] = mapped_column(DateTime, default=dt.datetime.utcnow, onupdate=dt.datetime.utcnow)
+
+
+class TableStat(Base):
+    """Materializované počty riadkov (obnovované periodicky namiesto COUNT(*) pri každom zobrazení)."""
+    __tablename__ = 'table_stats'
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    row_count: Mapped[int] = mapped_column(Integer, default=0)
+    refreshed_at: Mapped[dt.datetime] = mapped_column(DateTime, default=dt.datetime.utcnow)
+
+
+class SchemaVersion(Base):
+    __tablename__ = 'schema_version'
+
+    version: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    description: Mapped[str] = mapped_column(String(255))
+    applied_at: Mapped[dt.datetime] = mapped_column(DateTime, default=dt.datetime.utcnow)
+
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def init_db(force: bool = False) -> None:
+    """Jednorazová inicializácia schémy pri štarte procesu (API, Streamlit, CLI).
+
+    Vytvorí chýbajúce tabuľky, aplikuje verzované migrácie (migrations.py) a založí
+    predvolený prompt. Ďalšie volania v tom istom procese nerobia nič (force=True vynúti).
+    Cesty požiadaviek DDL nespúšťajú.
+    """
+    global _schema_ready
+    if engine is None or (_schema_ready and not force):
         return
-    Base.metadata.create_all(engine)
-    
+    with _schema_lock:
+        if _schema_ready and not force:
+            return
+        from migrations import apply_migrations, ensure_text_storage
+
+        Base.metadata.create_all(engine)
+        apply_migrations(engine)
+        if compression_enabled():
+            with engine.begin() as conn:
+                ensure_text_storage(conn, binary=True)
+        _seed_default_prompt()
+        _schema_ready = True
+
+
+def _seed_default_prompt() -> None:
     # Inicializácia predvoleného promptu ak neexistuje
     session = get_session()
     if session is not None:
@@ -108,16 +221,504 @@ def get_session():
     return SessionLocal()
 
 
+def get_generation(session, name: str) -> int:
+    value = session.query(CacheGeneration.generation).filter_by(name=name).scalar()
+    return value or 0
+
+
+def bump_generation(session, name: str) -> None:
+    """Zvýši počítadlo zmien v rámci transakcie session (commit robí volajúci)."""
+    updated = session.query(CacheGeneration).filter_by(name=name).update(
+        {"generation": CacheGeneration.generation + 1, "updated_at": dt.datetime.utcnow()},
+        synchronize_session=False,
+    )
+    if not updated:
+        session.add(CacheGeneration(name=name, generation=1))
+
+
+# Ako často (s) sa overuje, či sa aktívny prompt nezmenil v inom procese
+ACTIVE_PROMPT_CACHE_SECONDS = float(os.getenv('ACTIVE_PROMPT_CACHE_SECONDS', '2'))
+_ACTIVE_PROMPT = 'active_prompt'
+_active_prompt_lock = threading.Lock()
+_active_prompt_cache: dict = {"loaded": False, "prompt": None, "generation": -1, "checked_at": 0.0}
+
+
+def prompts_changed(session) -> None:
+    """Označí zmenu promptov (aktivácia, úprava) – ostatné procesy načítajú aktívny prompt znovu.
+    Volať v tej istej transakcii ako samotnú zmenu."""
+    bump_generation(session, _ACTIVE_PROMPT)
+    with _active_prompt_lock:
+        _active_prompt_cache["loaded"] = False
+
+
+def set_active_prompt(session, prompt: Prompt) -> None:
+    """Aktivuje prompt; deaktivuje iba doterajší aktívny riadok (nie celú tabuľku)."""
+    session.query(Prompt).filter_by(is_active=True).filter(Prompt.id != prompt.id).update(
+        {"is_active": False}, synchronize_session=False
+    )
+    prompt.is_active = True
+    prompts_changed(session)
+
+
 def get_active_prompt() -> Optional[Prompt]:
-    """Získa aktívny prompt z databázy."""
+    """Získa aktívny prompt (odpojený objekt z in-process cache).
+
+    Najviac raz za ACTIVE_PROMPT_CACHE_SECONDS sa overí počítadlo zmien
+    v cache_generations (jeden dotaz podľa primárneho kľúča); prompt sa
+    načíta z DB iba ak sa počítadlo zmenilo.
+    """
+    now = time.monotonic()
+    with _active_prompt_lock:
+        cache = dict(_active_prompt_cache)
+    if cache["loaded"] and now - cache["checked_at"] < ACTIVE_PROMPT_CACHE_SECONDS:
+        return cache["prompt"]
     session = get_session()
     if session is None:
         return None
     try:
-        return session.query(Prompt).filter_by(is_active=True).first()
+        generation = get_generation(session, _ACTIVE_PROMPT)
+        if cache["loaded"] and generation == cache["generation"]:
+            prompt = cache["prompt"]
+        else:
+            prompt = session.query(Prompt).filter_by(is_active=True).first()
+            if prompt is not None:
+                session.expunge(prompt)
+        with _active_prompt_lock:
+            _active_prompt_cache.update(loaded=True, prompt=prompt, generation=generation, checked_at=now)
+        return prompt
     except Exception:
         return None
     finally:
         session.close()
 
 
+# Počty riadkov: TTL cache v procese a perióda prepočtu materializácie v table_stats
+STATS_CACHE_SECONDS = float(os.getenv('DB_STATS_CACHE_SECONDS', '30'))
+STATS_REFRESH_SECONDS = float(os.getenv('DB_STATS_REFRESH_SECONDS', '300'))
+_COUNTED_MODELS = {'claim_events': ClaimEvent, 'document_texts': DocumentText, 'analysis_results': AnalysisResult}
+_stats_lock = threading.Lock()
+_stats_cache: dict = {"counts": None, "loaded_at": 0.0}
+
+
+def refresh_table_counts(session) -> dict:
+    """Prepočíta COUNT(*) sledovaných tabuliek a uloží ich do table_stats.
+    Ak riadok table_stats medzitým založil iný proces (unikátny kľúč), vráti jeho čerstvé počty."""
+    now = dt.datetime.utcnow()
+    counts = {name: session.query(model).count() for name, model in _COUNTED_MODELS.items()}
+    try:
+        with session.no_autoflush:
+            for name, row_count in counts.items():
+                stat = session.get(TableStat, name)
+                if stat is None:
+                    session.add(TableStat(name=name, row_count=row_count, refreshed_at=now))
+                else:
+                    stat.row_count, stat.refreshed_at = row_count, now
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        stats = {s.name: s for s in session.query(TableStat).filter(TableStat.name.in_(list(_COUNTED_MODELS)))}
+        if len(stats) < len(_COUNTED_MODELS):
+            raise
+        return {name: stats[name].row_count for name in _COUNTED_MODELS} | {
+            "refreshed_at": min(s.refreshed_at for s in stats.values())
+        }
+    return {**counts, "refreshed_at": now}
+
+
+def get_table_counts(force_refresh: bool = False) -> dict:
+    """Počty udalostí, dokumentov a analýz bez COUNT(*) na každé volanie.
+
+    Výsledok sa drží v procese DB_STATS_CACHE_SECONDS; potom sa prečíta tabuľka
+    table_stats a iba ak je staršia ako DB_STATS_REFRESH_SECONDS (alebo force_refresh),
+    počty sa prepočítajú. Vracia {claim_events, document_texts, analysis_results, refreshed_at}.
+    Chyba DB sa propaguje volajúcemu (nuly by sa nedali odlíšiť od prázdnej DB).
+    """
+    now = time.monotonic()
+    with _stats_lock:
+        if not force_refresh and _stats_cache["counts"] is not None and now - _stats_cache["loaded_at"] < STATS_CACHE_SECONDS:
+            return dict(_stats_cache["counts"])
+    session = get_session()
+    if session is None:
+        return {name: 0 for name in _COUNTED_MODELS} | {"refreshed_at": None}
+    try:
+        stats = {s.name: s for s in session.query(TableStat).filter(TableStat.name.in_(list(_COUNTED_MODELS)))}
+        oldest = min((s.refreshed_at for s in stats.values()), default=None)
+        stale = (
+            force_refresh or len(stats) < len(_COUNTED_MODELS) or oldest is None
+            or (dt.datetime.utcnow() - oldest).total_seconds() >= STATS_REFRESH_SECONDS
+        )
+        if stale:
+            counts = refresh_table_counts(session)
+        else:
+            counts = {name: stats[name].row_count for name in _COUNTED_MODELS} | {"refreshed_at": oldest}
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    with _stats_lock:
+        _stats_cache.update(counts=counts, loaded_at=now)
+    return dict(counts)
+
+
+class InvalidCursor(ValueError):
+    """Neplatný kurzor stránkovania."""
+
+
+def encode_cursor(*values) -> str:
+    """Nepriehľadný kurzor z kľúča posledného riadku stránky (datetime ako ISO)."""
+    payload = [v.isoformat() if isinstance(v, dt.datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception as e:
+        raise InvalidCursor(f"Neplatný kurzor: {cursor}") from e
+    if not isinstance(values, list):
+        raise InvalidCursor(f"Neplatný kurzor: {cursor}")
+    return values
+
+
+def _prompts_page_stmt(limit: int, after: str | None):
+    stmt = select(Prompt)
+    if after:
+        values = decode_cursor(after)
+        if len(values) != 1 or not isinstance(values[0], int):
+            raise InvalidCursor(f"Neplatný kurzor: {after}")
+        stmt = stmt.where(Prompt.id > values[0])
+    return stmt.order_by(Prompt.id).limit(limit + 1)
+
+
+def _prompts_page(rows: list[Prompt], limit: int) -> tuple[list[Prompt], str | None]:
+    next_cursor = encode_cursor(rows[limit - 1].id) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def _prompt_runs_page_stmt(prompt_id: int, limit: int, after: str | None):
+    stmt = select(PromptRun).where(PromptRun.prompt_id == prompt_id)
+    if after:
+        values = decode_cursor(after)
+        try:
+            created_at, run_id = dt.datetime.fromisoformat(values[0]), int(values[1])
+        except (IndexError, TypeError, ValueError) as e:
+            raise InvalidCursor(f"Neplatný kurzor: {after}") from e
+        stmt = stmt.where(or_(
+            PromptRun.created_at < created_at,
+            and_(PromptRun.created_at == created_at, PromptRun.id < run_id),
+        ))
+    return stmt.order_by(PromptRun.created_at.desc(), PromptRun.id.desc()).limit(limit + 1)
+
+
+def _prompt_runs_page(rows: list[PromptRun], limit: int) -> tuple[list[PromptRun], str | None]:
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        return rows[:limit], encode_cursor(last.created_at, last.id)
+    return rows, None
+
+
+def _document_texts_stmt(event_id: str):
+    # bez veľkých textov (deferred) – iba metadáta pre zoznamy
+    return select(DocumentText).where(DocumentText.event_id == event_id).order_by(DocumentText.filename)
+
+
+def list_prompts_page(session, limit: int, after: str | None = None) -> tuple[list[Prompt], str | None]:
+    """Stránka promptov podľa id; vracia (prompty, kurzor ďalšej stránky alebo None)."""
+    return _prompts_page(list(session.scalars(_prompts_page_stmt(limit, after))), limit)
+
+
+def list_prompt_runs_page(
+    session, prompt_id: int, limit: int, after: str | None = None
+) -> tuple[list[PromptRun], str | None]:
+    """Stránka behov promptu od najnovšieho (index ix_prompt_runs_prompt_created);
+    vracia (behy, kurzor ďalšej stránky alebo None)."""
+    return _prompt_runs_page(list(session.scalars(_prompt_runs_page_stmt(prompt_id, limit, after))), limit)
+
+
+def get_prompt_by_id(session, prompt_id: int) -> Optional[Prompt]:
+    return session.get(Prompt, prompt_id)
+
+
+def list_document_texts(session, event_id: str) -> list[DocumentText]:
+    return list(session.scalars(_document_texts_stmt(event_id)))
+
+
+# --- Async prístup (FastAPI) ---
+# DB_ASYNC=true: async engine vedľa synchrónneho (sqlite -> aiosqlite, mysql -> aiomysql,
+# prípadne explicitne ASYNC_DATABASE_URL). Engine sa vytvorí pri prvom použití.
+DB_ASYNC = os.getenv('DB_ASYNC', 'false').strip().lower() in ('1', 'true', 'yes')
+_ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'mysql': 'mysql+aiomysql', 'mariadb': 'mariadb+aiomysql'}
+
+
+def _async_url(url: str) -> str:
+    if not url:
+        return ''
+    parsed = make_url(url)
+    driver = _ASYNC_DRIVERS.get(parsed.get_backend_name())
+    return parsed.set(drivername=driver).render_as_string(hide_password=False) if driver else ''
+
+
+ASYNC_DATABASE_URL = os.getenv('ASYNC_DATABASE_URL') or _async_url(DATABASE_URL)
+_async_engine = None
+_async_sessionmaker = None
+_async_pool_metrics = None
+_async_lock = threading.Lock()
+
+
+def async_db_enabled() -> bool:
+    return DB_ASYNC and bool(ASYNC_DATABASE_URL)
+
+
+def get_async_engine():
+    global _async_engine, _async_sessionmaker, _async_pool_metrics
+    if not async_db_enabled():
+        return None
+    if _async_engine is None:
+        with _async_lock:
+            if _async_engine is None:
+                from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+                _async_engine = create_async_engine(
+                    ASYNC_DATABASE_URL, **db_pool.engine_options(ASYNC_DATABASE_URL, async_engine=True)
+                )
+                _async_pool_metrics = db_pool.instrument(_async_engine.sync_engine)
+                _async_sessionmaker = async_sessionmaker(_async_engine, expire_on_commit=False)
+    return _async_engine
+
+
+@asynccontextmanager
+async def async_session_scope():
+    """AsyncSession pri DB_ASYNC=true, inak None (volajúci použije synchrónnu cestu)."""
+    if get_async_engine() is None:
+        yield None
+        return
+    async with _async_sessionmaker() as session:
+        yield session
+
+
+async def dispose_async_engine() -> None:
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = _async_sessionmaker = None
+
+
+async def alist_prompts_page(session, limit: int, after: str | None = None) -> tuple[list[Prompt], str | None]:
+    return _prompts_page(list(await session.scalars(_prompts_page_stmt(limit, after))), limit)
+
+
+async def alist_prompt_runs_page(
+    session, prompt_id: int, limit: int, after: str | None = None
+) -> tuple[list[PromptRun], str | None]:
+    return _prompt_runs_page(list(await session.scalars(_prompt_runs_page_stmt(prompt_id, limit, after))), limit)
+
+
+async def aget_prompt_by_id(session, prompt_id: int) -> Optional[Prompt]:
+    return await session.get(Prompt, prompt_id)
+
+
+async def alist_document_texts(session, event_id: str) -> list[DocumentText]:
+    return list(await session.scalars(_document_texts_stmt(event_id)))
+
+
+_UPSERT_COLUMNS = ("ocr_text", "anonymized_text", "ocr_text_len", "anonymized_text_len", "content_hash")
+
+
+def _document_upsert_stmt(dialect: str):
+    """INSERT document_texts s aktualizáciou pri konflikte na (event_id, filename); None,
+    ak dialekt natívny upsert nemá."""
+    table = DocumentText.__table__
+    if dialect in ("mysql", "mariadb"):
+        stmt = mysql.insert(table)
+        return stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in _UPSERT_COLUMNS})
+    if dialect in ("sqlite", "postgresql"):
+        stmt = (sqlite if dialect == "sqlite" else postgresql).insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=["event_id", "filename"], set_={c: stmt.excluded[c] for c in _UPSERT_COLUMNS}
+        )
+    return None
+
+
+class EventUnitOfWork:
+    """Zber DocumentText záznamov jednej udalosti a ich hromadný zápis (upsert).
+
+    Namiesto session + commit na každý dokument sa riadky zbierajú a zapisujú
+    v jednej transakcii (pri batch_size > 0 po dávkach) natívnym upsertom podľa
+    dialektu (INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE), takže súbežné
+    spracovanie tej istej udalosti nenarazí na unikátny kľúč (event_id, filename);
+    riadky s nezmeneným content_hash sa preskočia. Ak dávka zlyhá, riadky sa zapíšu jednotlivo, takže
+    chybný riadok neznehodnotí ostatné. Pri prvom zápise sa v tej istej transakcii
+    založí aj ClaimEvent. Bezpečné pre súbežné add() z viacerých vlákien.
+    """
+
+    def __init__(self, event_id: str, batch_size: int = 0):
+        self.event_id = event_id
+        self.batch_size = batch_size
+        self.failed: list[str] = []
+        self.unchanged: list[str] = []
+        self._rows: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._event_ensured = False
+
+    def add(self, filename: str, ocr_text: str | None, anonymized_text: str | None) -> None:
+        with self._lock:
+            # rovnaký súbor v jednej dávke – platí posledná verzia
+            self._rows[filename] = {
+                "event_id": self.event_id,
+                "filename": filename,
+                "ocr_text": ocr_text,
+                "anonymized_text": anonymized_text,
+                "ocr_text_len": _text_len(ocr_text),
+                "anonymized_text_len": _text_len(anonymized_text),
+                "content_hash": document_content_hash(ocr_text, anonymized_text),
+            }
+            full = self.batch_size > 0 and len(self._rows) >= self.batch_size
+        if full:
+            self.flush()
+
+    def _ensure_event(self, session) -> None:
+        if not self._event_ensured:
+            if session.query(ClaimEvent.id).filter_by(event_id=self.event_id).first() is None:
+                session.add(ClaimEvent(event_id=self.event_id))
+                session.flush()
+
+    def _upsert(self, session, rows: list[dict]) -> list[str]:
+        """Zapíše riadky; vracia názvy súborov, ktorých obsah sa nezmenil (bez UPDATE)."""
+        stmt = _document_upsert_stmt(session.get_bind().dialect.name)
+        if stmt is None:
+            return self._select_then_write(session, rows)
+        existing = dict(session.query(DocumentText.filename, DocumentText.content_hash).filter(
+            DocumentText.event_id == self.event_id,
+            DocumentText.filename.in_([r["filename"] for r in rows]),
+        ))
+        unchanged = [r["filename"] for r in rows if existing.get(r["filename"]) == r["content_hash"]]
+        changed = [r for r in rows if existing.get(r["filename"]) != r["content_hash"]]
+        if changed:
+            session.execute(stmt, changed)
+        return unchanged
+
+    def _select_then_write(self, session, rows: list[dict]) -> list[str]:
+        # dialekty bez natívneho upsertu
+        existing = {
+            filename: (doc_id, content_hash)
+            for doc_id, filename, content_hash in session.query(
+                DocumentText.id, DocumentText.filename, DocumentText.content_hash
+            ).filter(
+                DocumentText.event_id == self.event_id,
+                DocumentText.filename.in_([r["filename"] for r in rows]),
+            )
+        }
+        inserts, updates, unchanged = [], [], []
+        for row in rows:
+            current = existing.get(row["filename"])
+            if current is None:
+                inserts.append(row)
+            elif current[1] == row["content_hash"]:
+                unchanged.append(row["filename"])
+            else:
+                updates.append({"id": current[0], **{k: v for k, v in row.items() if k not in ("event_id", "filename")}})
+        if inserts:
+            session.execute(insert(DocumentText), inserts)
+        if updates:
+            session.execute(update(DocumentText), updates)
+        return unchanged
+
+    def flush(self) -> list[str]:
+        """Zapíše nazbierané riadky; vracia názvy súborov, ktoré sa zapísať nepodarilo."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = list(self._rows.values()), {}
+            try:
+                session = get_session()
+            except Exception:
+                self.failed.extend(r["filename"] for r in rows)
+                raise
+            if session is None:
+                return []
+            failed: list[str] = []
+            unchanged: list[str] = []
+            try:
+                try:
+                    self._ensure_event(session)
+                    if rows:
+                        unchanged = self._upsert(session, rows)
+                    session.commit()
+                    self._event_ensured = True
+                except Exception:
+                    session.rollback()
+                    unchanged = []
+                    # Izolácia chybného riadku – zvyšok dávky sa zapíše po jednom
+                    for row in rows:
+                        try:
+                            self._ensure_event(session)
+                            unchanged += self._upsert(session, [row])
+                            session.commit()
+                            self._event_ensured = True
+                        except Exception:
+                            session.rollback()
+                            failed.append(row["filename"])
+            finally:
+                session.close()
+            self.failed.extend(failed)
+            self.unchanged.extend(unchanged)
+            return failed
+
+
+def rewrite_compressed_texts(batch_size: int = 500) -> int:
+    """Prepíše existujúce veľké texty podľa aktuálneho DB_TEXT_COMPRESSION (komprimuje
+    alebo dekomprimuje) po dávkach podľa id. Vracia počet prepísaných hodnôt."""
+    if engine is None:
+        return 0
+    from migrations import COMPRESSED_TEXT_COLUMNS
+
+    tables = {DocumentText.__tablename__: DocumentText.__table__, AnalysisResult.__tablename__: AnalysisResult.__table__}
+    total = 0
+    for table_name, column_name in COMPRESSED_TEXT_COLUMNS:
+        table = tables[table_name]
+        column = table.c[column_name]
+        stmt = update(table).where(table.c.id == bindparam('b_id')).values({column_name: bindparam('b_value')})
+        last_id = 0
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(
+                    select(table.c.id, column).where(table.c.id > last_id, column.is_not(None))
+                    .order_by(table.c.id).limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                conn.execute(stmt, [{'b_id': row[0], 'b_value': row[1]} for row in rows])
+            last_id = rows[-1][0]
+            total += len(rows)
+    return total
+
+
+if __name__ == "__main__":
+    # python db.py          – inicializácia schémy a migrácie (napr. pred nasadením novej verzie)
+    # python db.py dedup    – jednorazové odstránenie duplicitných document_texts (ponechá najnovší)
+    # python db.py compress – po zapnutí DB_TEXT_COMPRESSION skomprimuje existujúce texty
+    # python db.py decompress – pred vypnutím (DB_TEXT_COMPRESSION=none) vráti texty a typy stĺpcov
+    import sys
+    from migrations import LATEST_VERSION, dedup_document_texts, ensure_text_storage
+
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command and engine is None:
+        raise SystemExit("DATABASE_URL nie je nastavená")
+    if command == "dedup":
+        with engine.connect() as conn:
+            removed = dedup_document_texts(conn)
+        print(f"Odstránených duplicitných záznamov: {removed}")
+    elif command in ("compress", "decompress"):
+        if (command == "compress") != compression_enabled():
+            raise SystemExit("Nastavte DB_TEXT_COMPRESSION=zlib|zstd pre 'compress' alebo none pre 'decompress'.")
+        init_db()
+        count = rewrite_compressed_texts()
+        if command == "decompress":
+            with engine.begin() as conn:
+                ensure_text_storage(conn, binary=False)
+        print(f"Prepísaných textov: {count}")
+    else:
+        init_db()
+        print(f"Schéma je na verzii {LATEST_VERSION}.")
@@ -0,0 +1,86 @@
+"""Voliteľná transparentná kompresia veľkých textov v DB (OCR, anonymizovaný text, analýza).
+
+DB_TEXT_COMPRESSION = none | zlib | zstd (zstd vyžaduje balík `zstandard`).
+Pri zapnutej kompresii sú stĺpce binárne (na MySQL LONGBLOB) a hodnota nad
+DB_TEXT_COMPRESSION_MIN_BYTES sa uloží ako magická hlavička + komprimované UTF-8.
+Čítanie rozpozná komprimované aj pôvodné nekomprimované hodnoty (str aj bytes),
+takže existujúce riadky zostávajú čitateľné aj pred prepisom (`python db.py compress`).
+"""
+from __future__ import annotations
+
+import os
+import zlib
+
+from sqlalchemy import LargeBinary, Text
+from sqlalchemy.dialects.mysql import LONGBLOB
+from sqlalchemy.types import TypeDecorator
+
+DB_TEXT_COMPRESSION = os.getenv('DB_TEXT_COMPRESSION', 'none').strip().lower()
+DB_TEXT_COMPRESSION_LEVEL = int(os.getenv('DB_TEXT_COMPRESSION_LEVEL', '6'))
+DB_TEXT_COMPRESSION_MIN_BYTES = int(os.getenv('DB_TEXT_COMPRESSION_MIN_BYTES', '256'))
+
+# Hlavičky začínajú NUL bajtom – platný text z OCR ním nezačína
+_MAGIC = {'zlib': b'\x00zl', 'zstd': b'\x00zs'}
+CODECS = ('none',) + tuple(_MAGIC)
+
+
+def compression_enabled(codec: str | None = None) -> bool:
+    return (codec or DB_TEXT_COMPRESSION) in _MAGIC
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("DB_TEXT_COMPRESSION=zstd vyžaduje balík 'zstandard'") from e
+    return zstandard
+
+
+def compress_text(value: str, codec: str | None = None, level: int | None = None,
+                  min_bytes: int | None = None) -> bytes:
+    """Zakóduje text do uloženej podoby (bytes)."""
+    codec = codec or DB_TEXT_COMPRESSION
+    level = DB_TEXT_COMPRESSION_LEVEL if level is None else level
+    min_bytes = DB_TEXT_COMPRESSION_MIN_BYTES if min_bytes is None else min_bytes
+    raw = value.encode('utf-8')
+    if codec not in _MAGIC or (len(raw) < min_bytes and not raw.startswith(b'\x00')):
+        return raw
+    if codec == 'zstd':
+        data = _zstd().ZstdCompressor(level=level).compress(raw)
+    else:
+        data = zlib.compress(raw, level)
+    return _MAGIC[codec] + data
+
+
+def decompress_text(value: bytes | str | None) -> str | None:
+    """Dekóduje uloženú hodnotu – komprimovanú aj pôvodný text."""
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    if value.startswith(_MAGIC['zlib']):
+        return zlib.decompress(value[len(_MAGIC['zlib']):]).decode('utf-8')
+    if value.startswith(_MAGIC['zstd']):
+        return _zstd().ZstdDecompressor().decompress(value[len(_MAGIC['zstd']):]).decode('utf-8')
+    return value.decode('utf-8')
+
+
+class CompressedText(TypeDecorator):
+    """Text stĺpec s voliteľnou kompresiou; pri DB_TEXT_COMPRESSION=none sa správa ako Text."""
+
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if not compression_enabled():
+            return dialect.type_descriptor(Text())
+        if dialect.name in ('mysql', 'mariadb'):
+            return dialect.type_descriptor(LONGBLOB())
+        return dialect.type_descriptor(LargeBinary())
+
+    def process_bind_param(self, value, dialect):
+        if value is None or not compression_enabled():
+            return value
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
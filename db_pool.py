@@ -0,0 +1,175 @@
+"""Konfigurácia a metriky connection poolu SQLAlchemy.
+
+Parametre poolu z prostredia (DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+DB_POOL_RECYCLE, DB_POOL_PRE_PING), pri SQLite WAL a súvisiace pragmy
+(DB_SQLITE_JOURNAL_MODE, DB_SQLITE_SYNCHRONOUS, DB_SQLITE_BUSY_TIMEOUT_MS).
+Metriky: počty pripojení, checkoutov, invalidácií, timeoutov a čakanie na voľné
+pripojenie (InstrumentedQueuePool a pre async engine InstrumentedAsyncAdaptedQueuePool
+merajú čas v _do_get).
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+# MySQL zatvára nečinné spojenia po wait_timeout – recyklovať skôr
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').strip().lower() in ('1', 'true', 'yes')
+
+DB_SQLITE_JOURNAL_MODE = os.getenv('DB_SQLITE_JOURNAL_MODE', 'WAL')
+DB_SQLITE_SYNCHRONOUS = os.getenv('DB_SQLITE_SYNCHRONOUS', 'NORMAL')
+DB_SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('DB_SQLITE_BUSY_TIMEOUT_MS', '5000'))
+
+
+class PoolMetrics:
+    """Počítadlá udalostí poolu (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.waits = 0
+
+    def incr(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.waits += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "soft_invalidations": self.soft_invalidations,
+                "timeouts": self.timeouts,
+                "wait_ms_avg": round(self.wait_seconds_total / self.waits * 1000, 3) if self.waits else 0.0,
+                "wait_ms_max": round(self.wait_seconds_max * 1000, 3),
+            }
+
+
+class _WaitInstrumented:
+    """Meranie čakania na voľné pripojenie a počítanie timeoutov v _do_get poolu."""
+
+    metrics: PoolMetrics | None = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            if self.metrics is not None:
+                self.metrics.incr("timeouts")
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_wait(time.perf_counter() - start)
+
+
+class InstrumentedQueuePool(_WaitInstrumented, QueuePool):
+    """QueuePool, ktorý meria čakanie na voľné pripojenie a počíta timeouty."""
+
+
+class InstrumentedAsyncAdaptedQueuePool(_WaitInstrumented, AsyncAdaptedQueuePool):
+    """Obdoba InstrumentedQueuePool pre async engine (create_async_engine)."""
+
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == 'sqlite'
+
+
+def is_sqlite_memory(url: str) -> bool:
+    database = make_url(url).database
+    return _is_sqlite(url) and (not database or database == ':memory:' or 'mode=memory' in url)
+
+
+def engine_options(url: str, async_engine: bool = False) -> dict:
+    """Argumenty pre create_engine (pri async_engine=True pre create_async_engine)
+    podľa typu DB a konfigurácie."""
+    options: dict = {"pool_pre_ping": DB_POOL_PRE_PING}
+    if is_sqlite_memory(url):
+        # in-memory SQLite má vlastný pool (jedno spojenie), QueuePool parametre sa nepoužijú
+        return options
+    options.update(
+        poolclass=InstrumentedAsyncAdaptedQueuePool if async_engine else InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    return options
+
+
+def instrument(engine: Engine) -> PoolMetrics:
+    """Zaregistruje pool eventy (a pri SQLite pragmy) a vráti metriky engine."""
+    metrics = PoolMetrics()
+    if isinstance(engine.pool, _WaitInstrumented):
+        engine.pool.metrics = metrics
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        metrics.incr("connects")
+        if engine.dialect.name == 'sqlite':
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute(f"PRAGMA busy_timeout = {DB_SQLITE_BUSY_TIMEOUT_MS}")
+                if not is_sqlite_memory(str(engine.url)):
+                    cursor.execute(f"PRAGMA journal_mode = {DB_SQLITE_JOURNAL_MODE}")
+                cursor.execute(f"PRAGMA synchronous = {DB_SQLITE_SYNCHRONOUS}")
+            finally:
+                cursor.close()
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.incr("checkouts")
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        metrics.incr("checkins")
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.incr("invalidations")
+
+    @event.listens_for(engine, "soft_invalidate")
+    def _on_soft_invalidate(dbapi_connection, connection_record, exception):
+        metrics.incr("soft_invalidations")
+
+    return metrics
+
+
+def stats(engine: Engine, metrics: PoolMetrics) -> dict:
+    """Aktuálny stav poolu + kumulatívne metriky."""
+    pool = engine.pool
+    state = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        state.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            max_overflow=pool._max_overflow,
+            timeout=pool.timeout(),
+        )
+    return {**state, **metrics.snapshot()}
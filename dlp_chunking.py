@@ -0,0 +1,228 @@
+"""Rozdelenie dlhých textov na časti pre Cloud DLP de-identifikáciu.
+
+DLP odmietne (alebo veľmi spomalí) požiadavky nad ~0,5 MB. Text sa preto delí na
+časti do max_bytes (UTF-8), rezy sa kladú na bezpečné hranice (odsek, riadok,
+veta, medzera) a každý rez sa overí nad oknom ±overlap znakov: ak v okne leží
+nález (meno, rodné číslo, ...), ktorý by rez rozdelil, rez sa posunie pred neho.
+Počet DLP volaní na jeden rez je obmedzený (max_probes), rez teda nikdy nečaká
+na neohraničený počet sériových požiadaviek.
+Časti sa potom de-identifikujú súbežne a výsledky sa spoja v pôvodnom poradí.
+"""
+from __future__ import annotations
+
+import difflib
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+# Preferované hranice rezu (od najlepšej)
+_BOUNDARIES = ("\n\n", "\n", ". ", " ")
+# Tokeny pre porovnanie pred/po de-identifikácii: slovo, biele znaky, interpunkcia
+_TOKEN_RE = re.compile(r"\w+|\s+|[^\w\s]")
+
+
+def _utf8_len(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def _fit_end(text: str, start: int, max_bytes: int) -> int:
+    """Najväčší koniec časti od start, ktorej UTF-8 dĺžka je <= max_bytes."""
+    end = min(len(text), start + max_bytes)
+    size = _utf8_len(text[start:end])
+    while size > max_bytes:
+        end = start + max(1, (end - start) * max_bytes // size - 1)
+        size = _utf8_len(text[start:end])
+    return end
+
+
+def _safe_cut(text: str, start: int, end: int, search_chars: int) -> int:
+    """Posunie rez `end` dozadu na najbližšiu bezpečnú hranicu (nie pred start)."""
+    if end >= len(text):
+        return len(text)
+    lo = max(start + 1, end - search_chars)
+    for sep in _BOUNDARIES:
+        pos = text.rfind(sep, lo, end)
+        if pos != -1:
+            return pos + len(sep)
+    return end
+
+
+def _token_changes(original: str, transformed: str) -> list[tuple[int, int, str]]:
+    """Zmeny po tokenoch: (začiatok, koniec) v original a text, ktorý ich nahradil."""
+    a = list(_TOKEN_RE.finditer(original))
+    b = [m.group() for m in _TOKEN_RE.finditer(transformed)]
+    sm = difflib.SequenceMatcher(a=[m.group() for m in a], b=b, autojunk=False)
+    return [
+        (a[i1].start(), a[i2 - 1].end(), "".join(b[j1:j2]))
+        for tag, i1, i2, j1, j2 in sm.get_opcodes()
+        if tag != "equal" and i2 > i1
+    ]
+
+
+def _move_cut(spans: list[tuple[int, int]], cut: int, prev_cut: int, text_len: int) -> int:
+    """Rez mimo nálezov: najmenší posun pred nález, ktorý rez rozdeľuje; ak nález siaha
+    až na začiatok časti (napr. viac mien za sebou), rez za neho."""
+    forward = False
+    while True:
+        covering = [(s, e) for s, e in spans if s < cut < e]
+        if not covering:
+            return cut
+        starts = [s for s, _ in covering if s > prev_cut]
+        if starts and not forward:
+            cut = max(starts)
+        else:
+            end = max(e for _, e in covering)
+            if end >= text_len:
+                return text_len
+            cut, forward = end, True
+
+
+def changed_ranges(original: str, transformed: str) -> list[tuple[int, int]]:
+    """Úseky pôvodného textu, ktoré de-identifikácia zmenila (súradnice v original).
+
+    Porovnáva sa po tokenoch, nie po znakoch: pri znakovom porovnaní sa písmená
+    náhradného tokenu ("[PERSON]") zhodujú s písmenami entity a jedno meno sa
+    rozpadne na viac úsekov oddelených nezmenenými znakmi.
+    """
+    return [(s, e) for s, e, _ in _token_changes(original, transformed)]
+
+
+class ChunkedDeidentifier:
+    """De-identifikuje dlhý text po častiach.
+
+    deidentify(text) -> text: jedna DLP de-identifikácia (napr. anonymize_text).
+    inspect(text) -> [{"start", "end", ...}]: voliteľná DLP inspekcia; rez sa potom určí
+    z jednej inšpekcie okna okolo rezu. Ak chýba, nálezy v okolí rezu sa určia porovnaním
+    okna pred a po de-identifikácii (po tokenoch) a rez sa overí: de-identifikácia okna
+    rozdeleného v reze musí dať rovnaký výsledok ako celé okno, inak sa skúsi najbližšia
+    medzera. Overení je najviac max_probes; ak žiadne neprejde, rez ostane na medzere.
+    """
+
+    def __init__(
+        self,
+        deidentify: Callable[[str], str],
+        inspect: Callable[[str], list[dict]] | None = None,
+        max_bytes: int = 400_000,
+        overlap: int = 500,
+        max_workers: int = 4,
+        max_probes: int = 2,
+    ):
+        self.deidentify = deidentify
+        self.inspect = inspect
+        self.max_bytes = max_bytes
+        self.overlap = overlap
+        self.max_workers = max(1, max_workers)
+        self.max_probes = max(1, max_probes)
+
+    def _sensitive_spans(self, window: str) -> list[tuple[int, int]]:
+        if self.inspect is not None:
+            return [(int(f["start"]), int(f["end"])) for f in self.inspect(window)]
+        # Porovnanie môže viacslovnú entitu ("Ján Novák") rozdeliť na medzere alebo zarovnať
+        # jej slovo so zhodným slovom inde v texte. Vracajú sa preto aj spojené úseky:
+        # oddelené iba bielymi znakmi a oddelené medzerou kratšou ako najdlhšia náhrada
+        # (radšej posunúť rez zbytočne, než rozdeliť entitu).
+        changes = _token_changes(window, self.deidentify(window))
+        max_gap = max((len(r) for _, _, r in changes), default=0)
+
+        def merge(close: Callable[[int, int], bool]) -> list[tuple[int, int]]:
+            spans: list[tuple[int, int]] = []
+            for s, e, _ in changes:
+                if spans and close(spans[-1][1], s):
+                    spans[-1] = (spans[-1][0], e)
+                else:
+                    spans.append((s, e))
+            return spans
+
+        return sorted(set(merge(lambda e, s: not window[e:s].strip()) + merge(lambda e, s: s - e < max_gap)))
+
+    def _protect_cut(self, text: str, cut: int, prev_cut: int) -> int:
+        """Posunie rez pred nález, ktorý by inak rozdelil (entita cez hranicu časti)."""
+        cut = self._span_cut(text, cut, prev_cut)
+        if self.inspect is not None or cut >= len(text):
+            return cut
+        # Porovnanie textov nerozlíši hranice susedných entít s opakujúcimi sa slovami –
+        # rez sa overí priamo (najviac max_probes pokusov: rez a najbližšie medzery pred ním)
+        gaps = [
+            pos for pos in range(cut - 1, max(prev_cut, cut - self.overlap), -1)
+            if text[pos - 1].isspace() and not text[pos].isspace()
+        ]
+        for pos in ([cut] + gaps)[:self.max_probes]:
+            if self._cut_is_safe(text, pos, prev_cut):
+                return pos
+        return cut if text[cut - 1].isspace() or not gaps else gaps[0]
+
+    def _cut_is_safe(self, text: str, cut: int, prev_cut: int) -> bool:
+        """Rez je bezpečný, ak de-identifikácia okna po častiach dá to isté ako celého okna."""
+        window = text[max(prev_cut, cut - self.overlap):min(len(text), cut + self.overlap)]
+        k = cut - max(prev_cut, cut - self.overlap)
+        return self.deidentify(window[:k]) + self.deidentify(window[k:]) == self.deidentify(window)
+
+    def _span_cut(self, text: str, cut: int, prev_cut: int) -> int:
+        """Presunie rez mimo nálezov v okne ±overlap. Nové okno (ďalšie DLP volanie) sa
+        zisťuje iba vtedy, keď rez skončí na okraji okna, kde mohol byť nález orezaný."""
+        for _ in range(self.max_probes):
+            w_start = max(prev_cut, cut - self.overlap)
+            w_end = min(len(text), cut + self.overlap)
+            spans = [(s + w_start, e + w_start) for s, e in self._sensitive_spans(text[w_start:w_end])]
+            moved = _move_cut(spans, cut, prev_cut, len(text))
+            if moved == cut or not ((moved == w_start and w_start > prev_cut) or (moved == w_end and w_end < len(text))):
+                return moved
+            cut = moved
+        return cut
+
+    def plan(self, text: str) -> list[tuple[int, int]]:
+        """Vráti hranice častí [(start, end)] pokrývajúce celý text."""
+        bounds: list[tuple[int, int]] = []
+        start = 0
+        while start < len(text):
+            end = _safe_cut(text, start, _fit_end(text, start, self.max_bytes), self.overlap)
+            if end < len(text):
+                end = self._protect_cut(text, end, start)
+            bounds.append((start, end))
+            start = end
+        return bounds
+
+    def deidentify_chunks(self, text: str) -> list[tuple[int, int, str]]:
+        """De-identifikuje text po častiach; vracia [(start, end, anonymizovaný text)]
+        so súradnicami častí v pôvodnom texte, v poradí textu."""
+        bounds = self.plan(text)
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="dlp-chunk") as executor:
+            outputs = list(executor.map(lambda b: self.deidentify(text[b[0]:b[1]]), bounds))
+        return [(s, e, out) for (s, e), out in zip(bounds, outputs)]
+
+    def run(self, text: str) -> str:
+        return "".join(out for _, _, out in self.deidentify_chunks(text))
+
+
+def inspect_chunked(
+    text: str,
+    inspect: Callable[[str], list[dict]],
+    max_bytes: int = 400_000,
+    overlap: int = 500,
+    max_workers: int = 4,
+) -> list[dict]:
+    """DLP inspekcia dlhého textu po prekrývajúcich sa oknách.
+
+    Každé ďalšie okno začína overlap znakov pred koncom predchádzajúceho, takže
+    entita na hranici je celá aspoň v jednom okne. Pozície nálezov sa prepočítajú
+    na súradnice celého textu; duplicity a orezané nálezy z prekryvu sa zlúčia
+    až pri spracovaní (pozri pii_findings.merge_findings).
+    """
+    windows: list[tuple[int, int]] = []
+    start = 0
+    while True:
+        end = _safe_cut(text, start, _fit_end(text, start, max_bytes), overlap)
+        windows.append((start, end))
+        if end >= len(text):
+            break
+        start = max(start + 1, end - overlap)
+
+    def run(window: tuple[int, int]) -> list[dict]:
+        w_start, w_end = window
+        found = []
+        for f in inspect(text[w_start:w_end]):
+            found.append({**f, "start": int(f["start"]) + w_start, "end": int(f["end"]) + w_start})
+        return found
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="dlp-inspect") as executor:
+        return [f for found in executor.map(run, windows) for f in found]
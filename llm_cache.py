@@ -0,0 +1,63 @@
+"""Perzistentná cache odpovedí Gemini.
+
+Kľúč = SHA-256 z (rozlíšený názov modelu, SHA-256 promptu, SHA-256 vstupných textov),
+hodnota = text odpovede + čas vytvorenia. Úložisko a LRU eviction podľa veľkosti
+zdieľa s OCRCache (LLM_CACHE_DIR, LLM_CACHE_MAX_MB); záznam starší ako
+LLM_CACHE_TTL_SECONDS sa pri čítaní zahodí.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+
+from ocr_cache import OCRCache
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LLMCache(OCRCache):
+    def __init__(self, directory: str, max_bytes: int, ttl_seconds: float):
+        super().__init__(directory, max_bytes)
+        self.ttl_seconds = ttl_seconds
+        self.expired = 0
+        self.bypassed = 0
+
+    @staticmethod
+    def make_key(model: str, prompt: str, input_text: str) -> str:
+        return _sha256(f"{model}|{_sha256(prompt)}|{_sha256(input_text)}")
+
+    def get(self, key: str) -> str | None:
+        raw = super().get(key)
+        if raw is None:
+            return None
+        try:
+            entry = json.loads(raw)
+            expired = self.ttl_seconds > 0 and time.time() - float(entry["created_at"]) > self.ttl_seconds
+            text = entry["text"]
+        except (ValueError, KeyError, TypeError):
+            expired, text = True, None
+        if expired:
+            self.remove(key)
+            with self._lock:
+                # super().get započítal zásah – opravíme na miss
+                self.hits -= 1
+                self.misses += 1
+                self.expired += 1
+            return None
+        return text
+
+    def put(self, key: str, text: str, model: str = "") -> None:
+        super().put(key, json.dumps({"model": model, "created_at": time.time(), "text": text}, ensure_ascii=False))
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+
+    def stats(self) -> dict:
+        result = super().stats()
+        with self._lock:
+            result.update(ttl_seconds=self.ttl_seconds, expired=self.expired, bypassed=self.bypassed)
+        return result
@@ -1,12 +1,24 @@
 import os
 import argparse
+import asyncio
+import hashlib
+import threading
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
 from typing import Callable
 
-from google.api_core.client_options import ClientOptions
 from google.cloud import documentai_v1 as documentai
 from google.cloud import dlp_v2
-from db import init_db, get_session, ClaimEvent, DocumentText
+import clients
+import rate_limit
+from ocr_cache import OCRCache
+from manifest import EventManifest
+from batch_ocr import BatchOCREngine, DocumentAIBatchBackend
+from pdf_utils import count_pdf_pages, split_pdf_pages
+from dlp_chunking import ChunkedDeidentifier, inspect_chunked
+from async_pipeline import run_pipeline, PipelineCancelled
+from pii_findings import findings_path, merge_findings, redact_findings, save_findings, load_findings
+from db import init_db, get_session, DocumentText, EventUnitOfWork
 
 # --- Konfigurácia ---
 # Načítanie prostredia z .env.local (jediný zdroj pravdy)
@@ -19,7 +31,37 @@ PROCESSOR_ID = os.getenv('DOCUMENT_AI_PROCESSOR_ID')
 DLP_TEMPLATE_ID = os.getenv('DLP_DEIDENTIFY_TEMPLATE_ID')
 DLP_LOCATION = os.getenv('DLP_LOCATION', 'europe-west3')
 DLP_INSPECT_TEMPLATE_ID = (os.getenv('DLP_INSPECT_TEMPLATE_ID') or '').strip()
+DLP_API_ENDPOINT = (os.getenv('DLP_API_ENDPOINT') or '').strip() or None
+# DLP_MODE: deidentify (DeidentifyContent) | inspect (jedna inspekcia + lokálna anonymizácia z nálezov)
+DLP_MODE = (os.getenv('DLP_MODE', 'deidentify') or 'deidentify').strip().lower()
+DLP_REPLACEMENT_FORMAT = os.getenv('DLP_REPLACEMENT_FORMAT', '[{info_type}]')
 MIME_TYPE = os.getenv('DOCUMENT_AI_MIME_TYPE', 'application/pdf')
+# OCR cache (prázdny OCR_CACHE_DIR cache vypne)
+OCR_CACHE_DIR = (os.getenv('OCR_CACHE_DIR', 'ocr_cache') or '').strip()
+OCR_CACHE_MAX_MB = int(os.getenv('OCR_CACHE_MAX_MB', '512'))
+# Dávkové OCR (Document AI batch processing) – engine: auto | online | batch
+OCR_ENGINE = (os.getenv('DOCUMENT_AI_OCR_ENGINE', 'auto') or 'auto').strip().lower()
+BATCH_GCS_URI = (os.getenv('DOCUMENT_AI_BATCH_GCS_URI') or '').strip()
+BATCH_MIN_DOCUMENTS = int(os.getenv('DOCUMENT_AI_BATCH_MIN_DOCUMENTS', '20'))
+BATCH_MIN_PAGES = int(os.getenv('DOCUMENT_AI_BATCH_MIN_PAGES', '200'))
+BATCH_POLL_SECONDS = float(os.getenv('DOCUMENT_AI_BATCH_POLL_SECONDS', '5'))
+BATCH_TIMEOUT_SECONDS = float(os.getenv('DOCUMENT_AI_BATCH_TIMEOUT_SECONDS', '1800'))
+# Delenie veľkých PDF na časti podľa strán pre paralelné OCR (0 = vypnuté);
+# online procesor Document AI spracuje v jednej požiadavke obmedzený počet strán
+OCR_SHARD_PAGES = int(os.getenv('DOCUMENT_AI_SHARD_PAGES', '15'))
+OCR_SHARD_WORKERS = max(1, int(os.getenv('DOCUMENT_AI_SHARD_WORKERS', '4')))
+# Delenie dlhých textov pre DLP (limit požiadavky je ~0,5 MB)
+DLP_CHUNK_MAX_BYTES = int(os.getenv('DLP_CHUNK_MAX_BYTES', '400000'))
+DLP_CHUNK_OVERLAP = int(os.getenv('DLP_CHUNK_OVERLAP', '500'))
+DLP_CHUNK_WORKERS = max(1, int(os.getenv('DLP_CHUNK_WORKERS', '4')))
+DLP_CHUNK_MAX_PROBES = max(1, int(os.getenv('DLP_CHUNK_MAX_PROBES', '2')))
+# Režim spracovania: threads (pool vlákien) | async (asyncio pipeline OCR → DLP → DB s prekrývaním)
+PIPELINE_MODE = (os.getenv('PROCESSING_PIPELINE', 'threads') or 'threads').strip().lower()
+PIPELINE_QUEUE_SIZE = max(1, int(os.getenv('PIPELINE_QUEUE_SIZE', '8')))
+# Hromadný zápis DocumentText do DB (počet riadkov na dávku, 0 = jedna transakcia na udalosť)
+DB_BATCH_SIZE = max(0, int(os.getenv('DB_BATCH_SIZE', '0')))
+# Počet súbežne spracovaných súborov (1 = sekvenčné spracovanie)
+MAX_WORKERS = max(1, int(os.getenv('PROCESSING_MAX_WORKERS', '4')))
 
 if not PROJECT_ID:
     raise ValueError('GOOGLE_CLOUD_PROJECT musí byť nastavený')
@@ -28,41 +70,159 @@ if not PROCESSOR_ID:
 if not DLP_TEMPLATE_ID:
     raise ValueError('DLP_DEIDENTIFY_TEMPLATE_ID musí byť nastavený')
 
+ocr_cache = OCRCache(OCR_CACHE_DIR, OCR_CACHE_MAX_MB * 1024 * 1024) if OCR_CACHE_DIR else None
+
 # --- Funkcie pre Google Cloud služby ---
 def process_document(
-    project_id: str, location: str, processor_id: str, file_path: str, mime_type: str
+    project_id: str, location: str, processor_id: str, file_path: str, mime_type: str,
+    use_cache: bool = True,
 ) -> str:
-    """Spracuje jeden dokument pomocou Document AI (OCR) a vráti extrahovaný text."""
-    # Explicitne nastavíme projekt ID pre Google Cloud SDK
-    import os
-    os.environ['GOOGLE_CLOUD_PROJECT'] = project_id
-    
-    client_options = {"api_endpoint": f"{location}-documentai.googleapis.com"}
-    client = documentai.DocumentProcessorServiceClient(client_options=client_options)
-    name = client.processor_path(project_id, location, processor_id)
+    """Spracuje jeden dokument pomocou Document AI (OCR) a vráti extrahovaný text.
+    Ak je zapnutá OCR cache, nezmenené PDF (rovnaký obsah, procesor a MIME typ) sa znova neposiela.
+    """
+    image_content = _read_file_bytes(file_path)
+    return process_document_content(project_id, location, processor_id, image_content, mime_type, use_cache)
 
-    with open(file_path, "rb") as image:
-        image_content = image.read()
+def process_document_content(
+    project_id: str, location: str, processor_id: str, image_content: bytes, mime_type: str,
+    use_cache: bool = True,
+) -> str:
+    """Ako process_document, ale nad obsahom dokumentu v pamäti."""
+    cache_key = None
+    if use_cache and ocr_cache is not None:
+        cache_key = OCRCache.make_key(image_content, processor_id, mime_type)
+        cached = ocr_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
+    client = clients.get_documentai_client(location)
+    name = client.processor_path(project_id, location, processor_id)
     raw_document = documentai.RawDocument(content=image_content, mime_type=mime_type)
     request = documentai.ProcessRequest(name=name, raw_document=raw_document)
-    result = client.process_document(request=request)
-    return result.document.text
+    result = rate_limit.guard("documentai").call(client.process_document, request=request, retry=None)
+    text = result.document.text
+
+    if cache_key is not None:
+        try:
+            ocr_cache.put(cache_key, text)
+        except OSError:
+            pass
+    return text
+
+# SHA-256 obsahu naposledy prečítaných vstupov {cesta: (mtime, veľkosť, hash)} – manifest
+# ich prevezme po spracovaní, aby sa súbor nečítal druhýkrát
+_file_digests: dict[str, tuple[float, int, str]] = {}
+_file_digests_lock = threading.Lock()
+_FILE_DIGESTS_MAX = 4096
+
+def _read_file_bytes(file_path: str) -> bytes:
+    with open(file_path, "rb") as f:
+        st = os.fstat(f.fileno())
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()
+    with _file_digests_lock:
+        if len(_file_digests) >= _FILE_DIGESTS_MAX:
+            _file_digests.pop(next(iter(_file_digests)))
+        _file_digests[file_path] = (st.st_mtime, st.st_size, digest)
+    return content
+
+def _take_digest(file_path: str) -> str | None:
+    """Hash obsahu zo spracovania, ak sa súbor odvtedy nezmenil (inak None – manifest ho prepočíta)."""
+    with _file_digests_lock:
+        known = _file_digests.pop(file_path, None)
+    if known is None:
+        return None
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return known[2] if (st.st_mtime, st.st_size) == known[:2] else None
+
+def _merge_shard_texts(shards: list[tuple[int, int, bytes]], texts: list[str]) -> str:
+    """Spojí texty častí v poradí strán so značkami rozsahu strán."""
+    return "".join(
+        f"\n--- Strany {first}-{last} ---\n{shard_text}" for (first, last, _), shard_text in zip(shards, texts)
+    )
+
+def _shard_variant() -> str:
+    """Variant kľúča OCR cache pre text spojený z častí (iný ako OCR celého súboru)."""
+    return f"shards={OCR_SHARD_PAGES}"
+
+def _ocr_sharded(file_path: str, mime_type: str) -> str:
+    """OCR veľkého PDF po častiach (OCR_SHARD_PAGES strán) súbežne; text sa spojí
+    v poradí strán so značkami rozsahu strán. Výsledok sa cachuje pre celý súbor
+    (s veľkosťou časti v kľúči)."""
+    content = _read_file_bytes(file_path)
+    cache_key = None
+    if ocr_cache is not None:
+        cache_key = OCRCache.make_key(content, PROCESSOR_ID, mime_type, _shard_variant())
+        cached = ocr_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    try:
+        shards = split_pdf_pages(content, OCR_SHARD_PAGES)
+    except Exception:
+        # poškodené PDF (počet strán bol iba odhad) – Document AI dostane celý súbor ako predtým
+        return process_document_content(PROJECT_ID, DOC_AI_LOCATION, PROCESSOR_ID, content, mime_type)
+    ocr_shard = lambda shard: process_document_content(
+        PROJECT_ID, DOC_AI_LOCATION, PROCESSOR_ID, shard[2], mime_type, use_cache=False
+    )
+    with ThreadPoolExecutor(max_workers=min(OCR_SHARD_WORKERS, len(shards)), thread_name_prefix="ocr-shard") as executor:
+        texts = list(executor.map(ocr_shard, shards))
+    text = _merge_shard_texts(shards, texts)
+
+    if cache_key is not None:
+        try:
+            ocr_cache.put(cache_key, text)
+        except OSError:
+            pass
+    return text
+
+def get_batch_engine() -> BatchOCREngine | None:
+    """Vráti engine pre dávkové OCR, ak je nakonfigurovaný DOCUMENT_AI_BATCH_GCS_URI."""
+    if not BATCH_GCS_URI:
+        return None
+    backend = DocumentAIBatchBackend(PROJECT_ID, DOC_AI_LOCATION, PROCESSOR_ID, BATCH_GCS_URI)
+    return BatchOCREngine(backend, poll_interval=BATCH_POLL_SECONDS, timeout=BATCH_TIMEOUT_SECONDS)
 
 def ocr_document(file_path: str, mime_type: str = None) -> str:
-    """Vykoná iba OCR nad daným PDF a vráti text."""
+    """Vykoná iba OCR nad daným PDF a vráti text.
+    PDF s viac ako DOCUMENT_AI_SHARD_PAGES stranami sa OCR-uje po častiach súbežne.
+    """
     effective_mime = mime_type or MIME_TYPE
+    if effective_mime == 'application/pdf' and OCR_SHARD_PAGES > 0 and count_pdf_pages(file_path) > OCR_SHARD_PAGES:
+        return _ocr_sharded(file_path, effective_mime)
     return process_document(PROJECT_ID, DOC_AI_LOCATION, PROCESSOR_ID, file_path, effective_mime)
 
 def anonymize_text(
     project_id: str, text_to_anonymize: str, dlp_template_id: str
 ) -> str:
-    """Anonymizuje text pomocou Cloud DLP de-identifikačnej šablóny."""
-    # Explicitne nastavíme projekt ID pre Google Cloud SDK
-    import os
-    os.environ['GOOGLE_CLOUD_PROJECT'] = project_id
-    
-    dlp_client = dlp_v2.DlpServiceClient()
+    """Anonymizuje text pomocou Cloud DLP de-identifikačnej šablóny.
+    Texty dlhšie ako DLP_CHUNK_MAX_BYTES sa de-identifikujú po častiach (súbežne).
+    """
+    if len(text_to_anonymize.encode("utf-8")) <= DLP_CHUNK_MAX_BYTES:
+        return _deidentify_content(project_id, text_to_anonymize, dlp_template_id)
+    chunker = ChunkedDeidentifier(
+        deidentify=lambda t: _deidentify_content(project_id, t, dlp_template_id),
+        inspect=(lambda t: inspect_text_for_pii(project_id, t)) if DLP_INSPECT_TEMPLATE_ID else None,
+        max_bytes=DLP_CHUNK_MAX_BYTES,
+        overlap=DLP_CHUNK_OVERLAP,
+        max_workers=DLP_CHUNK_WORKERS,
+        max_probes=DLP_CHUNK_MAX_PROBES,
+    )
+    return chunker.run(text_to_anonymize)
+
+def _deidentify_content(project_id: str, text_to_anonymize: str, dlp_template_id: str) -> str:
+    """Jedna DeidentifyContent požiadavka nad celým textom."""
+    dlp_client = clients.get_dlp_client(DLP_API_ENDPOINT)
+    response = rate_limit.guard("dlp").call(
+        dlp_client.deidentify_content, request=_deidentify_request(project_id, text_to_anonymize, dlp_template_id),
+        retry=None,
+    )
+    return response.item.value
+
+def _deidentify_request(project_id: str, text_to_anonymize: str, dlp_template_id: str) -> dlp_v2.DeidentifyContentRequest:
     parent = f"projects/{project_id}/locations/{DLP_LOCATION}"
 
     # Zostavenie požiadavky s voliteľnou inspect šablónou
@@ -74,20 +234,31 @@ def anonymize_text(
     if DLP_INSPECT_TEMPLATE_ID:
         request_kwargs["inspect_template_name"] = DLP_INSPECT_TEMPLATE_ID
 
-    request = dlp_v2.DeidentifyContentRequest(**request_kwargs)
-    response = dlp_client.deidentify_content(request=request)
-    return response.item.value
+    return dlp_v2.DeidentifyContentRequest(**request_kwargs)
 
 def inspect_text_for_pii(project_id: str, text_to_inspect: str) -> list[dict]:
     """Vykoná DLP Inspect nad textom a vráti zoznam nálezov s pozíciami.
     Výstup: [{"info_type": str, "start": int, "end": int, "quote": str}]
     Pozn.: Vyžaduje nastavený DLP_INSPECT_TEMPLATE_ID a DLP_LOCATION.
+    Texty dlhšie ako DLP_CHUNK_MAX_BYTES sa kontrolujú po prekrývajúcich sa častiach.
     """
     if not DLP_INSPECT_TEMPLATE_ID:
         return []
-    # Explicitne nastav projekt
-    os.environ['GOOGLE_CLOUD_PROJECT'] = project_id
-    dlp_client = dlp_v2.DlpServiceClient()
+    if len(text_to_inspect.encode("utf-8")) <= DLP_CHUNK_MAX_BYTES:
+        findings = _inspect_content(project_id, text_to_inspect)
+    else:
+        findings = inspect_chunked(
+            text_to_inspect,
+            lambda t: _inspect_content(project_id, t),
+            max_bytes=DLP_CHUNK_MAX_BYTES,
+            overlap=DLP_CHUNK_OVERLAP,
+            max_workers=DLP_CHUNK_WORKERS,
+        )
+    return merge_findings(text_to_inspect, findings)
+
+def _inspect_content(project_id: str, text_to_inspect: str) -> list[dict]:
+    """Jedna InspectContent požiadavka nad celým textom."""
+    dlp_client = clients.get_dlp_client(DLP_API_ENDPOINT)
     parent = f"projects/{project_id}/locations/{DLP_LOCATION}"
 
     inspect_config = None  # použijeme inspect template
@@ -100,106 +271,504 @@ def inspect_text_for_pii(project_id: str, text_to_inspect: str) -> list[dict]:
         inspect_config=inspect_config,
     )
 
-    response = dlp_client.inspect_content(request=request)
+    response = rate_limit.guard("dlp").call(dlp_client.inspect_content, request=request, retry=None)
     findings: list[dict] = []
     for finding in getattr(response.result, 'findings', []) or []:
         info_type = finding.info_type.name if finding.info_type else "PII"
-        quote = getattr(finding, 'quote', '')
-        offset = finding.location.content_locations[0].range
+        # codepoint_range = indexy znakov (zhodné s indexovaním str v Pythone)
+        offset = finding.location.codepoint_range
+        start, end = int(offset.start), int(offset.end)
         findings.append({
             "info_type": info_type,
-            "start": int(offset.start),
-            "end": int(offset.end),
-            "quote": quote or text_to_inspect[int(offset.start):int(offset.end)]
+            "start": start,
+            "end": end,
+            "quote": getattr(finding, 'quote', '') or text_to_inspect[start:end],
         })
     return findings
 
+def inspect_and_anonymize(project_id: str, text: str) -> tuple[str, list[dict]]:
+    """Jednoprechodová anonymizácia: jedna DLP inspekcia, anonymizovaný text sa vytvorí
+    lokálne nahradením nálezov info typom. Vracia (anonymizovaný text, nálezy)."""
+    findings = inspect_text_for_pii(project_id, text)
+    return redact_findings(text, findings, DLP_REPLACEMENT_FORMAT), findings
+
+def get_pii_findings(project_id: str, text: str, raw_ocr_dir: str | None = None, filename: str | None = None) -> list[dict]:
+    """Vráti DLP nálezy pre text; ak sú uložené pri dokumente (a text sa nezmenil),
+    DLP sa nevolá. Nové nálezy sa k dokumentu uložia pre ďalšie použitie."""
+    if raw_ocr_dir and filename:
+        stored = load_findings(raw_ocr_dir, filename, text)
+        if stored is not None:
+            return stored
+    findings = inspect_text_for_pii(project_id, text)
+    if raw_ocr_dir and filename and DLP_INSPECT_TEMPLATE_ID:
+        try:
+            save_findings(raw_ocr_dir, filename, text, findings)
+        except OSError:
+            pass
+    return findings
+
+def warm_up_clients() -> None:
+    """Vopred vytvorí zdieľané Document AI a DLP klienty (volá sa pri štarte API/Streamlit)."""
+    clients.warm_up(DOC_AI_LOCATION, DLP_API_ENDPOINT)
+
 # --- Logika spracovania súborov ---
-def ocr_and_anonymize(file_path: str, raw_ocr_dir: str):
-    """Orchestruje OCR, uloženie surového textu a následnú anonymizáciu."""
+def ocr_and_anonymize(
+    file_path: str, raw_ocr_dir: str, ocr_text: str | None = None, db_batch: EventUnitOfWork | None = None
+):
+    """Orchestruje OCR, uloženie surového textu a následnú anonymizáciu.
+    ocr_text: už získaný OCR text (napr. z dávkového OCR), krok OCR sa vtedy preskočí.
+    db_batch: ak je zadaný, záznam sa do DB zapíše hromadne s ostatnými dokumentmi udalosti.
+    """
     # 1. OCR
-    text = process_document(PROJECT_ID, DOC_AI_LOCATION, PROCESSOR_ID, file_path, MIME_TYPE)
+    text = ocr_text if ocr_text is not None else ocr_document(file_path)
     
     # 2. Uloženie surového OCR textu pre 'human-in-the-loop' kontrolu
+    raw_filename = _save_raw_text(raw_ocr_dir, file_path, text)
+
+    # 3. Anonymizácia
+    anonymized = _anonymize_document(text, raw_ocr_dir, raw_filename)
+
+    # 4. Uloženie do DB (ak je nakonfigurovaná)
+    # Získanie event_id správne z názvu priečinka raw_ocr_dir (..../raw_ocr_output/{event_id})
+    _persist_document_text(os.path.basename(raw_ocr_dir).strip(), os.path.basename(file_path), text, anonymized, db_batch)
+
+    return anonymized
+
+def _save_raw_text(raw_ocr_dir: str, file_path: str, text: str) -> str:
+    """Uloží surový OCR text a vráti názov .txt súboru."""
     raw_filename = os.path.splitext(os.path.basename(file_path))[0] + ".txt"
-    raw_output_path = os.path.join(raw_ocr_dir, raw_filename)
     os.makedirs(raw_ocr_dir, exist_ok=True)
-    with open(raw_output_path, "w", encoding="utf-8") as f:
+    with open(os.path.join(raw_ocr_dir, raw_filename), "w", encoding="utf-8") as f:
         f.write(text)
+    return raw_filename
 
-    # 3. Anonymizácia
-    anonymized = anonymize_text(PROJECT_ID, text, DLP_TEMPLATE_ID)
+def _anonymize_document(text: str, raw_ocr_dir: str, raw_filename: str) -> str:
+    """Anonymizácia podľa DLP_MODE (v režime inspect jedna DLP inspekcia, nálezy sa uložia k dokumentu)."""
+    if DLP_MODE == 'inspect' and DLP_INSPECT_TEMPLATE_ID:
+        anonymized, findings = inspect_and_anonymize(PROJECT_ID, text)
+        save_findings(raw_ocr_dir, raw_filename, text, findings)
+        return anonymized
+    return anonymize_text(PROJECT_ID, text, DLP_TEMPLATE_ID)
 
-    # 4. Uloženie do DB (ak je nakonfigurovaná)
-    session = get_session()
-    if session is not None:
+def _persist_document_text(
+    event_id: str, filename: str, text: str, anonymized: str, db_batch: EventUnitOfWork | None = None
+) -> None:
+    """Uloží OCR a anonymizovaný text dokumentu do DB (ak je nakonfigurovaná)."""
+    if db_batch is not None:
+        db_batch.add(filename, text, anonymized)
+        return
+    # samostatný zápis (upsert podľa (event_id, filename))
+    single = EventUnitOfWork(event_id)
+    single.add(filename, text, anonymized)
+    single.flush()
+
+def _list_pdfs(base_path: str) -> list[str]:
+    """Vráti zoradený zoznam PDF súborov v priečinku."""
+    return [f for f in sorted(os.listdir(base_path)) if f.lower().endswith('.pdf')]
+
+def _save_output(output_dir: str, filename: str, processed_text: str) -> str:
+    """Uloží spracovaný text ako .txt a vráti názov výstupného súboru."""
+    output_filename = os.path.splitext(filename)[0] + ".txt"
+    output_path = os.path.join(output_dir, output_filename)
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(processed_text)
+    return output_filename
+
+def _stage_outputs(filename: str, output_dir: str, stage_dirs: dict[str, str]) -> dict[str, str]:
+    """Cesty k výstupom všetkých krokov pre daný PDF (kľúč = názov kroku)."""
+    txt_name = os.path.splitext(filename)[0] + ".txt"
+    outputs = {name: os.path.join(d, txt_name) for name, d in stage_dirs.items()}
+    if "raw_ocr" in stage_dirs and DLP_MODE == 'inspect' and DLP_INSPECT_TEMPLATE_ID:
+        # nálezy uložené pri anonymizácii v režime inspect (*.pii.json)
+        outputs["pii_findings"] = findings_path(stage_dirs["raw_ocr"], txt_name)
+    outputs["output"] = os.path.join(output_dir, txt_name)
+    return outputs
+
+def _collect_jobs(
+    folders: list[tuple],
+    status_callback: Callable,
+    summary: dict,
+    manifest: EventManifest | None,
+    incremental: bool,
+) -> list[tuple[str, Callable, str, str, str, dict]]:
+    """Zostaví úlohy (filename, process_func, file_path, output_dir, kľúč, výstupy) z priečinkov;
+    pri incremental=True vynechá nezmenené súbory (zapíše ich do summary["skipped"])."""
+    jobs = []
+    for base_path, process_func, output_dir, *rest in folders:
+        stage_dirs = rest[0] if rest else {}
+        if not os.path.isdir(base_path):
+            status_callback(f"Info: Priečinok '{os.path.basename(base_path)}' neexistuje. Preskakujem.")
+            continue
+        status_callback(f"Spracovávam priečinok: {os.path.basename(base_path)}...")
+        os.makedirs(output_dir, exist_ok=True)
+        for filename in _list_pdfs(base_path):
+            file_path = os.path.join(base_path, filename)
+            key = f"{os.path.basename(base_path)}/{filename}"
+            if incremental and manifest is not None and manifest.is_current(key, file_path):
+                status_callback(f"Preskakujem nezmenený súbor: {filename}")
+                summary["skipped"].append(key)
+                continue
+            outputs = _stage_outputs(filename, output_dir, stage_dirs)
+            jobs.append((filename, process_func, file_path, output_dir, key, outputs))
+    return jobs
+
+def process_directories(
+    folders: list[tuple],
+    status_callback: Callable,
+    max_workers: int | None = None,
+    manifest: EventManifest | None = None,
+    incremental: bool = False,
+) -> dict:
+    """Spracuje PDF súbory z viacerých priečinkov so spoločným poolom vlákien.
+
+    folders: zoznam (base_path, process_func, output_dir[, stage_dirs]), kde stage_dirs
+    je voliteľný slovník ďalších výstupov kroku (napr. {"raw_ocr": dir}) pre manifest.
+    Výstupy a hlásenia sa zapisujú v poradí priečinkov a zoradených názvov súborov,
+    chyba jedného súboru neovplyvní ostatné. status_callback sa volá iba z volajúceho
+    vlákna (Streamlit neumožňuje volať UI z iných vlákien).
+    Ak je zadaný manifest, výsledok každého súboru sa v ňom zaznamená; pri incremental=True
+    sa nezmenené a úspešne spracované súbory preskočia.
+    Vracia {"processed": [...], "skipped": [...], "failed": [...]}.
+    """
+    workers = max_workers if max_workers is not None else MAX_WORKERS
+    summary: dict[str, list[str]] = {"processed": [], "skipped": [], "failed": []}
+    jobs = _collect_jobs(folders, status_callback, summary, manifest, incremental)
+
+    def finish(job, get_text: Callable):
+        filename, _, file_path, output_dir, key, outputs = job
         try:
-            # Získanie event_id správne z názvu priečinka raw_ocr_dir (..../raw_ocr_output/{event_id})
-            event_id = os.path.basename(raw_ocr_dir).strip()
-            doc = DocumentText(
-                event_id=event_id,
-                filename=os.path.basename(file_path),
-                ocr_text=text,
-                anonymized_text=anonymized,
-            )
-            session.add(doc)
-            session.commit()
-        except Exception:
-            session.rollback()
-        finally:
-            session.close()
+            output_filename = _save_output(output_dir, filename, get_text())
+            if manifest is not None:
+                manifest.record(key, file_path, outputs, sha256=_take_digest(file_path))
+            status_callback(f"Uložené: {output_filename}")
+            summary["processed"].append(key)
+        except Exception as e:
+            status_callback(f"Chyba pri súbore {filename}: {e}")
+            summary["failed"].append(key)
+            if manifest is not None:
+                manifest.record(key, file_path, outputs, str(e), sha256=_take_digest(file_path))
 
-    return anonymized
+    if workers <= 1:
+        # Sekvenčný režim (pôvodné správanie)
+        for job in jobs:
+            status_callback(f"Spracovávam súbor: {job[0]}...")
+            finish(job, lambda: job[1](job[2]))
+        return summary
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="docproc") as executor:
+        futures = []
+        for filename, process_func, file_path, *_ in jobs:
+            status_callback(f"Spracovávam súbor: {filename}...")
+            futures.append(executor.submit(process_func, file_path))
+        # Výsledky zbierame v poradí odoslania, aby výstup zodpovedal zoradeniu súborov
+        for job, future in zip(jobs, futures):
+            finish(job, future.result)
+    return summary
 
-def process_directory(base_path: str, process_func: Callable, output_dir: str, status_callback: Callable):
+def process_directory(
+    base_path: str,
+    process_func: Callable,
+    output_dir: str,
+    status_callback: Callable,
+    max_workers: int | None = None,
+):
     """Spracuje všetky PDF súbory v danom priečinku pomocou poskytnutej funkcie."""
-    if not os.path.isdir(base_path):
-        status_callback(f"Info: Priečinok '{os.path.basename(base_path)}' neexistuje. Preskakujem.")
-        return
+    return process_directories([(base_path, process_func, output_dir)], status_callback, max_workers)
+
+async def _process_content_async(client, content: bytes, mime_type: str) -> str:
+    """Jedna OCR požiadavka cez asynchrónneho Document AI klienta."""
+    request = documentai.ProcessRequest(
+        name=client.processor_path(PROJECT_ID, DOC_AI_LOCATION, PROCESSOR_ID),
+        raw_document=documentai.RawDocument(content=content, mime_type=mime_type),
+    )
+    result = await rate_limit.guard("documentai").acall(client.process_document, request=request, retry=None)
+    return result.document.text
+
+async def _ocr_async(client, file_path: str, mime_type: str) -> str:
+    """Asynchrónna obdoba ocr_document (OCR cache, delenie veľkých PDF na časti)."""
+    content = await asyncio.to_thread(_read_file_bytes, file_path)
+    sharded = mime_type == 'application/pdf' and OCR_SHARD_PAGES > 0 and \
+        await asyncio.to_thread(count_pdf_pages, file_path) > OCR_SHARD_PAGES
+    cache_key = None
+    if ocr_cache is not None:
+        cache_key = OCRCache.make_key(content, PROCESSOR_ID, mime_type, _shard_variant() if sharded else "")
+        cached = await asyncio.to_thread(ocr_cache.get, cache_key)
+        if cached is not None:
+            return cached
+
+    shards = None
+    if sharded:
+        try:
+            shards = await asyncio.to_thread(split_pdf_pages, content, OCR_SHARD_PAGES)
+        except Exception:
+            # poškodené PDF (počet strán bol iba odhad) – Document AI dostane celý súbor ako predtým
+            if cache_key is not None:
+                cache_key = OCRCache.make_key(content, PROCESSOR_ID, mime_type)
+
+    if shards:
+        limit = asyncio.Semaphore(OCR_SHARD_WORKERS)
+
+        async def ocr_shard(shard):
+            async with limit:
+                return await _process_content_async(client, shard[2], mime_type)
+
+        text = _merge_shard_texts(shards, await asyncio.gather(*(ocr_shard(sh) for sh in shards)))
+    else:
+        text = await _process_content_async(client, content, mime_type)
+
+    if cache_key is not None:
+        try:
+            await asyncio.to_thread(ocr_cache.put, cache_key, text)
+        except OSError:
+            pass
+    return text
+
+async def _anonymize_async(dlp_client, text: str, raw_ocr_dir: str, raw_filename: str) -> str:
+    """Asynchrónna anonymizácia; režim inspect a dlhé texty (delenie na časti)
+    používajú synchrónnu implementáciu vo vlákne."""
+    if (DLP_MODE == 'inspect' and DLP_INSPECT_TEMPLATE_ID) or len(text.encode("utf-8")) > DLP_CHUNK_MAX_BYTES:
+        return await asyncio.to_thread(_anonymize_document, text, raw_ocr_dir, raw_filename)
+    response = await rate_limit.guard("dlp").acall(
+        dlp_client.deidentify_content, request=_deidentify_request(PROJECT_ID, text, DLP_TEMPLATE_ID), retry=None
+    )
+    return response.item.value
+
+def _process_jobs_async(
+    jobs: list[tuple],
+    event_id: str,
+    status_callback: Callable,
+    summary: dict,
+    manifest: EventManifest | None,
+    prefetched: dict[str, str],
+    workers: int,
+    cancel_event: threading.Event | None,
+    db_batch: EventUnitOfWork | None = None,
+) -> None:
+    """Spracuje úlohy asynchrónnym pipeline OCR → DLP → DB (kroky sa prekrývajú).
+    Citlivé dokumenty sú úlohy s výstupom "raw_ocr"; ostatné idú iba cez OCR."""
+
+    def on_result(job, error):
+        filename, _, file_path, _, key, outputs = job
+        if error is None:
+            try:
+                if manifest is not None:
+                    manifest.record(key, file_path, outputs, sha256=_take_digest(file_path))
+                status_callback(f"Uložené: {os.path.basename(outputs['output'])}")
+                summary["processed"].append(key)
+                return
+            except Exception as e:
+                error = e
+        status_callback(f"Chyba pri súbore {filename}: {error}")
+        summary["failed"].append(key)
+        if manifest is not None:
+            manifest.record(key, file_path, outputs, str(error), sha256=_take_digest(file_path))
+
+    async def run():
+        doc_client = clients.create_documentai_async_client(DOC_AI_LOCATION)
+        dlp_client = clients.create_dlp_async_client(DLP_API_ENDPOINT)
+
+        async def ocr(job):
+            filename, _, file_path, _, _, outputs = job
+            status_callback(f"Spracovávam súbor: {filename}...")
+            text = prefetched.get(file_path)
+            if text is None:
+                text = await _ocr_async(doc_client, file_path, MIME_TYPE)
+            if "raw_ocr" in outputs:
+                await asyncio.to_thread(_save_raw_text, os.path.dirname(outputs["raw_ocr"]), file_path, text)
+            return text
+
+        async def anonymize(job, text):
+            raw_path = job[5]["raw_ocr"]
+            return await _anonymize_async(dlp_client, text, os.path.dirname(raw_path), os.path.basename(raw_path))
+
+        async def persist(job, text, anonymized):
+            filename, _, _, output_dir, _, _ = job
+            await asyncio.to_thread(_save_output, output_dir, filename, anonymized if anonymized is not None else text)
+            if anonymized is not None:
+                await asyncio.to_thread(_persist_document_text, event_id, filename, text, anonymized, db_batch)
+
+        try:
+            await run_pipeline(
+                jobs, ocr, anonymize, persist, on_result,
+                needs_dlp=lambda job: "raw_ocr" in job[5],
+                queue_size=PIPELINE_QUEUE_SIZE,
+                ocr_workers=workers,
+                dlp_workers=workers,
+                cancel_event=cancel_event,
+            )
+        finally:
+            for client in (doc_client, dlp_client):
+                try:
+                    await client.transport.close()
+                except Exception:
+                    pass
 
-    status_callback(f"Spracovávam priečinok: {os.path.basename(base_path)}...")
-    os.makedirs(output_dir, exist_ok=True)
+    asyncio.run(run())
 
-    for filename in sorted(os.listdir(base_path)):
-        if filename.lower().endswith('.pdf'):
+def _pending_pdfs(base_paths: list[str], manifest: EventManifest, incremental: bool) -> list[str]:
+    """Cesty k PDF, ktoré sa v tomto behu budú spracovávať."""
+    pending = []
+    for base_path in base_paths:
+        if not os.path.isdir(base_path):
+            continue
+        for filename in _list_pdfs(base_path):
             file_path = os.path.join(base_path, filename)
+            if incremental and manifest.is_current(f"{os.path.basename(base_path)}/{filename}", file_path):
+                continue
+            pending.append(file_path)
+    return pending
+
+def _batch_prefetch(
+    file_paths: list[str],
+    engine: str,
+    batch_engine: BatchOCREngine | None,
+    status_callback: Callable,
+) -> dict[str, str]:
+    """Pri veľkej udalosti získa OCR texty jednou dávkovou operáciou.
+
+    engine: "online" (nikdy), "batch" (vždy, ak je dostupný engine) alebo "auto"
+    (ak počet dokumentov >= DOCUMENT_AI_BATCH_MIN_DOCUMENTS alebo strán >= DOCUMENT_AI_BATCH_MIN_PAGES).
+    Súbory, ktoré už sú v OCR cache, sa do dávky neposielajú. Čo dávka nevráti,
+    spracuje následne online OCR.
+    """
+    if engine == "online" or batch_engine is None or not file_paths:
+        return {}
+    if engine == "auto":
+        total_pages = 0
+        if len(file_paths) < BATCH_MIN_DOCUMENTS:
+            for fp in file_paths:
+                try:
+                    total_pages += count_pdf_pages(fp)
+                except OSError:
+                    pass
+        if len(file_paths) < BATCH_MIN_DOCUMENTS and total_pages < BATCH_MIN_PAGES:
+            return {}
+
+    texts: dict[str, str] = {}
+    to_submit: list[str] = []
+    cache_keys: dict[str, str] = {}
+    for fp in file_paths:
+        if ocr_cache is not None:
+            cache_keys[fp] = OCRCache.make_key(_read_file_bytes(fp), PROCESSOR_ID, MIME_TYPE)
+            cached = ocr_cache.get(cache_keys[fp])
+            if cached is not None:
+                texts[fp] = cached
+                continue
+        to_submit.append(fp)
+    if not to_submit:
+        return texts
+
+    status_callback(f"Spúšťam dávkové OCR pre {len(to_submit)} dokumentov...")
+    try:
+        results = batch_engine.run(to_submit, MIME_TYPE, status_callback)
+    except Exception as e:
+        status_callback(f"Varovanie: Dávkové OCR zlyhalo, pokračujem online OCR: {e}")
+        return texts
+    for fp, text in results.items():
+        texts[fp] = text
+        if fp in cache_keys:
             try:
-                status_callback(f"Spracovávam súbor: {filename}...")
-                processed_text = process_func(file_path)
-                
-                output_filename = os.path.splitext(filename)[0] + ".txt"
-                output_path = os.path.join(output_dir, output_filename)
-                with open(output_path, "w", encoding="utf-8") as f:
-                    f.write(processed_text)
-                status_callback(f"Uložené: {output_filename}")
+                ocr_cache.put(cache_keys[fp], text)
+            except OSError:
+                pass
+    missing = len(to_submit) - len(results)
+    if missing:
+        status_callback(f"Varovanie: Dávkové OCR nevrátilo {missing} dokumentov, spracujú sa online.")
+    return texts
 
-            except Exception as e:
-                status_callback(f"Chyba pri súbore {filename}: {e}")
+def _flush_db_batch(db_batch: EventUnitOfWork, status_callback: Callable, manifest: EventManifest, summary: dict) -> None:
+    """Zapíše zvyšok nazbieraných DB záznamov a ohlási riadky, ktoré sa zapísať nepodarilo.
+    Takéto dokumenty sa v manifeste a v súhrne označia ako chybné (inkrementálny beh ich zopakuje)."""
+    try:
+        db_batch.flush()
+    except Exception as e:
+        status_callback(f"Varovanie: Zápis do DB zlyhal: {e}")
+    if db_batch.unchanged:
+        status_callback(f"DB: obsah {len(db_batch.unchanged)} dokumentov sa nezmenil, záznamy ponechané.")
+    if db_batch.failed:
+        status_callback(f"Varovanie: Do DB sa nepodarilo uložiť: {', '.join(db_batch.failed)}")
+    # DocumentText záznamy majú iba citlivé dokumenty
+    for key in dict.fromkeys(f"citlive_dokumenty/{filename}" for filename in db_batch.failed):
+        manifest.mark_failed(key, "Zápis do DB zlyhal")
+        if key in summary["processed"]:
+            summary["processed"].remove(key)
+            summary["failed"].append(key)
+
+def _remove_cached_ocr(entry: dict) -> None:
+    """Odstráni OCR text (pred DLP) vymazaného súboru z OCR cache – kľúč podľa SHA-256 z manifestu."""
+    if ocr_cache is None or not entry.get("sha256"):
+        return
+    for variant in ("", _shard_variant()):
+        ocr_cache.remove(OCRCache.digest_key(entry["sha256"], PROCESSOR_ID, MIME_TYPE, variant))
+
+def _remove_stale_outputs(event_id: str, manifest: EventManifest, present_keys: set[str], status_callback: Callable) -> list[str]:
+    """Odstráni výstupy (súbory aj DB záznamy) pre PDF, ktoré už v udalosti nie sú."""
+    removed = manifest.stale_keys(present_keys)
+    if not removed:
+        return removed
+    for key in removed:
+        entry = manifest.remove(key)
+        outputs = dict(entry.get("outputs") or {})
+        if "raw_ocr" in outputs:
+            # nálezy mohli vzniknúť aj neskôr (POST /inspect), nielen pri spracovaní
+            outputs.setdefault("pii_findings", findings_path(*os.path.split(outputs["raw_ocr"])))
+        for path in outputs.values():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        _remove_cached_ocr(entry)
+        status_callback(f"Odstránené výstupy vymazaného súboru: {key}")
+
+    # DocumentText záznamy majú iba citlivé dokumenty (rovnaký názov vo všeobecných sa nesmie zmazať)
+    filenames = [k.split("/", 1)[1] for k in removed if k.startswith("citlive_dokumenty/")]
+    session = get_session() if filenames else None
+    if session is not None:
+        try:
+            session.query(DocumentText).filter(
+                DocumentText.event_id == event_id, DocumentText.filename.in_(filenames)
+            ).delete(synchronize_session=False)
+            session.commit()
+        except Exception:
+            session.rollback()
+        finally:
+            session.close()
+    return removed
 
 # --- Hlavná funkcia --- 
-def run_processing(event_path: str, anonymized_dir: str, general_dir: str, raw_ocr_dir: str, status_callback: Callable):
-    """Hlavná logika pre spracovanie jednej poistnej udalosti (citlivé a všeobecné dokumenty)."""
+def run_processing(
+    event_path: str,
+    anonymized_dir: str,
+    general_dir: str,
+    raw_ocr_dir: str,
+    status_callback: Callable,
+    max_workers: int | None = None,
+    incremental: bool = False,
+    ocr_engine: str | None = None,
+    batch_engine: BatchOCREngine | None = None,
+    pipeline: str | None = None,
+    cancel_event: threading.Event | None = None,
+) -> dict | None:
+    """Hlavná logika pre spracovanie jednej poistnej udalosti (citlivé a všeobecné dokumenty).
+    max_workers: počet súbežne spracovaných súborov (None = PROCESSING_MAX_WORKERS, 1 = sekvenčne).
+    incremental: spracuje iba nové alebo zmenené PDF podľa manifestu udalosti a odstráni
+    výstupy vymazaných PDF.
+    ocr_engine: "auto" | "online" | "batch" (None = DOCUMENT_AI_OCR_ENGINE); batch_engine
+    umožňuje podstrčiť vlastný engine (napr. s FakeOperationServer), inak get_batch_engine().
+    pipeline: "threads" | "async" (None = PROCESSING_PIPELINE). V režime async sa kroky OCR → DLP → DB
+    prekrývajú cez ohraničené fronty a beh sa dá zrušiť nastavením cancel_event (vyhodí
+    PipelineCancelled; dokončené dokumenty ostanú zaznamenané v manifeste).
+    Vracia súhrn {"processed", "skipped", "failed", "removed"} (zoznamy kľúčov "kategória/súbor").
+    """
     if not os.path.isdir(event_path):
         status_callback(f"Chyba: Zadaná cesta '{event_path}' nie je platný priečinok.")
-        return
+        return None
 
     event_id = os.path.basename(event_path).strip()
-    # inicializácia DB tabuliek ak treba
-    try:
-        init_db()
-        session = get_session()
-        if session is not None:
-            try:
-                if session.query(ClaimEvent).filter_by(event_id=event_id).first() is None:
-                    session.add(ClaimEvent(event_id=event_id))
-                    session.commit()
-            except Exception:
-                session.rollback()
-            finally:
-                session.close()
-    except Exception:
-        pass
-    status_callback(f"Spúšťam spracovanie poistnej udalosti: {event_id}...")
+    # Schéma DB sa inicializuje raz pri štarte procesu (db.init_db), nie pri každom spracovaní.
+    # DocumentText záznamy (a ClaimEvent) sa zapisujú hromadne v jednej transakcii / po dávkach
+    db_batch = EventUnitOfWork(event_id, DB_BATCH_SIZE)
+    status_callback(f"Spúšťam {'inkrementálne ' if incremental else ''}spracovanie poistnej udalosti: {event_id}...")
 
     # Cesty k pod-priečinkom
     sensitive_path = os.path.join(event_path, "citlive_dokumenty")
@@ -210,15 +779,59 @@ def run_processing(event_path: str, anonymized_dir: str, general_dir: str, raw_o
     general_output_dir = os.path.join(general_dir, event_id)
     raw_ocr_output_dir = os.path.join(raw_ocr_dir, event_id)
 
-    # Spracovanie citlivých dokumentov (OCR + uloženie raw + anonymizácia)
-    ocr_and_anonymize_func = lambda fp: ocr_and_anonymize(fp, raw_ocr_output_dir)
-    process_directory(sensitive_path, ocr_and_anonymize_func, anonymized_output_dir, status_callback)
+    manifest = EventManifest.load(event_path)
+
+    engine = (ocr_engine or OCR_ENGINE).lower()
+    if batch_engine is None and engine != "online":
+        batch_engine = get_batch_engine()
+    batch_texts = _batch_prefetch(
+        _pending_pdfs([sensitive_path, general_path], manifest, incremental), engine, batch_engine, status_callback
+    )
 
-    # Spracovanie všeobecných dokumentov (iba OCR)
-    ocr_only_func = lambda fp: process_document(PROJECT_ID, DOC_AI_LOCATION, PROCESSOR_ID, fp, MIME_TYPE)
-    process_directory(general_path, ocr_only_func, general_output_dir, status_callback)
+    # Citlivé dokumenty (OCR + uloženie raw + anonymizácia) a všeobecné dokumenty (iba OCR)
+    # zdieľajú jeden pool vlákien / jeden pipeline
+    ocr_and_anonymize_func = lambda fp: ocr_and_anonymize(fp, raw_ocr_output_dir, ocr_text=batch_texts.get(fp), db_batch=db_batch)
+    ocr_only_func = lambda fp: batch_texts[fp] if fp in batch_texts else ocr_document(fp)
+    folders = [
+        (sensitive_path, ocr_and_anonymize_func, anonymized_output_dir, {"raw_ocr": raw_ocr_output_dir}),
+        (general_path, ocr_only_func, general_output_dir),
+    ]
+    if (pipeline or PIPELINE_MODE).lower() == "async":
+        summary = {"processed": [], "skipped": [], "failed": []}
+        jobs = _collect_jobs(folders, status_callback, summary, manifest, incremental)
+        workers = max_workers if max_workers is not None else MAX_WORKERS
+        try:
+            _process_jobs_async(jobs, event_id, status_callback, summary, manifest, batch_texts, workers, cancel_event, db_batch)
+        except PipelineCancelled:
+            status_callback(f"Spracovanie udalosti {event_id} bolo zrušené (dokončené: {len(summary['processed'])}).")
+            _flush_db_batch(db_batch, status_callback, manifest, summary)
+            manifest.save()
+            raise
+    else:
+        summary = process_directories(folders, status_callback, max_workers, manifest=manifest, incremental=incremental)
+
+    _flush_db_batch(db_batch, status_callback, manifest, summary)
+
+    summary["removed"] = []
+    if incremental:
+        present_keys = {
+            f"{os.path.basename(path)}/{filename}"
+            for path in (sensitive_path, general_path) if os.path.isdir(path)
+            for filename in _list_pdfs(path)
+        }
+        summary["removed"] = _remove_stale_outputs(event_id, manifest, present_keys, status_callback)
+        status_callback(
+            f"Inkrementálne spracovanie: spracované {len(summary['processed'])}, "
+            f"preskočené {len(summary['skipped'])}, chybné {len(summary['failed'])}, "
+            f"odstránené {len(summary['removed'])}."
+        )
+    try:
+        manifest.save()
+    except OSError as e:
+        status_callback(f"Varovanie: Manifest udalosti sa nepodarilo uložiť: {e}")
 
     status_callback(f"Spracovanie dokumentov pre udalosť {event_id} dokončené.")
+    return summary
 
 # --- Spustenie z príkazového riadku --- 
 if __name__ == "__main__":
@@ -227,7 +840,12 @@ if __name__ == "__main__":
     parser.add_argument("--anonymized_dir", default="anonymized_output", help="Hlavný priečinok pre anonymizované texty.")
     parser.add_argument("--general_dir", default="general_output", help="Hlavný priečinok pre všeobecné texty.")
     parser.add_argument("--raw_ocr_dir", default="raw_ocr_output", help="Hlavný priečinok pre surové OCR texty.")
+    parser.add_argument("--incremental", action="store_true", help="Spracuj iba nové alebo zmenené PDF (podľa manifestu udalosti).")
+    parser.add_argument("--ocr_engine", choices=["auto", "online", "batch"], default=None, help="OCR engine (predvolené DOCUMENT_AI_OCR_ENGINE).")
+    parser.add_argument("--pipeline", choices=["threads", "async"], default=None, help="Režim spracovania (predvolené PROCESSING_PIPELINE).")
+    parser.add_argument("--workers", type=int, default=None, help="Počet súbežne spracovaných súborov (predvolené PROCESSING_MAX_WORKERS).")
     args = parser.parse_args()
     
     # Pre príkazový riadok používame jednoduchý print ako callback
-    run_processing(args.event_path, args.anonymized_dir, args.general_dir, args.raw_ocr_dir, print)
+    init_db()
+    run_processing(args.event_path, args.anonymized_dir, args.general_dir, args.raw_ocr_dir, print, max_workers=args.workers, incremental=args.incremental, ocr_engine=args.ocr_engine, pipeline=args.pipeline)
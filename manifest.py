@@ -0,0 +1,101 @@
+"""Manifest spracovania jednej poistnej udalosti (inkrementálne spracovanie).
+
+Pre každý vstupný PDF (kľúč "kategória/súbor") si pamätá SHA-256 obsahu, mtime,
+veľkosť, výstupy jednotlivých krokov a stav posledného spracovania. Manifest je
+uložený ako JSON priamo v priečinku udalosti.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+import json
+import os
+
+MANIFEST_FILENAME = ".processing_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_sha256(file_path: str) -> str:
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class EventManifest:
+    def __init__(self, path: str, files: dict[str, dict] | None = None):
+        self.path = path
+        self.files: dict[str, dict] = files or {}
+
+    @classmethod
+    def load(cls, event_path: str) -> "EventManifest":
+        path = os.path.join(event_path, MANIFEST_FILENAME)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                return cls(path, data.get("files") or {})
+        except (FileNotFoundError, ValueError):
+            pass
+        return cls(path)
+
+    def save(self) -> None:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "files": self.files}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def is_current(self, key: str, file_path: str) -> bool:
+        """True, ak bol súbor úspešne spracovaný, nezmenil sa a všetky jeho výstupy existujú."""
+        entry = self.files.get(key)
+        if not entry or entry.get("status") != "ok":
+            return False
+        if not all(os.path.exists(p) for p in (entry.get("outputs") or {}).values()):
+            return False
+        st = os.stat(file_path)
+        if entry.get("mtime") == st.st_mtime and entry.get("size") == st.st_size:
+            return True
+        # mtime sa zmenil (napr. kópia súboru) – rozhoduje obsah
+        if entry.get("sha256") == file_sha256(file_path):
+            entry["mtime"] = st.st_mtime
+            entry["size"] = st.st_size
+            return True
+        return False
+
+    def record(
+        self, key: str, file_path: str, outputs: dict[str, str], error: str | None = None,
+        sha256: str | None = None,
+    ) -> None:
+        """Zaznamená výsledok spracovania. sha256 je hash obsahu zo spracovania (súbor sa
+        potom znova nečíta); pri chybe sa súbor nehashuje a nemusí už ani existovať."""
+        try:
+            st = os.stat(file_path)
+            if sha256 is None and not error:
+                sha256 = file_sha256(file_path)
+        except OSError as e:
+            st = None
+            error = error or f"Súbor nie je dostupný: {e}"
+        self.files[key] = {
+            "sha256": sha256,
+            "mtime": st.st_mtime if st else None,
+            "size": st.st_size if st else None,
+            "outputs": outputs,
+            "status": "error" if error else "ok",
+            "error": error,
+            "processed_at": dt.datetime.utcnow().isoformat(timespec="seconds"),
+        }
+
+    def mark_failed(self, key: str, error: str) -> None:
+        """Označí už zaznamenaný súbor ako chybný (napr. zlyhal neskorší hromadný zápis do DB),
+        aby ho inkrementálny beh spracoval znova."""
+        entry = self.files.get(key)
+        if entry is not None:
+            entry["status"] = "error"
+            entry["error"] = error
+
+    def stale_keys(self, present_keys: set[str]) -> list[str]:
+        return sorted(k for k in self.files if k not in present_keys)
+
+    def remove(self, key: str) -> dict:
+        return self.files.pop(key, {})
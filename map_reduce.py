@@ -0,0 +1,171 @@
+"""Analýza udalosti cez map-reduce, keď texty presahujú rozpočet tokenov modelu.
+
+ContextBuilder odhadne tokeny vstupu (dokumenty udalosti). Ak sa zmestia do
+max_input_tokens, analýza ide jedným volaním ako doteraz. Inak sa dokumenty zbalia
+do skupín do group_tokens (príliš dlhý dokument sa rozdelí na časti na hranici
+odseku/riadku), skupiny sa zhrnú súbežne (fan-out max_workers) a čiastkové
+zhrnutia sa spoja finálnym promptom. Ak sa ani zhrnutia nezmestia, redukuje sa
+po kolách po reduce_fan_in zhrnutiach.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+# Preferované hranice pri delení dlhého dokumentu (od najlepšej)
+_BOUNDARIES = ("\n\n", "\n", ". ", " ")
+
+MAP_INSTRUCTION = (
+    "Si asistent likvidátora poistných udalostí. Zhrň nasledujúce dokumenty jednej poistnej "
+    "udalosti tak, aby zhrnutie zachovalo všetky fakty potrebné pre túto úlohu:\n{task}\n\n"
+    "Uveď konkrétne dátumy, sumy, účastníkov, čísla zmlúv a zdroj (názov dokumentu). "
+    "Nič nevymýšľaj; ak údaj chýba, neuvádzaj ho."
+)
+REDUCE_INTRO = "Nasledujú čiastkové zhrnutia dokumentov poistnej udalosti (zhrnuté po častiach kvôli rozsahu):\n"
+
+
+def estimate_tokens(text: str, chars_per_token: float = 4.0) -> int:
+    """Rýchly odhad počtu tokenov (bez volania API)."""
+    return int(len(text) / chars_per_token) + 1
+
+
+def render_documents(documents: list[tuple[str, str]]) -> str:
+    """Spojí dokumenty so značkami začiatku/konca (formát read_all_texts_from_dir)."""
+    return "".join(
+        f"\n--- Začiatok dokumentu: {name} ---\n{text}\n--- Koniec dokumentu: {name} ---\n"
+        for name, text in documents
+    )
+
+
+def _split_text(text: str, max_chars: int) -> list[str]:
+    parts: list[str] = []
+    start = 0
+    while len(text) - start > max_chars:
+        end = start + max_chars
+        lo = start + max_chars // 2
+        for sep in _BOUNDARIES:
+            pos = text.rfind(sep, lo, end)
+            if pos != -1:
+                end = pos + len(sep)
+                break
+        parts.append(text[start:end])
+        start = end
+    parts.append(text[start:])
+    return parts
+
+
+class ContextBuilder:
+    """Rozpočet tokenov pre dokumenty udalosti (odhad cez token_counter)."""
+
+    def __init__(self, documents: list[tuple[str, str]], token_counter: Callable[[str], int] = estimate_tokens):
+        self.documents = [(name, text) for name, text in documents if text]
+        self.token_counter = token_counter
+        self._tokens = [token_counter(render_documents([doc])) for doc in self.documents]
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self._tokens)
+
+    def fits(self, budget_tokens: int) -> bool:
+        return self.total_tokens <= budget_tokens
+
+    def groups(self, group_tokens: int) -> list[list[tuple[str, str]]]:
+        """Zbalí dokumenty v poradí do skupín do group_tokens; dlhý dokument rozdelí na časti."""
+        groups: list[list[tuple[str, str]]] = []
+        current: list[tuple[str, str]] = []
+        current_tokens = 0
+        for (name, text), tokens in zip(self.documents, self._tokens):
+            pieces = [(name, text)]
+            if tokens > group_tokens:
+                # pomer znakov na token z odhadu celého dokumentu
+                max_chars = max(1, int(len(text) * group_tokens / tokens * 0.95))
+                chunks = _split_text(text, max_chars)
+                pieces = [(f"{name} (časť {i}/{len(chunks)})", chunk) for i, chunk in enumerate(chunks, 1)]
+            for piece in pieces:
+                piece_tokens = self.token_counter(render_documents([piece]))
+                if current and current_tokens + piece_tokens > group_tokens:
+                    groups.append(current)
+                    current, current_tokens = [], 0
+                current.append(piece)
+                current_tokens += piece_tokens
+        if current:
+            groups.append(current)
+        return groups
+
+
+class MapReduceAnalyzer:
+    """Zhrnutie skupín dokumentov (map) a ich spojenie finálnym promptom (reduce).
+
+    generate(prompt) -> text: jedno volanie modelu (napr. analyza._generate_text).
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[str], str],
+        group_tokens: int = 30_000,
+        max_workers: int = 4,
+        reduce_fan_in: int = 8,
+        max_input_tokens: int = 120_000,
+        token_counter: Callable[[str], int] = estimate_tokens,
+    ):
+        self.generate = generate
+        self.group_tokens = group_tokens
+        self.max_workers = max(1, max_workers)
+        self.reduce_fan_in = max(2, reduce_fan_in)
+        self.max_input_tokens = max_input_tokens
+        self.token_counter = token_counter
+
+    def _summarize_all(self, prompts: list[str]) -> list[str]:
+        if len(prompts) == 1 or self.max_workers == 1:
+            return [self.generate(p) for p in prompts]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(prompts))) as pool:
+            return list(pool.map(self.generate, prompts))
+
+    def map(self, groups: list[list[tuple[str, str]]], task: str) -> list[str]:
+        instruction = MAP_INSTRUCTION.format(task=task)
+        return self._summarize_all([instruction + "\n\n" + render_documents(group) for group in groups])
+
+    def reduce_prompt(
+        self, summaries: list[str], task: str, status_callback: Callable[[str], None] = lambda _m: None
+    ) -> str:
+        """Finálny prompt nad zhrnutiami; pri prekročení rozpočtu najprv redukuje po kolách."""
+        def render(items: list[str]) -> str:
+            return REDUCE_INTRO + "".join(f"\n--- Zhrnutie {i} ---\n{s}\n" for i, s in enumerate(items, 1))
+
+        instruction = MAP_INSTRUCTION.format(task=task)
+        round_no = 1
+        while len(summaries) > 1 and self.token_counter(render(summaries)) > self.max_input_tokens:
+            batches = [summaries[i:i + self.reduce_fan_in] for i in range(0, len(summaries), self.reduce_fan_in)]
+            status_callback(f"Redukcia {round_no}: {len(summaries)} zhrnutí -> {len(batches)}")
+            summaries = self._summarize_all([instruction + "\n\n" + render(batch) for batch in batches])
+            round_no += 1
+        return task + "\n\n" + render(summaries)
+
+    def reduce(self, summaries: list[str], task: str, status_callback: Callable[[str], None] = lambda _m: None) -> str:
+        """Spojí zhrnutia finálnym promptom."""
+        return self.generate(self.reduce_prompt(summaries, task, status_callback))
+
+    def final_prompt(
+        self,
+        documents: list[tuple[str, str]],
+        task: str,
+        status_callback: Callable[[str], None] = lambda _m: None,
+    ) -> str:
+        """Map fáza + priebežné redukcie; vracia finálny prompt (napr. pre streamované volanie)."""
+        builder = ContextBuilder(documents, self.token_counter)
+        groups = builder.groups(self.group_tokens)
+        status_callback(
+            f"Vstup ~{builder.total_tokens} tokenov presahuje limit {self.max_input_tokens}: "
+            f"zhrnutie {len(groups)} skupín dokumentov (súbežne {min(self.max_workers, len(groups))})..."
+        )
+        summaries = self.map(groups, task)
+        status_callback(f"Spájam {len(summaries)} čiastkových zhrnutí do finálnej analýzy...")
+        return self.reduce_prompt(summaries, task, status_callback)
+
+    def run(
+        self,
+        documents: list[tuple[str, str]],
+        task: str,
+        status_callback: Callable[[str], None] = lambda _m: None,
+    ) -> str:
+        return self.generate(self.final_prompt(documents, task, status_callback))
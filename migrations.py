@@ -0,0 +1,248 @@
+"""Verzované dopredné migrácie DB schémy.
+
+Aktuálna verzia je v tabuľke schema_version (jeden riadok na aplikovanú migráciu).
+Migrácie sa spúšťajú raz pri štarte procesu (db.init_db), nikdy nie v ceste požiadavky.
+Pomocné funkcie sú idempotentné (stĺpec/index sa pridá iba ak chýba) a na MySQL
+používajú online DDL (ALGORITHM=INPLACE, LOCK=NONE), takže pridanie stĺpca alebo
+indexu na veľkej tabuľke neblokuje zápisy. Hromadné DELETE/UPDATE bežia po rozsahoch
+id (BATCH_SIZE) s commitom po každej dávke, aby nedržali zámky nad celou tabuľkou.
+
+Súbežný štart viacerých procesov (API, Streamlit) serializuje na MySQL zámok GET_LOCK;
+inde sa chyba "stĺpec/index už existuje" z pretekov medzi kontrolou a DDL ignoruje.
+
+Nová migrácia = nová položka na konci MIGRATIONS s najbližším vyšším číslom verzie.
+"""
+from __future__ import annotations
+
+import datetime as dt
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DatabaseError, IntegrityError
+
+_ONLINE_DDL = ", ALGORITHM=INPLACE, LOCK=NONE"
+# Počet id v jednej dávke hromadných úprav dát
+BATCH_SIZE = 5000
+_LOCK_NAME = "schema_migrations"
+LOCK_TIMEOUT_SECONDS = 600
+
+
+def _is_mysql(conn: Connection) -> bool:
+    return conn.dialect.name in ("mysql", "mariadb")
+
+
+def column_exists(conn: Connection, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+
+def index_exists(conn: Connection, table: str, name: str) -> bool:
+    insp = inspect(conn)
+    return any(i["name"] == name for i in insp.get_indexes(table)) or any(
+        c["name"] == name for c in insp.get_unique_constraints(table)
+    )
+
+
+def add_column(conn: Connection, table: str, column: str, ddl_type: str) -> None:
+    """ALTER TABLE ... ADD COLUMN, ak stĺpec ešte neexistuje."""
+    if column_exists(conn, table, column):
+        return
+    sql = f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"
+    if _is_mysql(conn):
+        sql += _ONLINE_DDL
+    try:
+        conn.execute(text(sql))
+    except DatabaseError:
+        # stĺpec medzitým pridal iný proces
+        if not column_exists(conn, table, column):
+            raise
+
+
+def create_index(conn: Connection, name: str, table: str, columns: list[str], unique: bool = False) -> None:
+    """Vytvorí index, ak ešte neexistuje."""
+    if index_exists(conn, table, name):
+        return
+    cols = ", ".join(columns)
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    try:
+        if _is_mysql(conn):
+            conn.execute(text(f"ALTER TABLE {table} ADD {kind} {name} ({cols}){_ONLINE_DDL}"))
+        else:
+            conn.execute(text(f"CREATE {kind} {name} ON {table} ({cols})"))
+    except DatabaseError:
+        # index medzitým vytvoril iný proces
+        if not index_exists(conn, table, name):
+            raise
+
+
+def id_ranges(conn: Connection, table: str, batch_size: int = BATCH_SIZE) -> Iterator[tuple[int, int]]:
+    """Rozsahy [od, do) primárneho kľúča id tabuľky po batch_size."""
+    low, high = conn.execute(text(f"SELECT MIN(id), MAX(id) FROM {table}")).one()
+    if low is None:
+        return
+    for start in range(low, high + 1, batch_size):
+        yield start, start + batch_size
+
+
+def update_in_batches(conn: Connection, table: str, sql: str, batch_size: int = BATCH_SIZE) -> int:
+    """Spustí DELETE/UPDATE s podmienkou na :lo <= id < :hi po dávkach, každú v samostatnej
+    transakcii. sql musí byť idempotentné (po páde sa migrácia spustí znova). Vracia počet riadkov."""
+    total = 0
+    for lo, hi in list(id_ranges(conn, table, batch_size)):
+        total += conn.execute(text(sql), {"lo": lo, "hi": hi}).rowcount or 0
+        conn.commit()
+    return total
+
+
+def _baseline(conn: Connection) -> None:
+    """Verzia 1 – schéma vytvorená cez create_all (claim_events, document_texts, ...)."""
+
+
+def dedup_document_texts(conn: Connection, batch_size: int = BATCH_SIZE) -> int:
+    """Odstráni duplicitné document_texts pre rovnaké (event_id, filename), ponechá najnovší
+    záznam (najvyššie id). Maže po rozsahoch id; vracia počet odstránených riadkov."""
+    if _is_mysql(conn):
+        # MySQL nedovolí v DELETE poddotaz nad tou istou tabuľkou – multi-table DELETE
+        sql = (
+            "DELETE d FROM document_texts AS d JOIN document_texts AS n"
+            " ON n.event_id = d.event_id AND n.filename = d.filename AND n.id > d.id"
+            " WHERE d.id >= :lo AND d.id < :hi"
+        )
+    else:
+        sql = (
+            "DELETE FROM document_texts WHERE id >= :lo AND id < :hi AND EXISTS ("
+            " SELECT 1 FROM document_texts AS n WHERE n.event_id = document_texts.event_id"
+            " AND n.filename = document_texts.filename AND n.id > document_texts.id)"
+        )
+    return update_in_batches(conn, "document_texts", sql, batch_size)
+
+
+def _document_texts_upsert_key(conn: Connection) -> None:
+    """Verzia 2 – content_hash a unikátny kľúč (event_id, filename) pre upsert."""
+    add_column(conn, "document_texts", "content_hash", "VARCHAR(64) NULL")
+    dedup_document_texts(conn)
+    create_index(conn, "uq_document_texts_event_filename", "document_texts", ["event_id", "filename"], unique=True)
+
+
+def _text_length_columns(conn: Connection) -> None:
+    """Verzia 3 – uložené dĺžky textov a náhľad analýzy (prehľady nenačítavajú celé Text stĺpce)."""
+    add_column(conn, "document_texts", "ocr_text_len", "INTEGER NULL")
+    add_column(conn, "document_texts", "anonymized_text_len", "INTEGER NULL")
+    add_column(conn, "analysis_results", "summary_len", "INTEGER NULL")
+    add_column(conn, "analysis_results", "summary_preview", "VARCHAR(600) NULL")
+    # dĺžka v znakoch (na MySQL je LENGTH v bajtoch)
+    length = "CHAR_LENGTH" if _is_mysql(conn) else "LENGTH"
+    update_in_batches(conn, "document_texts", (
+        f"UPDATE document_texts SET ocr_text_len = {length}(ocr_text),"
+        f" anonymized_text_len = {length}(anonymized_text)"
+        " WHERE id >= :lo AND id < :hi AND ocr_text_len IS NULL"
+    ))
+    update_in_batches(conn, "analysis_results", (
+        f"UPDATE analysis_results SET summary_len = {length}(summary_text),"
+        " summary_preview = SUBSTR(summary_text, 1, 600)"
+        " WHERE id >= :lo AND id < :hi AND summary_len IS NULL"
+    ))
+
+
+def _prompt_active_index(conn: Connection) -> None:
+    """Verzia 4 – index na prompts.is_active (aktivácia mení iba doterajší aktívny riadok)."""
+    create_index(conn, "ix_prompts_is_active", "prompts", ["is_active"])
+
+
+def _prompt_runs_keyset_index(conn: Connection) -> None:
+    """Verzia 5 – index (prompt_id, created_at, id) pre stránkovanie histórie behov."""
+    create_index(conn, "ix_prompt_runs_prompt_created", "prompt_runs", ["prompt_id", "created_at", "id"])
+
+
+def _prompt_run_latency_columns(conn: Connection) -> None:
+    """Verzia 6 – latencia a čas do prvého tokenu behu promptu."""
+    add_column(conn, "prompt_runs", "latency_ms", "INTEGER NULL")
+    add_column(conn, "prompt_runs", "ttft_ms", "INTEGER NULL")
+
+
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "Základná schéma", _baseline),
+    (2, "document_texts: content_hash, unikátny (event_id, filename)", _document_texts_upsert_key),
+    (3, "Dĺžky textov a náhľad analýzy", _text_length_columns),
+    (4, "Index prompts.is_active", _prompt_active_index),
+    (5, "Index prompt_runs (prompt_id, created_at, id)", _prompt_runs_keyset_index),
+    (6, "prompt_runs: latency_ms, ttft_ms", _prompt_run_latency_columns),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# Stĺpce s voliteľnou kompresiou (db_compression.CompressedText)
+COMPRESSED_TEXT_COLUMNS = (
+    ("document_texts", "ocr_text"),
+    ("document_texts", "anonymized_text"),
+    ("analysis_results", "summary_text"),
+)
+
+
+def ensure_text_storage(conn: Connection, binary: bool) -> list[str]:
+    """Zosúladí typ stĺpcov COMPRESSED_TEXT_COLUMNS s nastavením kompresie (iba MySQL;
+    SQLite má dynamické typy). Zmena typu prestavia tabuľku – online DDL tu nie je možné,
+    preto sa spúšťa iba pri zapnutí/vypnutí kompresie. Vracia zmenené stĺpce."""
+    if not _is_mysql(conn):
+        return []
+    changed: list[str] = []
+    for table, column in COMPRESSED_TEXT_COLUMNS:
+        current = next(str(c["type"]).upper() for c in inspect(conn).get_columns(table) if c["name"] == column)
+        if binary and "BLOB" not in current:
+            conn.execute(text(f"ALTER TABLE {table} MODIFY COLUMN {column} LONGBLOB NULL"))
+        elif not binary and "BLOB" in current:
+            conn.execute(text(f"ALTER TABLE {table} MODIFY COLUMN {column} LONGTEXT CHARACTER SET utf8mb4 NULL"))
+        else:
+            continue
+        changed.append(f"{table}.{column}")
+    return changed
+
+
+def current_version(conn: Connection) -> int:
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar() or 0
+
+
+@contextmanager
+def migration_lock(engine: Engine) -> Iterator[None]:
+    """Na MySQL drží pomenovaný zámok (GET_LOCK) počas migrácií, takže procesy štartujúce
+    súčasne ich neaplikujú paralelne; zámok sa uvoľní aj pri páde spojenia. Inde nerobí nič."""
+    if engine.dialect.name not in ("mysql", "mariadb"):
+        yield
+        return
+    with engine.connect() as conn:
+        acquired = conn.execute(
+            text("SELECT GET_LOCK(:name, :timeout)"), {"name": _LOCK_NAME, "timeout": LOCK_TIMEOUT_SECONDS}
+        ).scalar()
+        if acquired != 1:
+            raise RuntimeError(f"Zámok migrácií '{_LOCK_NAME}' sa nepodarilo získať do {LOCK_TIMEOUT_SECONDS} s")
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": _LOCK_NAME})
+
+
+def apply_migrations(engine: Engine) -> list[int]:
+    """Aplikuje chýbajúce migrácie v poradí verzií; vracia zoznam aplikovaných verzií.
+    Predpokladá existujúcu tabuľku schema_version (vytvára ju create_all)."""
+    applied: list[int] = []
+    with migration_lock(engine):
+        # verzia sa číta až pod zámkom – iný proces ju mohol práve zvýšiť
+        with engine.connect() as conn:
+            version = current_version(conn)
+        for number, description, migrate in MIGRATIONS:
+            if number <= version:
+                continue
+            with engine.connect() as conn:
+                migrate(conn)
+                try:
+                    conn.execute(
+                        text("INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)"),
+                        {"v": number, "d": description, "t": dt.datetime.utcnow()},
+                    )
+                    conn.commit()
+                except IntegrityError:
+                    # Súbežný štart iného procesu už migráciu zapísal (DDL je idempotentné)
+                    conn.rollback()
+            applied.append(number)
+    return applied
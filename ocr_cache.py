@@ -0,0 +1,131 @@
+"""Perzistentná cache OCR výsledkov adresovaná obsahom PDF.
+
+Kľúč = SHA-256 z (bajty PDF, processor ID, MIME typ), hodnota = text z Document AI.
+Záznamy sú súbory v priečinku OCR_CACHE_DIR; pri prekročení OCR_CACHE_MAX_MB sa
+odstraňujú najdlhšie nepoužité (LRU podľa mtime, ktorý sa obnovuje pri zásahu) až pod
+low_water * limit, aby sa prechod celého priečinka neopakoval pri každom zápise.
+Text po OCR po častiach (DOCUMENT_AI_SHARD_PAGES) má v kľúči aj variant delenia.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+
+
+class OCRCache:
+    def __init__(self, directory: str, max_bytes: int, low_water: float = 0.9):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.low_water_bytes = int(max_bytes * low_water)
+        self._lock = threading.Lock()
+        self._total_bytes: int | None = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(content: bytes, processor_id: str, mime_type: str, variant: str = "") -> str:
+        return OCRCache.digest_key(hashlib.sha256(content).hexdigest(), processor_id, mime_type, variant)
+
+    @staticmethod
+    def digest_key(digest: str, processor_id: str, mime_type: str, variant: str = "") -> str:
+        """Kľúč z SHA-256 obsahu (napr. z manifestu udalosti, keď súbor už neexistuje)."""
+        raw = f"{digest}|{processor_id}|{mime_type}" + (f"|{variant}" if variant else "")
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".txt")
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        """Vráti (mtime, veľkosť, cesta) pre všetky záznamy v cache."""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".txt"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def get(self, key: str) -> str | None:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)  # LRU: posledné použitie
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        size = os.path.getsize(tmp_path)
+        with self._lock:
+            # prepis existujúceho kľúča – pôvodná veľkosť sa odpočíta
+            try:
+                old_size = os.path.getsize(path)
+            except OSError:
+                old_size = 0
+            os.replace(tmp_path, path)
+            if self._total_bytes is None:
+                self._total_bytes = sum(s for _, s, _ in self._entries())
+            else:
+                self._total_bytes += size - old_size
+            if self._total_bytes > self.max_bytes:
+                self._evict_locked()
+
+    def remove(self, key: str) -> None:
+        """Odstráni záznam (ak existuje) a odpočíta jeho veľkosť."""
+        path = self._path(key)
+        with self._lock:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                return
+            if self._total_bytes is not None:
+                self._total_bytes = max(0, self._total_bytes - size)
+
+    def _evict_locked(self) -> None:
+        entries = sorted(self._entries())
+        total = sum(s for _, s, _ in entries)
+        for _, size, path in entries:
+            if total <= self.low_water_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.evictions += 1
+            except OSError:
+                pass
+        self._total_bytes = total
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "directory": self.directory,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
@@ -0,0 +1,36 @@
+"""Pomocné funkcie pre prácu s PDF súbormi."""
+from __future__ import annotations
+
+import io
+import re
+
+from pypdf import PdfReader, PdfWriter
+
+_PAGE_RE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+
+
+def count_pdf_pages(file_path: str) -> int:
+    """Vráti počet strán PDF. Pri poškodenom PDF použije odhad (počet objektov /Type /Page)."""
+    try:
+        return len(PdfReader(file_path).pages)
+    except Exception:
+        with open(file_path, "rb") as f:
+            return len(_PAGE_RE.findall(f.read()))
+
+
+def split_pdf_pages(content: bytes, pages_per_shard: int) -> list[tuple[int, int, bytes]]:
+    """Rozdelí PDF na časti po pages_per_shard stranách.
+    Vracia [(prvá strana, posledná strana, PDF bajty)], strany číslované od 1.
+    """
+    reader = PdfReader(io.BytesIO(content))
+    total = len(reader.pages)
+    shards = []
+    for first in range(0, total, pages_per_shard):
+        last = min(first + pages_per_shard, total)
+        writer = PdfWriter()
+        for idx in range(first, last):
+            writer.add_page(reader.pages[idx])
+        buf = io.BytesIO()
+        writer.write(buf)
+        shards.append((first + 1, last, buf.getvalue()))
+    return shards
@@ -0,0 +1,73 @@
+"""DLP nálezy (PII) s pozíciami: zlúčenie, lokálna anonymizácia a uloženie k dokumentu.
+
+Nálezy majú tvar {"info_type": str, "start": int, "end": int, "quote": str}, pozície
+sú indexy znakov (Unicode code points) v pôvodnom OCR texte.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+
+FINDINGS_SUFFIX = ".pii.json"
+
+
+def merge_findings(text: str, findings: list[dict]) -> list[dict]:
+    """Zoradí nálezy a zlúči prekrývajúce sa (duplicity z prekryvu okien, orezané entity).
+    Zlúčený nález dostane info_type najdlhšieho z nich."""
+    merged: list[dict] = []
+    for f in sorted(findings, key=lambda x: (int(x["start"]), -int(x["end"]))):
+        start, end = int(f["start"]), int(f["end"])
+        if end <= start:
+            continue
+        if merged and start < merged[-1]["end"]:
+            last = merged[-1]
+            if end - start > last["end"] - last["start"]:
+                last["info_type"] = f["info_type"]
+            last["end"] = max(last["end"], end)
+            continue
+        merged.append({"info_type": f["info_type"], "start": start, "end": end})
+    for f in merged:
+        f["quote"] = text[f["start"]:f["end"]]
+    return merged
+
+
+def redact_findings(text: str, findings: list[dict], replacement_format: str = "[{info_type}]") -> str:
+    """Lokálna anonymizácia: nahradí každý nález textom podľa info typu (napr. [PERSON_NAME])."""
+    parts: list[str] = []
+    last = 0
+    for f in merge_findings(text, findings):
+        parts.append(text[last:f["start"]])
+        parts.append(replacement_format.format(info_type=f["info_type"]))
+        last = f["end"]
+    parts.append(text[last:])
+    return "".join(parts)
+
+
+def _text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def findings_path(directory: str, filename: str) -> str:
+    return os.path.join(directory, os.path.splitext(filename)[0] + FINDINGS_SUFFIX)
+
+
+def save_findings(directory: str, filename: str, text: str, findings: list[dict]) -> str:
+    """Uloží nálezy vedľa RAW OCR textu (platia iba pre text s rovnakým hashom)."""
+    os.makedirs(directory, exist_ok=True)
+    path = findings_path(directory, filename)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"text_sha256": _text_sha256(text), "findings": findings}, f, ensure_ascii=False)
+    return path
+
+
+def load_findings(directory: str, filename: str, text: str) -> list[dict] | None:
+    """Načíta uložené nálezy; None, ak neexistujú alebo patria k inému textu."""
+    try:
+        with open(findings_path(directory, filename), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if data.get("text_sha256") != _text_sha256(text):
+        return None
+    return data.get("findings") or []
@@ -0,0 +1,252 @@
+"""Spoločná vrstva pre volania Google API (Document AI, DLP, Gemini).
+
+Pre každú službu:
+- token bucket obmedzuje počet požiadaviek za sekundu,
+- AIMD limiter riadi počet súbežných volaní (pri 429/RESOURCE_EXHAUSTED sa limit
+  zníži na polovicu, pri úspechoch postupne rastie o 1),
+- pri dočasných chybách (RESOURCE_EXHAUSTED, UNAVAILABLE, DEADLINE_EXCEEDED, ABORTED,
+  INTERNAL) sa volanie zopakuje s exponenciálnym čakaním s jitterom,
+- metriky (volania, opakovania, throttling, chyby, aktuálny limit) sú v stats().
+
+Opakovanie riadi iba táto vrstva – volania GAPIC klientov (Document AI, DLP) sa
+preto volajú s retry=None, aby sa vlastné opakovanie klienta nenásobilo s max_retries.
+
+Nastavenie cez env: RATE_LIMIT_<SLUŽBA>_QPS, RATE_LIMIT_<SLUŽBA>_BURST,
+RATE_LIMIT_<SLUŽBA>_MAX_CONCURRENCY, RATE_LIMIT_<SLUŽBA>_MAX_RETRIES (SLUŽBA = DOCUMENTAI | DLP | GEMINI).
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Iterator
+
+from google.api_core import exceptions as google_exceptions
+
+THROTTLE_ERRORS = (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)
+RETRYABLE_ERRORS = THROTTLE_ERRORS + (
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.Aborted,
+    google_exceptions.InternalServerError,
+)
+
+# Predvolené limity podľa služby: (QPS, max. súbežnosť)
+_DEFAULTS = {
+    "documentai": (10.0, 8),
+    "dlp": (50.0, 16),
+    "gemini": (5.0, 4),
+}
+
+
+class TokenBucket:
+    """Token bucket: rate tokenov za sekundu, najviac burst naraz."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Rezervuje jeden token a vráti, koľko sekúnd treba počkať (0 = hneď)."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1.0
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class AIMDLimiter:
+    """Limit súbežných volaní s additive-increase / multiplicative-decrease."""
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 64):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def try_acquire(self) -> bool:
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / max(1.0, self.limit))
+            self._cond.notify_all()
+
+
+class ServiceGuard:
+    """Obal volaní jednej služby: rate limit, AIMD súbežnosť, opakovanie a metriky."""
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: float,
+        max_concurrency: int,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+    ):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.limiter = AIMDLimiter(initial=max_concurrency, maximum=max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self.metrics = {"calls": 0, "retries": 0, "throttled": 0, "failures": 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.metrics[key] += 1
+
+    def _backoff(self, attempt: int) -> float:
+        # "full jitter": náhodne v intervale 0 .. base * 2^attempt
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        throttled = isinstance(error, THROTTLE_ERRORS)
+        if throttled:
+            self._count("throttled")
+        if isinstance(error, RETRYABLE_ERRORS) and attempt < self.max_retries:
+            self._count("retries")
+            return True
+        self._count("failures")
+        return False
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        attempt = 0
+        while True:
+            wait = self.bucket.reserve()
+            if wait:
+                time.sleep(wait)
+            self.limiter.acquire()
+            self._count("calls")
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                self.limiter.release(throttled=isinstance(e, THROTTLE_ERRORS))
+                if not self._should_retry(e, attempt):
+                    raise
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            self.limiter.release()
+            return result
+
+    def stream(self, fn: Callable[..., Any], *args, **kwargs) -> Iterator[Any]:
+        """Ako call pre streamované odpovede (iterovateľný výsledok fn): slot súbežnosti
+        sa drží, kým sa stream neprečíta alebo nezavrie. Opakuje sa, iba kým stream
+        ešte nič nevrátil (inak by sa časti odpovede zduplikovali)."""
+        attempt = 0
+        while True:
+            wait = self.bucket.reserve()
+            if wait:
+                time.sleep(wait)
+            self.limiter.acquire()
+            self._count("calls")
+            started = False
+            released = False
+            try:
+                for item in fn(*args, **kwargs):
+                    started = True
+                    yield item
+            except Exception as e:
+                released = True
+                self.limiter.release(throttled=isinstance(e, THROTTLE_ERRORS))
+                if started:
+                    self._count("failures")
+                    raise
+                if not self._should_retry(e, attempt):
+                    raise
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            finally:
+                if not released:
+                    self.limiter.release()
+            return
+
+    async def acall(self, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Asynchrónna obdoba call (neblokuje event loop)."""
+        attempt = 0
+        while True:
+            wait = self.bucket.reserve()
+            if wait:
+                await asyncio.sleep(wait)
+            while not self.limiter.try_acquire():
+                await asyncio.sleep(0.05)
+            self._count("calls")
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                self.limiter.release(throttled=isinstance(e, THROTTLE_ERRORS))
+                if not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            self.limiter.release()
+            return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self.metrics)
+        data.update({
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "in_flight": self.limiter.in_flight,
+            "qps": self.bucket.rate,
+        })
+        return data
+
+
+_guards: dict[str, ServiceGuard] = {}
+_guards_lock = threading.Lock()
+
+
+def guard(service: str) -> ServiceGuard:
+    """Vráti zdieľaný ServiceGuard pre službu (documentai, dlp, gemini)."""
+    g = _guards.get(service)
+    if g is None:
+        with _guards_lock:
+            g = _guards.get(service)
+            if g is None:
+                prefix = f"RATE_LIMIT_{service.upper()}_"
+                default_qps, default_conc = _DEFAULTS.get(service, (10.0, 8))
+                qps = float(os.getenv(prefix + "QPS", str(default_qps)))
+                g = ServiceGuard(
+                    service,
+                    rate=qps,
+                    burst=float(os.getenv(prefix + "BURST", str(max(1.0, qps)))),
+                    max_concurrency=int(os.getenv(prefix + "MAX_CONCURRENCY", str(default_conc))),
+                    max_retries=int(os.getenv(prefix + "MAX_RETRIES", "5")),
+                )
+                _guards[service] = g
+    return g
+
+
+def stats() -> dict:
+    """Metriky všetkých doteraz použitých služieb."""
+    return {name: g.stats() for name, g in sorted(_guards.items())}
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# Moduly projektu čítajú konfiguráciu pri importe – testy bežia bez GCP, DB a diskových cache
+os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "test-project")
+os.environ.setdefault("DOCUMENT_AI_PROCESSOR_ID", "test-processor")
+os.environ.setdefault("DLP_DEIDENTIFY_TEMPLATE_ID", "test-template")
+os.environ["OCR_CACHE_DIR"] = ""
+os.environ["DATABASE_URL"] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,111 @@
+import os
+
+import pytest
+
+import main
+from batch_ocr import BatchOCREngine, FakeOperationServer
+
+
+def _make_event(tmp_path, sensitive, general):
+    event_path = tmp_path / "udalost"
+    for folder, names in (("citlive_dokumenty", sensitive), ("vseobecne_dokumenty", general)):
+        (event_path / folder).mkdir(parents=True)
+        for name in names:
+            (event_path / folder / name).write_bytes(b"%PDF-1.4 " + name.encode())
+    return str(event_path)
+
+
+def _run(tmp_path, event_path, batch_engine):
+    out = {name: str(tmp_path / name) for name in ("anon", "general", "raw")}
+    messages = []
+    summary = main.run_processing(
+        event_path, out["anon"], out["general"], out["raw"], messages.append,
+        max_workers=1, ocr_engine="batch", batch_engine=batch_engine, pipeline="threads",
+    )
+    return summary, out, messages
+
+
+@pytest.fixture
+def online_ocr(monkeypatch):
+    """Online OCR a anonymizácia bez volaní Google API; vracia zoznam online OCR-ovaných súborov."""
+    calls = []
+
+    def fake_ocr(file_path, mime_type=None):
+        calls.append(os.path.basename(file_path))
+        return f"online:{os.path.basename(file_path)}"
+
+    monkeypatch.setattr(main, "ocr_document", fake_ocr)
+    monkeypatch.setattr(main, "_anonymize_document", lambda text, raw_ocr_dir, raw_filename: f"anon:{text}")
+    return calls
+
+
+def _batch_ocr(file_path):
+    name = os.path.basename(file_path)
+    if name.startswith("zly"):
+        raise RuntimeError("dokument sa nepodarilo spracovať")
+    return f"batch:{name}"
+
+
+def _read(directory, event_id, name):
+    with open(os.path.join(directory, event_id, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_partial_batch_failure_falls_back_to_online_ocr(tmp_path, online_ocr):
+    event_path = _make_event(tmp_path, ["a.pdf", "zly_b.pdf"], ["c.pdf", "zly_d.pdf"])
+    server = FakeOperationServer(_batch_ocr, polls_until_done=3)
+    engine = BatchOCREngine(server, poll_interval=0.01, timeout=5)
+
+    summary, out, _ = _run(tmp_path, event_path, engine)
+
+    assert len(server.submitted) == 1 and len(server.submitted[0]) == 4
+    # online OCR iba pre dokumenty, ktoré dávka nevrátila
+    assert sorted(online_ocr) == ["zly_b.pdf", "zly_d.pdf"]
+    assert not summary["failed"]
+    assert _read(out["anon"], "udalost", "a.txt") == "anon:batch:a.pdf"
+    assert _read(out["anon"], "udalost", "zly_b.txt") == "anon:online:zly_b.pdf"
+    assert _read(out["raw"], "udalost", "a.txt") == "batch:a.pdf"
+    assert _read(out["general"], "udalost", "c.txt") == "batch:c.pdf"
+    assert _read(out["general"], "udalost", "zly_d.txt") == "online:zly_d.pdf"
+
+
+def test_batch_timeout_falls_back_to_online_ocr(tmp_path, online_ocr):
+    event_path = _make_event(tmp_path, ["a.pdf"], ["c.pdf"])
+    # operácia nikdy neskončí v limite
+    server = FakeOperationServer(_batch_ocr, polls_until_done=10_000)
+    engine = BatchOCREngine(server, poll_interval=0.001, timeout=0.05)
+
+    summary, out, messages = _run(tmp_path, event_path, engine)
+
+    assert any("Dávkové OCR zlyhalo" in m and "neskončilo" in m for m in messages)
+    assert sorted(online_ocr) == ["a.pdf", "c.pdf"]
+    assert not summary["failed"]
+    assert _read(out["anon"], "udalost", "a.txt") == "anon:online:a.pdf"
+    assert _read(out["general"], "udalost", "c.txt") == "online:c.pdf"
+
+
+def test_failed_db_write_is_retried_by_incremental_run(tmp_path, online_ocr, monkeypatch):
+    import db
+
+    event_path = _make_event(tmp_path, ["a.pdf"], ["c.pdf"])
+    out = {name: str(tmp_path / name) for name in ("anon", "general", "raw")}
+
+    def broken_session():
+        raise RuntimeError("DB nedostupná")
+
+    monkeypatch.setattr(db, "get_session", broken_session)
+    summary = main.run_processing(
+        event_path, out["anon"], out["general"], out["raw"], lambda m: None,
+        max_workers=1, ocr_engine="online", pipeline="threads",
+    )
+    assert summary["failed"] == ["citlive_dokumenty/a.pdf"]
+    assert summary["processed"] == ["vseobecne_dokumenty/c.pdf"]
+
+    monkeypatch.setattr(db, "get_session", lambda: None)
+    online_ocr.clear()
+    summary = main.run_processing(
+        event_path, out["anon"], out["general"], out["raw"], lambda m: None,
+        max_workers=1, incremental=True, ocr_engine="online", pipeline="threads",
+    )
+    assert online_ocr == ["a.pdf"]
+    assert summary["skipped"] == ["vseobecne_dokumenty/c.pdf"]
@@ -0,0 +1,97 @@
+import random
+import re
+
+import pytest
+
+from dlp_chunking import ChunkedDeidentifier, changed_ranges
+
+FIRST = ("Ján", "Peter", "Mária", "Zuzana")
+LAST = ("Novák", "Kováč", "Horváth", "Nagyová")
+FILLER = ("alpha", "beta", "poistná", "udalosť", "zmluva", "dňa", "EUR", "škoda", "vozidlo")
+_NAME_RE = re.compile(rf"\b(?:{'|'.join(FIRST)}) (?:{'|'.join(LAST)})\b")
+
+
+def _deidentify(replacement):
+    # ako DLP: meno sa nahradí iba celé (samostatné priezvisko v časti sa nerozpozná)
+    return lambda text: _NAME_RE.sub(replacement, text)
+
+
+def _random_text(rnd):
+    words = []
+    for _ in range(rnd.randint(20, 80)):
+        if rnd.random() < 0.25:
+            words.append(f"{rnd.choice(FIRST)} {rnd.choice(LAST)}")
+        else:
+            words.append(rnd.choice(FILLER))
+    return " ".join(words)
+
+
+@pytest.mark.parametrize("replacement", ["[PERSON]", "[PERSON_NAME]", "[PERSON NAME]", "N"])
+def test_changed_ranges_cover_whole_name(replacement):
+    text = "alpha Ján Novák beta"
+    spans = ChunkedDeidentifier(_deidentify(replacement))._sensitive_spans(text)
+    assert [text[s:e] for s, e in spans] == ["Ján Novák"]
+
+
+def test_changed_ranges_are_token_aligned():
+    original = "Dňa 1.2.2024 volal Ján Novák, tel. 0900 123 456."
+    transformed = "Dňa 1.2.2024 volal [PERSON_NAME], tel. [PHONE_NUMBER]."
+    assert [original[s:e] for s, e in changed_ranges(original, transformed)] == ["Ján Novák", "0900 123 456"]
+
+
+@pytest.mark.parametrize("replacement", ["[PERSON]", "[PERSON_NAME]", "[PERSON NAME]"])
+def test_names_on_chunk_boundary_are_not_leaked(replacement):
+    rnd = random.Random(0)
+    deidentify = _deidentify(replacement)
+    chunker = ChunkedDeidentifier(deidentify, max_bytes=60, overlap=30, max_workers=1)
+    for _ in range(300):
+        text = _random_text(rnd)
+        result = chunker.run(text)
+        assert result == deidentify(text)
+        assert not any(last in result for last in LAST)
+
+
+def test_names_on_chunk_boundary_are_not_leaked_with_inspect():
+    rnd = random.Random(1)
+    deidentify = _deidentify("[PERSON_NAME]")
+    inspect = lambda text: [{"start": m.start(), "end": m.end()} for m in _NAME_RE.finditer(text)]
+    chunker = ChunkedDeidentifier(deidentify, inspect=inspect, max_bytes=60, overlap=30, max_workers=1)
+    for _ in range(300):
+        text = _random_text(rnd)
+        assert chunker.run(text) == deidentify(text)
+
+
+def test_boundary_uses_one_inspect_call():
+    rnd = random.Random(2)
+    deidentify = _deidentify("[PERSON_NAME]")
+    calls = []
+
+    def inspect(text):
+        calls.append(text)
+        return [{"start": m.start(), "end": m.end()} for m in _NAME_RE.finditer(text)]
+
+    chunker = ChunkedDeidentifier(deidentify, inspect=inspect, max_bytes=60, overlap=30, max_workers=1)
+    for _ in range(100):
+        text = _random_text(rnd)
+        calls.clear()
+        boundaries = len(chunker.plan(text)) - 1
+        assert len(calls) <= 2 * boundaries
+
+
+def test_boundary_probes_are_capped():
+    rnd = random.Random(3)
+    calls = []
+
+    def flaky(text):
+        # nedeterministická šablóna: rovnaký vstup nedá rovnaký výstup, overenie nikdy neprejde
+        calls.append(text)
+        return _NAME_RE.sub(lambda m: f"[PERSON_{len(calls)}]", text)
+
+    chunker = ChunkedDeidentifier(flaky, max_bytes=60, overlap=30, max_workers=1, max_probes=2)
+    for _ in range(50):
+        text = _random_text(rnd)
+        calls.clear()
+        bounds = chunker.plan(text)
+        assert len(calls) <= (2 + 3 * 2) * (len(bounds) - 1)
+        for _, end in bounds[:-1]:
+            assert text[end - 1].isspace()
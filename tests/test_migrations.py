@@ -0,0 +1,45 @@
+from sqlalchemy import create_engine, text
+
+import migrations
+
+
+def _engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE document_texts (id INTEGER PRIMARY KEY, event_id TEXT, filename TEXT,"
+            " ocr_text TEXT, anonymized_text TEXT)"
+        ))
+        for i in range(1, 30):
+            conn.execute(
+                text("INSERT INTO document_texts (id, event_id, filename, ocr_text) VALUES (:i, 'E', :f, :t)"),
+                {"i": i, "f": f"f{i % 7}.pdf", "t": "x" * i},
+            )
+    return engine
+
+
+def test_dedup_in_batches_keeps_newest_row(tmp_path):
+    engine = _engine(tmp_path)
+    with engine.connect() as conn:
+        assert migrations.dedup_document_texts(conn, batch_size=4) == 22
+        ids = conn.execute(text("SELECT id FROM document_texts ORDER BY id")).scalars().all()
+    # pre každý z 7 názvov ostane riadok s najvyšším id
+    assert ids == list(range(23, 30))
+
+
+def test_add_column_tolerates_concurrent_ddl(tmp_path, monkeypatch):
+    engine = _engine(tmp_path)
+    exists = migrations.column_exists
+    checks = []
+
+    def racy_exists(conn, table, column):
+        # prvá kontrola pred DDL ešte stĺpec nevidí – medzitým ho pridal iný proces
+        checks.append(column)
+        return len(checks) > 1 and exists(conn, table, column)
+
+    with engine.connect() as conn:
+        migrations.add_column(conn, "document_texts", "content_hash", "VARCHAR(64) NULL")
+        checks.clear()
+        monkeypatch.setattr(migrations, "column_exists", racy_exists)
+        migrations.add_column(conn, "document_texts", "content_hash", "VARCHAR(64) NULL")
+    assert checks == ["content_hash", "content_hash"]
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def sharded_pdf(tmp_path, monkeypatch):
+    """PDF, ktoré sa podľa počtu strán má deliť na časti; OCR bez volaní Google API."""
+    path = tmp_path / "velky.pdf"
+    path.write_bytes(b"%PDF-1.4 velky")
+    requests = []
+
+    async def fake_process(client, content, mime_type):
+        requests.append(content)
+        return f"ocr:{len(content)}"
+
+    monkeypatch.setattr(main, "OCR_SHARD_PAGES", 2)
+    monkeypatch.setattr(main, "count_pdf_pages", lambda file_path: 5)
+    monkeypatch.setattr(main, "_process_content_async", fake_process)
+    return str(path), requests
+
+
+def test_async_ocr_falls_back_to_whole_file_when_split_fails(sharded_pdf, monkeypatch):
+    file_path, requests = sharded_pdf
+
+    def broken_split(content, pages):
+        raise ValueError("poškodené PDF")
+
+    monkeypatch.setattr(main, "split_pdf_pages", broken_split)
+
+    text = asyncio.run(main._ocr_async(None, file_path, "application/pdf"))
+
+    assert requests == [b"%PDF-1.4 velky"]
+    assert text == f"ocr:{len(b'%PDF-1.4 velky')}"
+
+
+def test_async_ocr_merges_shards_in_page_order(sharded_pdf, monkeypatch):
+    file_path, requests = sharded_pdf
+    monkeypatch.setattr(main, "split_pdf_pages", lambda content, pages: [(1, 2, b"ab"), (3, 4, b"cde"), (5, 5, b"f")])
+
+    text = asyncio.run(main._ocr_async(None, file_path, "application/pdf"))
+
+    assert sorted(requests) == [b"ab", b"cde", b"f"]
+    assert text == "\n--- Strany 1-2 ---\nocr:2\n--- Strany 3-4 ---\nocr:3\n--- Strany 5-5 ---\nocr:1"